@@ -306,11 +306,31 @@ SITE_TITLE = "Starting point"
 ENVIRONMENT = None
 SHOW_ALERT = True
 
+# connections kept alive per host by the API clients of an import
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+# seconds between writes of the statistics of a running job
+STATISTICS_FLUSH_INTERVAL = float(os.getenv("STATISTICS_FLUSH_INTERVAL", 2))
+
+# days to keep the logs of stopped jobs, see the purge_job_logs command
+JOBLOG_RETENTION_DAYS = int(os.getenv("JOBLOG_RETENTION_DAYS", 90))
+
+# resident memory in MB a running job may use before it is stopped, 0 for no limit
+JOB_MEMORY_LIMIT = int(os.getenv("JOB_MEMORY_LIMIT", 0)) * 1024 * 1024
+
+# bearer token for Prometheus to read the /metrics endpoint, staff users can always read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# open the /metrics endpoint to everyone, eg: when the reverse proxy already restricts it
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "").lower() in ("1", "true", "yes")
+
 #
 # Library settings
 #
 
 
+ZGW_CONSUMERS_CLIENT_CLASS = "importer.utils.client.SessionClient"
+
 # Django-Admin-Index
 ADMIN_INDEX_SHOW_REMAINING_APPS_TO_SUPERUSERS = False
 
@@ -384,10 +404,16 @@ if SENTRY_DSN:
 
 # Elastic APM
 
+ELASTIC_APM_SERVER_URL = os.getenv("ELASTIC_APM_SERVER_URL")
+
 ELASTIC_APM = {
     "SERVICE_NAME": "importer",
     "SECRET_TOKEN": os.getenv("ELASTIC_APM_SECRET_TOKEN", "default"),
-    "SERVER_URL": os.getenv("ELASTIC_APM_SERVER_URL", "http://example.com"),
+    "SERVER_URL": ELASTIC_APM_SERVER_URL or "http://example.com",
 }
 
+if ELASTIC_APM_SERVER_URL:
+    # traces the requests and registers a transaction for every Celery task
+    INSTALLED_APPS += ["elasticapm.contrib.django"]
+
 SITE_ID = os.getenv("SITE_ID", 1)
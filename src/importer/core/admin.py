@@ -2,23 +2,44 @@ import os
 
 from django import forms
 from django.contrib import admin, messages
-from django.shortcuts import redirect
-from django.urls import reverse
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import path, reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from solo.admin import SingletonModelAdmin
 
-from importer.core.choices import JobState
+from importer.core.artifacts import LogArchiveList
+from importer.core.choices import JobLogLevel, JobState
+from importer.core.constants import ObjectTypenKeys
+from importer.core.exports import EXPORT_DATA, EXPORT_FORMATS, iter_export
 from importer.core.models import CatalogConfig, Job, SelectielijstConfig
+from importer.core.progress import get_live_progress, get_new_logs
 from importer.core.reporting import (
     transform_import_statistics,
+    transform_memory,
     transform_precheck_statistics,
+    transform_statistics,
+    transform_timings,
 )
 from importer.core.selectielijst import get_procestype_years
 from importer.core.tasks import import_job_task, precheck_job_task
 from importer.utils.forms import StaticHiddenField
 
+JOBLOGS_PER_PAGE = 500
+
+# log level filters of the job page, 'all' doesn't filter
+JOBLOG_LEVEL_FILTERS = {
+    "error": [JobLogLevel.error],
+    "warning": [JobLogLevel.warning],
+    "info": [JobLogLevel.info],
+    "interesting": [JobLogLevel.warning, JobLogLevel.error],
+    "all": None,
+}
+
 
 @admin.register(SelectielijstConfig)
 class SelectielijstConfigAdmin(SingletonModelAdmin):
@@ -33,6 +54,9 @@ class CatalogConfigAdmin(admin.ModelAdmin):
         "label",
         "_cached_domein",
         "_cached_rsin",
+        "prefetch_zaaktypen",
+        "prefetch_children",
+        "loader_workers",
     ]
     list_display = [
         "label",
@@ -76,6 +100,8 @@ class JobForm(forms.ModelForm):
             "source",
             "start_date",
             "close_published",
+            "log_mode",
+            "profiling",
         )
 
 
@@ -84,7 +110,7 @@ class JobStateQueueForm(forms.ModelForm):
 
     class Meta:
         model = Job
-        fields = ["state"]
+        fields = ["state", "profiling"]
 
 
 @admin.register(Job)
@@ -120,6 +146,8 @@ class JobAdmin(admin.ModelAdmin):
                 "source",
                 "start_date",
                 "close_published",
+                "log_mode",
+                "profiling",
             ]
         else:
             return [
@@ -129,6 +157,9 @@ class JobAdmin(admin.ModelAdmin):
                 "state",
                 "start_date",
                 "close_published",
+                "log_mode",
+                "profiling",
+                "profile_fmt",
                 "created_at",
                 "started_at",
                 "stopped_at",
@@ -151,6 +182,9 @@ class JobAdmin(admin.ModelAdmin):
             "source_fmt",
             "start_date",
             "close_published",
+            "log_mode",
+            "profiling",
+            "profile_fmt",
         }
         if not job:
             return fields - {
@@ -159,16 +193,51 @@ class JobAdmin(admin.ModelAdmin):
                 "source",
                 "start_date",
                 "close_published",
+                "log_mode",
+                "profiling",
             }
         elif job.state == JobState.precheck:
             return fields - {
                 "state",
+                "profiling",
             }
         else:
             return fields
 
-    def get_joblogs(self, job):
-        return job.joblog_set.order_by("pk")
+    def get_joblog_table(self, request, job):
+        """
+        a single page of the logs of the job, filtered on level in the query
+        """
+        level = request.GET.get("log_level")
+        if level not in JOBLOG_LEVEL_FILTERS:
+            level = "all"
+
+        levels = JOBLOG_LEVEL_FILTERS[level]
+        if job.log_archive and (not levels or JobLogLevel.info in levels):
+            # the info logs are only in the archive
+            logs = LogArchiveList(job, levels)
+        else:
+            logs = job.joblog_set.order_by("pk")
+            if levels:
+                logs = logs.filter(level__in=levels)
+
+        paginator = Paginator(logs, JOBLOGS_PER_PAGE)
+        page = paginator.get_page(request.GET.get("log_page"))
+        return {
+            "rows": page.object_list,
+            "page": page,
+            "level": level,
+            "levels": JOBLOG_LEVEL_FILTERS.keys(),
+            "archive_url": self.get_log_archive_url(job),
+            "export_url": self.get_export_url(job),
+            "export_levels": levels or [],
+        }
+
+    def get_log_archive_url(self, job):
+        if not job.log_archive:
+            return ""
+        url = reverse("staff_private_file", kwargs={"path": job.log_archive.name})
+        return f"{url}?decompress=1"
 
     def add_view(self, request, form_url="", extra_context=None):
         config = SelectielijstConfig.get_solo()
@@ -194,11 +263,11 @@ class JobAdmin(admin.ModelAdmin):
 
         if job.state == JobState.initialized:
             context["title"] = _("Waiting for precheck to start..")
-            context["reload_time"] = 5000
+            context["progress_url"] = self.get_progress_url(job)
 
         elif job.state == JobState.checking:
             context["title"] = _("Running precheck..")
-            context["reload_time"] = 2500
+            context["progress_url"] = self.get_progress_url(job)
             context["value_table"] = {
                 "rows": transform_precheck_statistics(job.statistics),
             }
@@ -207,16 +276,14 @@ class JobAdmin(admin.ModelAdmin):
             context["value_table"] = {
                 "rows": transform_precheck_statistics(job.statistics),
             }
-            context["joblog_table"] = {
-                "rows": self.get_joblogs(job),
-            }
+            context["joblog_table"] = self.get_joblog_table(request, job)
         elif job.state == JobState.queued:
             context["title"] = _("Waiting for import to start..")
-            context["reload_time"] = 2500
+            context["progress_url"] = self.get_progress_url(job)
 
         elif job.state == JobState.running:
             context["title"] = _("Running import..")
-            context["reload_time"] = 5000
+            context["progress_url"] = self.get_progress_url(job)
             context["value_table"] = {
                 "rows": transform_import_statistics(job.statistics),
             }
@@ -226,22 +293,114 @@ class JobAdmin(admin.ModelAdmin):
                 "title": _("Results"),
                 "rows": transform_import_statistics(job.statistics),
             }
-            context["joblog_table"] = {
-                "rows": self.get_joblogs(job),
-            }
+            context["joblog_table"] = self.get_joblog_table(request, job)
         elif job.state == JobState.error:
             context["title"] = _("Import Error")
             context["value_table"] = {
                 "title": _("Error"),
                 "rows": transform_import_statistics(job.statistics),
             }
-            context["joblog_table"] = {
-                "show_timestamp": True,
-                "rows": self.get_joblogs(job),
+            context["joblog_table"] = self.get_joblog_table(request, job)
+            context["joblog_table"]["show_timestamp"] = True
+
+        if job.state in (JobState.precheck, JobState.completed, JobState.error):
+            context["timings_table"] = {
+                "title": _("Timings"),
+                "rows": transform_timings(job.timings),
+            }
+            context["memory_table"] = {
+                "title": _("Memory"),
+                "rows": transform_memory(job.timings),
             }
 
         return super().change_view(request, object_id, form_url, extra_context=context)
 
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        urls = [
+            path(
+                "<int:object_id>/progress/",
+                self.admin_site.admin_view(self.progress_view),
+                name="%s_%s_progress" % info,
+            ),
+            path(
+                "<int:object_id>/export/",
+                self.admin_site.admin_view(self.export_view),
+                name="%s_%s_export" % info,
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def get_progress_url(self, job):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return reverse("admin:%s_%s_progress" % info, args=[job.id])
+
+    def get_export_url(self, job):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return reverse("admin:%s_%s_export" % info, args=[job.id])
+
+    def progress_view(self, request, object_id):
+        """
+        progress of a job as JSON, for live jobs this is read from the cache instead of the database
+
+        the change page polls this, with `after` the number of the last log it has shown
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        try:
+            after = int(request.GET.get("after", 0))
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        progress = get_live_progress(object_id)
+        if progress:
+            state = progress["state"]
+            rows = transform_statistics(state, progress["statistics"])
+            logs = get_new_logs(progress["logs"], after)
+        else:
+            job = get_object_or_404(
+                Job.objects.only("id", "state", "statistics"), id=object_id
+            )
+            state = job.state
+            rows = transform_statistics(job.state, job.statistics)
+            logs = []
+
+        return JsonResponse(
+            {"job": object_id, "state": state, "rows": rows, "logs": logs}
+        )
+
+    def export_view(self, request, object_id):
+        """
+        stream the logs, statistics or HTTP requests of a job as CSV or JSON lines
+
+        query parameters: 'data' (logs, statistics or http), 'format' (csv or jsonl), and any number of 'level'
+          and 'type' filters
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        data = request.GET.get("data", "logs")
+        export_format = request.GET.get("format", "csv")
+        levels = request.GET.getlist("level")
+        type_keys = request.GET.getlist("type")
+        if (
+            data not in EXPORT_DATA
+            or export_format not in EXPORT_FORMATS
+            or any(level not in JobLogLevel.values for level in levels)
+            or any(key not in ObjectTypenKeys.values for key in type_keys)
+        ):
+            return HttpResponseBadRequest()
+
+        job = get_object_or_404(Job, id=object_id)
+        response = StreamingHttpResponse(
+            iter_export(job, data, export_format, levels, type_keys),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        filename = f"job-{job.id}-{data}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
     def get_form(self, request, obj=None, change=False, **kwargs):
         if obj and obj.state == JobState.precheck:
             return JobStateQueueForm
@@ -303,3 +462,15 @@ class JobAdmin(admin.ModelAdmin):
         )
 
     source_fmt.short_description = _("XML File")
+
+    def profile_fmt(self, job):
+        if not job.profile:
+            return "-"
+        url = reverse("staff_private_file", kwargs={"path": job.profile.name})
+        return format_html(
+            '<a href="{url}" target="_blank">{text}</a>',
+            url=url,
+            text=os.path.basename(job.profile.name),
+        )
+
+    profile_fmt.short_description = _("Profile")
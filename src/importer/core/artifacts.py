@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import zipfile
+from io import BytesIO
+from typing import Dict, Iterator, Optional
+
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from importer.core.models import JobLog, get_job_log_archive_file_name
+
+logger = logging.getLogger(__name__)
+
+PARSED_DATA_VERSION = 2
+
+
+def get_source_fingerprint(job) -> dict:
+    """
+    identify the input of the parse phase, so we know when a stored result is still valid
+    """
+    checksum = hashlib.sha256()
+    with job.source.open("rb") as source:
+        for chunk in source.chunks():
+            checksum.update(chunk)
+
+    return {
+        "source": job.source.name,
+        "checksum": checksum.hexdigest(),
+        "year": job.year,
+        "start_date": job.start_date.isoformat(),
+    }
+
+
+def save_parsed_data(job, fingerprint: dict, session, zaaktypen, iotypen):
+    """
+    store the result of iterparse_xml() with the logs and counters it produced as a compressed file
+    """
+    payload = {
+        "version": PARSED_DATA_VERSION,
+        "fingerprint": fingerprint,
+        "zaaktypen": zaaktypen,
+        "iotypen": iotypen,
+        "logs": [
+            {
+                "level": log.level,
+                "message": log.message,
+                "code": log.code,
+                "type_key": log.type_key,
+                "count": log.count,
+                "sample": log.sample,
+            }
+            for log in session.logs
+        ],
+        "statistics": session.counter.get_data(),
+    }
+    content = gzip.compress(json.dumps(payload).encode("utf8"))
+
+    if job.parsed_data:
+        job.parsed_data.delete(save=False)
+    job.parsed_data.save(f"{job.id}.json.gz", ContentFile(content), save=False)
+    job.save(update_fields=("parsed_data",))
+
+
+def load_parsed_data(job, fingerprint: dict) -> Optional[dict]:
+    """
+    return the stored result of iterparse_xml() if it was made from the same input, otherwise None
+    """
+    if not job.parsed_data:
+        return None
+
+    try:
+        with job.parsed_data.open("rb") as f:
+            payload = json.loads(gzip.decompress(f.read()))
+    except (OSError, ValueError):
+        logger.warning(f"[Job#{job.id}] cannot read parsed data, parsing again")
+        return None
+
+    if payload.get("version") != PARSED_DATA_VERSION:
+        return None
+    if payload.get("fingerprint") != fingerprint:
+        return None
+
+    return payload
+
+
+class LogArchiveWriter:
+    """
+    write the logs of a job as compressed JSON lines to the log archive file of the job, replacing an existing archive
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+        if job.log_archive:
+            job.log_archive.delete(save=False)
+
+        storage = job.log_archive.storage
+        name = storage.get_available_name(
+            get_job_log_archive_file_name(job, f"{job.id}.jsonl.gz")
+        )
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = gzip.open(path, "wt", encoding="utf8")
+
+        job.log_archive.name = name
+        job.save(update_fields=("log_archive",))
+
+    def write(self, log: JobLog):
+        entry = {
+            "timestamp": log.timestamp or timezone.now(),
+            "level": log.level,
+            "message": log.message,
+            "code": log.code,
+            "type_key": log.type_key,
+            "count": log.count,
+            "sample": log.sample,
+        }
+        self.file.write(json.dumps(entry, cls=DjangoJSONEncoder))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+def iter_log_archive_entries(job, levels: Optional[list] = None) -> Iterator[dict]:
+    """
+    read the log entries from the log archive of the job, optionally filtered on level
+
+    a truncated archive (eg: the worker was killed while writing it) yields the entries that could be read
+    """
+    if not job.log_archive:
+        return
+
+    with job.log_archive.open("rb") as f:
+        with gzip.open(f, "rt", encoding="utf8") as lines:
+            try:
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of a truncated archive
+                        logger.warning(f"[Job#{job.id}] log archive has a broken line")
+                        return
+                    if not levels or entry["level"] in levels:
+                        yield entry
+            except (EOFError, OSError):
+                logger.warning(f"[Job#{job.id}] log archive is truncated")
+
+
+def iter_log_archive(job, levels: Optional[list] = None) -> Iterator[JobLog]:
+    """
+    read the logs from the log archive of the job, as unsaved JobLog objects
+    """
+    for entry in iter_log_archive_entries(job, levels):
+        yield get_archived_log(job, entry)
+
+
+def get_archived_log(job, entry: dict) -> JobLog:
+    entry["timestamp"] = parse_datetime(entry["timestamp"])
+    return JobLog(job=job, **entry)
+
+
+class LogArchiveList:
+    """
+    the logs in the log archive as a lazy list for the Paginator
+
+    both count() and slicing stream the archive, so a page view only keeps the logs of its page in memory
+    """
+
+    def __init__(self, job, levels: Optional[list] = None):
+        self.job = job
+        self.levels = levels
+
+    def count(self) -> int:
+        return sum(1 for _entry in iter_log_archive_entries(self.job, self.levels))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("LogArchiveList only supports slices without step")
+        start = index.start or 0
+        if index.stop is not None and index.stop <= start:
+            return []
+        entries = iter_log_archive_entries(self.job, self.levels)
+        return [
+            get_archived_log(self.job, entry)
+            for entry in itertools.islice(entries, start, index.stop)
+        ]
+
+
+def save_profile(job, files: Dict[str, bytes]):
+    """
+    add the files of a profiled phase to the profile ZIP of the job, replacing files with the same name
+    """
+    entries = dict()
+    if job.profile:
+        try:
+            with job.profile.open("rb") as f:
+                with zipfile.ZipFile(f) as archive:
+                    entries = {name: archive.read(name) for name in archive.namelist()}
+        except (OSError, zipfile.BadZipFile):
+            logger.warning(f"[Job#{job.id}] cannot read profile, replacing it")
+        job.profile.delete(save=False)
+    entries.update(files)
+
+    content = BytesIO()
+    with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+
+    job.profile.save(f"{job.id}.zip", ContentFile(content.getvalue()), save=False)
+    job.save(update_fields=("profile",))
@@ -15,6 +15,26 @@ class JobState(DjangoChoices):
     error = ChoiceItem("error", _("Error"))
 
 
+class JobStage(DjangoChoices):
+    check_job = ChoiceItem("check_job", _("Check job"))
+    read_source = ChoiceItem("read_source", _("Read source"))
+    check_xml = ChoiceItem("check_xml", _("Check XML"))
+    read_processes = ChoiceItem("read_processes", _("Read processes from XML"))
+    selectielijst = ChoiceItem("selectielijst", _("Selectielijst fetches"))
+    parse_processes = ChoiceItem("parse_processes", _("Parse processes"))
+    save_parsed_data = ChoiceItem("save_parsed_data", _("Save precheck result"))
+    load_parsed_data = ChoiceItem("load_parsed_data", _("Load precheck result"))
+    load_iotypen = ChoiceItem("load_iotypen", _("Load informatieobjecttypen"))
+    prefetch_zaaktypen = ChoiceItem("prefetch_zaaktypen", _("Prefetch zaaktypen"))
+    prefetch_children = ChoiceItem("prefetch_children", _("Prefetch zaaktype children"))
+    load_zaaktypen = ChoiceItem("load_zaaktypen", _("Load zaaktypen"))
+
+
+class JobLogMode(DjangoChoices):
+    database = ChoiceItem("database", _("Database"))
+    archive = ChoiceItem("archive", _("Archive"))
+
+
 class JobLogLevel(DjangoChoices):
     info = ChoiceItem("info", _("Info"))
     warning = ChoiceItem("warning", _("Warning"))
@@ -30,3 +50,31 @@ class JobLogLevel(DjangoChoices):
     @classmethod
     def get_icon(cls, level):
         return cls.ICONS.get(level) or cls.ICONS["default"]
+
+
+class JobLogCode(DjangoChoices):
+    """
+    codes of the log records the session aggregates into a single JobLog, see ImportSession.log_record()
+    """
+
+    default_value = ChoiceItem("default_value", _("Default value used"))
+    unknown_choice = ChoiceItem("unknown_choice", _("Unknown choice"))
+    trimmed = ChoiceItem("trimmed", _("Value trimmed"))
+    doorlooptijd_fallback = ChoiceItem(
+        "doorlooptijd_fallback", _("Afdoeningstermijn used as doorlooptijd")
+    )
+    brondatum_default = ChoiceItem(
+        "brondatum_default", _("Brondatum archiefprocedure default used")
+    )
+
+    MESSAGES = {
+        "default_value": "{field} not defined. It will be set as '{default}'",
+        "unknown_choice": "{field} cannot find '{value}' in options {options}. It will be set as '{default}'",
+        "trimmed": "Imported value for '{field}' is trimmed to {length} characters.",
+        "doorlooptijd_fallback": 'Used "afdoeningstermijn" for "Zaaktype.doorlooptijd": Import has no value for "wettelijke-afdoeningstermijn".',
+        "brondatum_default": "resultaattype doesn't have brondatumArchiefprocedure.{field}. It will be set as '{default}'",
+    }
+
+    @classmethod
+    def format_message(cls, code, **params):
+        return cls.MESSAGES[code].format(**params)
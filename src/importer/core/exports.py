@@ -0,0 +1,177 @@
+import csv
+import json
+from typing import Iterable, Iterator, List, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from importer.core.artifacts import iter_log_archive
+from importer.core.choices import JobLogLevel
+from importer.core.constants import ObjectTypenKeys
+from importer.core.models import JobLog
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+EXPORT_DATA = ("logs", "statistics", "http")
+# rows per database round trip while streaming the logs
+EXPORT_CHUNK_SIZE = 2000
+
+LOG_FIELDS = [
+    "id",
+    "timestamp",
+    "level",
+    "code",
+    "type_key",
+    "count",
+    "message",
+    "sample",
+]
+STATISTICS_FIELDS = [
+    "type_key",
+    "label",
+    "updated",
+    "created",
+    "errored",
+    "counted",
+] + list(JobLogLevel.values)
+HTTP_FIELDS = [
+    "method",
+    "resource",
+    "count",
+    "duration",
+    "p50",
+    "p95",
+    "p99",
+    "statuses",
+]
+
+
+class Echo:
+    """
+    file-like object for csv.writer that returns the written line instead of buffering it
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_export_logs(
+    job, levels: Optional[List[str]] = None, type_keys: Optional[List[str]] = None
+) -> Iterator[JobLog]:
+    """
+    iterate the logs of a job without loading them all in memory, with optional level and type filters
+    """
+    if job.log_archive and (not levels or JobLogLevel.info in levels):
+        # the info logs are only in the archive
+        for log in iter_log_archive(job, levels):
+            if type_keys and log.type_key not in type_keys:
+                continue
+            yield log
+    else:
+        queryset = job.joblog_set.order_by("pk")
+        if levels:
+            queryset = queryset.filter(level__in=levels)
+        if type_keys:
+            queryset = queryset.filter(type_key__in=type_keys)
+        yield from queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def get_log_row(log: JobLog) -> dict:
+    return {
+        "id": log.id,
+        "timestamp": log.timestamp,
+        "level": log.level,
+        "code": log.code,
+        "type_key": log.type_key,
+        "count": log.count,
+        "message": log.message,
+        "sample": log.sample,
+    }
+
+
+def get_statistics_export_rows(
+    statistics: dict, type_keys: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    the counts per object type, the HTTP requests in the statistics have their own export
+    """
+    data = (statistics or dict()).get("data", dict())
+
+    rows = []
+    for key in ObjectTypenKeys.values:
+        if type_keys and key not in type_keys:
+            continue
+        value = data.get(key, dict())
+        issues = value.get("issues") or dict()
+        row = {
+            "type_key": key,
+            "label": str(ObjectTypenKeys.values[key]),
+            "updated": value.get("updated", 0),
+            "created": value.get("created", 0),
+            "errored": value.get("errored", 0),
+            "counted": value.get("counted", 0),
+        }
+        for level in JobLogLevel.values:
+            row[level] = issues.get(level, 0)
+        rows.append(row)
+    return rows
+
+
+def get_http_export_rows(statistics: dict) -> List[dict]:
+    """
+    the requests to the Catalogi API per method and resource, with the total duration in seconds and
+      the latency percentiles in ms
+    """
+    return [
+        {field: call.get(field) for field in HTTP_FIELDS}
+        for call in (statistics or dict()).get("http", [])
+    ]
+
+
+def iter_csv(rows: Iterable[dict], fields: List[str]) -> Iterator[str]:
+    writer = csv.DictWriter(Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for row in rows:
+        if isinstance(row.get("sample"), list):
+            row["sample"] = "; ".join(row["sample"])
+        if isinstance(row.get("statuses"), dict):
+            row["statuses"] = "; ".join(
+                f"{status}: {count}"
+                for status, count in sorted(row["statuses"].items())
+            )
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows: Iterable[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(
+    job,
+    data: str,
+    export_format: str,
+    levels: Optional[List[str]] = None,
+    type_keys: Optional[List[str]] = None,
+) -> Iterator[str]:
+    """
+    generate the lines of an export of the logs, the statistics or the HTTP requests of a job
+    """
+    assert data in EXPORT_DATA
+    assert export_format in EXPORT_FORMATS
+
+    if data == "logs":
+        rows = map(get_log_row, iter_export_logs(job, levels, type_keys))
+        fields = LOG_FIELDS
+    elif data == "statistics":
+        rows = get_statistics_export_rows(job.statistics, type_keys)
+        fields = STATISTICS_FIELDS
+    else:
+        rows = get_http_export_rows(job.statistics)
+        fields = HTTP_FIELDS
+
+    if export_format == "csv":
+        return iter_csv(rows, fields)
+    else:
+        return iter_jsonl(rows)
@@ -1,13 +1,18 @@
 import logging
 
-from lxml import etree
 from lxml.etree import LxmlError
 from zds_client import ClientError
 
+from importer.core.artifacts import (
+    get_source_fingerprint,
+    load_parsed_data,
+    save_parsed_data,
+)
+from importer.core.choices import JobStage
 from importer.core.constants import ObjectTypenKeys
 from importer.core.loader import load_data
-from importer.core.parser import parse_xml
-from importer.core.reporting import ImportSession
+from importer.core.parser import iterparse_xml, read_preambule
+from importer.core.reporting import ImportSession, MemoryLimitExceeded
 
 logger = logging.getLogger(__name__)
 
@@ -36,10 +41,10 @@ def check_job(job, session):
     return True
 
 
-def check_xml(tree, session):
+def check_xml(preambule, session):
     try:
-        version = tree.xpath("/dsp/preambule/specificatieversie")[0].text
-    except IndexError:
+        version = preambule.find("specificatieversie").text
+    except AttributeError:
         session.log_error("non supported XML format")
         return False
     else:
@@ -52,32 +57,67 @@ def check_xml(tree, session):
     return True
 
 
+def parse_source(job, session):
+    """
+    stream the XML source of the job: check the preambule first, then parse the processen
+    """
+    with job.source.open("rb") as source:
+        with session.timings.stage(JobStage.check_xml):
+            try:
+                preambule = read_preambule(source)
+            except LxmlError:
+                session.log_error("XML parse error")
+                raise ImporterException("XML parse error.")
+
+            if not check_xml(preambule, session):
+                raise ImporterException("failed XML check")
+
+        source.seek(0)
+        try:
+            with session.timings.stage(JobStage.parse_processes):
+                return iterparse_xml(session, source, job.year)
+        except LxmlError:
+            session.log_error("XML parse error")
+            raise ImporterException("XML parse error.")
+
+
 def precheck_import(job):
     """
     run the precheck on a job and return additional information in the session
     """
     session = ImportSession(job)
-    if not check_job(job, session):
-        raise ImporterException("failed data check")
-
     try:
-        tree = etree.fromstring(job.source.read())
-    except LxmlError:
-        session.log_error("XML parse error.")
-        raise ImporterException("XML parse error.")
+        with session.timings.stage(JobStage.check_job):
+            if not check_job(job, session):
+                raise ImporterException("failed data check")
 
-    if not check_xml(tree, session):
-        raise ImporterException("failed XML check")
+        with session.timings.stage(JobStage.read_source):
+            fingerprint = get_source_fingerprint(job)
+        zaaktypen, iotypen = parse_source(job, session)
+        session.flush_records()
 
-    zaaktypen, iotypen = parse_xml(session, tree, job.year)
+        # keep the result so the import doesn't have to parse again
+        with session.timings.stage(JobStage.save_parsed_data):
+            save_parsed_data(job, fingerprint, session, zaaktypen, iotypen)
 
-    session.flush_counts()
+        session.flush_counts(force=True)
 
-    for obj in zaaktypen:
-        session.log_info(
-            f"zaaktype {obj['identificatie']} '{obj['omschrijving']}'",
-            ObjectTypenKeys.zaaktypen,
-        )
+        for obj in zaaktypen:
+            session.log_info(
+                f"zaaktype {obj['identificatie']} '{obj['omschrijving']}'",
+                ObjectTypenKeys.zaaktypen,
+            )
+    except MemoryLimitExceeded as exc:
+        session.log_error(f"precheck stopped: {exc}")
+        raise
+    finally:
+        # write the buffered logs, also when we fail
+        session.flush_records()
+        session.flush_logs()
+        # count the final logs and requests in the shared metrics
+        session.metrics.flush()
+        session.close()
+        session.save_timings("precheck")
 
     return session
 
@@ -87,31 +127,47 @@ def run_import(job):
     run the actual import for a job and write additional information in the database through the session
     """
     session = ImportSession(job)
-    job.joblog_set.all().delete()
-
-    if not check_job(job, session):
-        raise ImporterException("failed data check")
+    job.joblog_set.purge()
 
     try:
-        tree = etree.fromstring(job.source.read())
-    except LxmlError:
-        session.log_error("XML parse error")
-        raise ImporterException("XML parse error.")
-
-    if not check_xml(tree, session):
-        raise ImporterException("failed XML check")
-
-    zaaktypen, iotypen = parse_xml(session, tree, job.year)
-
-    # keep issues but reset counters
-    session.counter.reset_numbers()
-    session.flush_counts()
-
-    session.log_info("End of precheck, start loading..")
-
-    # do actual loading
-    load_data(session, zaaktypen, iotypen)
-
-    session.flush_counts()
+        with session.timings.stage(JobStage.check_job):
+            if not check_job(job, session):
+                raise ImporterException("failed data check")
+
+        with session.timings.stage(JobStage.read_source):
+            fingerprint = get_source_fingerprint(job)
+        with session.timings.stage(JobStage.load_parsed_data):
+            parsed = load_parsed_data(job, fingerprint)
+        if parsed:
+            # replay the outcome of the precheck instead of parsing again
+            for log in parsed["logs"]:
+                session.add_log(**log)
+            session.counter.set_data(parsed["statistics"])
+            zaaktypen, iotypen = parsed["zaaktypen"], parsed["iotypen"]
+        else:
+            zaaktypen, iotypen = parse_source(job, session)
+            session.flush_records()
+
+        # keep issues but reset counters
+        session.counter.reset_numbers()
+        session.flush_counts(force=True)
+
+        session.log_info("End of precheck, start loading..")
+
+        # do actual loading
+        load_data(session, zaaktypen, iotypen)
+
+        session.flush_counts(force=True)
+    except MemoryLimitExceeded as exc:
+        session.log_error(f"import stopped: {exc}")
+        raise
+    finally:
+        # write the buffered logs, also when we fail
+        session.flush_records()
+        session.flush_logs()
+        # count the final logs and requests in the shared metrics
+        session.metrics.flush()
+        session.close()
+        session.save_timings("import")
 
     return session
@@ -1,37 +1,144 @@
 import logging
-from collections import defaultdict
-from typing import Dict, List
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
 
+from django.db import connections
+
+from elasticapm.traces import execution_context
 from requests import HTTPError
 from zds_client.client import ClientError
 from zgw_consumers.service import get_paginated_results
 
+from importer.core.choices import JobStage
 from importer.core.constants import ObjectTypenKeys
 from importer.core.reporting import format_exception
 
 logger = logging.getLogger(__name__)
 
+ZAAKTYPE_CHILD_RESOURCES = (
+    "roltype",
+    "statustype",
+    "resultaattype",
+    "zaakinformatieobjecttype",
+)
+
 
-FLUSH_OBJECTS = 10
+# type_key of the Catalogi API resources, for the APM spans
+RESOURCE_TYPE_KEYS = {
+    "zaaktype": ObjectTypenKeys.zaaktypen,
+    "informatieobjecttype": ObjectTypenKeys.informatieobjecttypen,
+    "roltype": ObjectTypenKeys.roltypen,
+    "statustype": ObjectTypenKeys.statustypen,
+    "resultaattype": ObjectTypenKeys.resultaattypen,
+    "zaakinformatieobjecttype": ObjectTypenKeys.zaakinformatieobjecttypen,
+}
 
 
 class LoaderException(Exception):
     pass
 
 
+def api_span(session, action: str, resource: str, zaaktype: str = None):
+    """
+    APM span for a Catalogi API call, labeled with the type_key and the zaaktype identificatie
+    """
+    return session.capture_span(
+        f"catalogi {resource} {action}",
+        span_type="external",
+        span_subtype="catalogi",
+        span_action=action,
+        type_key=RESOURCE_TYPE_KEYS.get(resource),
+        zaaktype=zaaktype,
+    )
+
+
+def prefetch_zaaktypen(session) -> Dict[str, List[dict]]:
+    """
+    fetch all zaaktypen of the catalog in one paginated run and index them by identificatie
+    """
+    client = session.client_from_url(session.catalogus_url)
+    with api_span(session, "list", "zaaktype"):
+        remote_list = get_paginated_results(
+            client,
+            "zaaktype",
+            query_params={"catalogus": session.catalogus_url, "status": "alles"},
+        )
+
+    remote_map = defaultdict(list)
+    for zt in remote_list:
+        remote_map[zt["identificatie"]].append(zt)
+    return remote_map
+
+
+def get_catalog_zaaktype_urls(session) -> Set[str]:
+    """
+    the urls of the zaaktypen in the catalog, from the prefetched zaaktypen or in one paginated run
+    """
+    if session.zaaktypen_index is not None:
+        remote_map = session.zaaktypen_index
+    else:
+        remote_map = prefetch_zaaktypen(session)
+    return {zt["url"] for remotes in remote_map.values() for zt in remotes}
+
+
+def prefetch_zaaktype_children(
+    session, resource: str, zaaktype_urls: Set[str]
+) -> Dict[str, List[dict]]:
+    """
+    fetch all objects of a zaaktype child-resource in one paginated run and group them by zaaktype url
+
+    the API can't filter these on catalog, so we only keep the children of the zaaktypen in `zaaktype_urls`
+    """
+    client = session.client_from_url(session.catalogus_url)
+    with api_span(session, "list", resource):
+        remote_list = get_paginated_results(
+            client,
+            resource,
+            query_params={"status": "alles"},
+        )
+
+    remote_map = defaultdict(list)
+    for obj in remote_list:
+        if obj["zaaktype"] in zaaktype_urls:
+            remote_map[obj["zaaktype"]].append(obj)
+    return remote_map
+
+
+def index_zaaktype(session, zaaktype: dict):
+    """
+    keep the prefetched zaaktypen up-to-date with a created or updated zaaktype
+    """
+    if session.zaaktypen_index is None:
+        return
+
+    with session.lock:
+        remotes = session.zaaktypen_index[zaaktype["identificatie"]]
+        for i, remote in enumerate(remotes):
+            if remote["url"] == zaaktype["url"]:
+                remotes[i] = zaaktype
+                return
+        remotes.append(zaaktype)
+
+
 def retrieve_zaaktype(session, log_scope: str, identificatie: str):
     """
-    to retrieve a zaaktype by identificatie we need to do a list search
+    to retrieve a zaaktype by identificatie we need to do a list search, or use the prefetched index
     """
+    if session.zaaktypen_index is not None:
+        with session.lock:
+            return list(session.zaaktypen_index.get(identificatie, []))
+
     client = session.client_from_url(session.catalogus_url)
-    result = client.list(
-        "zaaktype",
-        query_params={
-            "identificatie": identificatie,
-            "catalogus": session.catalogus_url,
-            "status": "alles",
-        },
-    )
+    with api_span(session, "list", "zaaktype", identificatie):
+        result = client.list(
+            "zaaktype",
+            query_params={
+                "identificatie": identificatie,
+                "catalogus": session.catalogus_url,
+                "status": "alles",
+            },
+        )
     return result["results"]
 
 
@@ -55,7 +162,8 @@ def update_zaaktype(session, zaaktype_data: dict):
     update/create a single zaaktype (closing if published)
     """
     client = session.client_from_url(session.catalogus_url)
-    log_scope = f"zaaktype {zaaktype_data['identificatie']}"
+    identificatie = zaaktype_data["identificatie"]
+    log_scope = f"zaaktype {identificatie}"
 
     zaaktype_data["catalogus"] = session.catalogus_url
 
@@ -64,12 +172,14 @@ def update_zaaktype(session, zaaktype_data: dict):
 
     if not remotes:
         # create new
-        zaaktype = client.create("zaaktype", data=zaaktype_data)
+        with api_span(session, "create", "zaaktype", identificatie):
+            zaaktype = client.create("zaaktype", data=zaaktype_data)
         session.log_info(f"{log_scope} created new concept")
         session.counter.increment_created(ObjectTypenKeys.zaaktypen)
     elif concept:
         # update old resource which is still in concept
-        zaaktype = client.update("zaaktype", zaaktype_data, url=concept["url"])
+        with api_span(session, "update", "zaaktype", identificatie):
+            zaaktype = client.update("zaaktype", zaaktype_data, url=concept["url"])
         session.log_info(f"{log_scope} updated existing concept")
         session.counter.increment_updated(ObjectTypenKeys.zaaktypen)
     else:
@@ -77,11 +187,13 @@ def update_zaaktype(session, zaaktype_data: dict):
         if session.job.close_published:
             for remote in remotes:
                 if not remote["concept"] and not remote["eindeGeldigheid"]:
-                    client.partial_update(
-                        "zaaktype",
-                        {"eindeGeldigheid": zaaktype_data["beginGeldigheid"]},
-                        url=remote["url"],
-                    )
+                    with api_span(session, "partial_update", "zaaktype", identificatie):
+                        client.partial_update(
+                            "zaaktype",
+                            {"eindeGeldigheid": zaaktype_data["beginGeldigheid"]},
+                            url=remote["url"],
+                        )
+                    remote["eindeGeldigheid"] = zaaktype_data["beginGeldigheid"]
                     session.log_info(
                         f"{log_scope} closed existing published on '{zaaktype_data['beginGeldigheid']}'"
                     )
@@ -89,10 +201,13 @@ def update_zaaktype(session, zaaktype_data: dict):
             session.log_info(f"{log_scope} existing published stays active")
 
         # create new resource
-        zaaktype = client.create("zaaktype", data=zaaktype_data)
+        with api_span(session, "create", "zaaktype", identificatie):
+            zaaktype = client.create("zaaktype", data=zaaktype_data)
         session.log_info(f"{log_scope} created new concept")
         session.counter.increment_updated(ObjectTypenKeys.zaaktypen)
 
+    index_zaaktype(session, zaaktype)
+
     return zaaktype
 
 
@@ -123,11 +238,12 @@ def update_informatieobjecttypen(session, iotypen_data: List[dict]):
     client = session.client_from_url(session.catalogus_url)
 
     # fetch existing and create lookup
-    remote_list = get_paginated_results(
-        client,
-        "informatieobjecttype",
-        query_params={"catalogus": session.catalogus_url, "status": "alles"},
-    )
+    with api_span(session, "list", "informatieobjecttype"):
+        remote_list = get_paginated_results(
+            client,
+            "informatieobjecttype",
+            query_params={"catalogus": session.catalogus_url, "status": "alles"},
+        )
 
     remote_map = defaultdict(list)
     for io in remote_list:
@@ -136,9 +252,8 @@ def update_informatieobjecttypen(session, iotypen_data: List[dict]):
     iotypen = []
 
     # update/create resources
-    for i, iotype_data in enumerate(iotypen_data, start=1):
-        if i % FLUSH_OBJECTS == 0:
-            session.flush_counts()
+    for iotype_data in iotypen_data:
+        session.flush_counts()
 
         iotype_data["catalogus"] = session.catalogus_url
 
@@ -149,14 +264,16 @@ def update_informatieobjecttypen(session, iotypen_data: List[dict]):
         try:
             if omschrijving not in remote_map:
                 # new resource
-                iotype = client.create("informatieobjecttype", data=iotype_data)
+                with api_span(session, "create", "informatieobjecttype"):
+                    iotype = client.create("informatieobjecttype", data=iotype_data)
                 session.log_info(f"{log_scope} created new concept")
                 session.counter.increment_created(ObjectTypenKeys.informatieobjecttypen)
 
             elif concept:
-                iotype = client.update(
-                    "informatieobjecttype", iotype_data, url=concept["url"]
-                )
+                with api_span(session, "update", "informatieobjecttype"):
+                    iotype = client.update(
+                        "informatieobjecttype", iotype_data, url=concept["url"]
+                    )
                 session.log_info(f"{log_scope} updated existing concept")
                 session.counter.increment_updated(ObjectTypenKeys.informatieobjecttypen)
 
@@ -165,11 +282,14 @@ def update_informatieobjecttypen(session, iotypen_data: List[dict]):
                 if session.job.close_published:
                     for remote in remote_map[omschrijving]:
                         if not remote["concept"] and not remote["eindeGeldigheid"]:
-                            client.partial_update(
-                                "informatieobjecttype",
-                                {"eindeGeldigheid": iotype_data["beginGeldigheid"]},
-                                url=remote["url"],
-                            )
+                            with api_span(
+                                session, "partial_update", "informatieobjecttype"
+                            ):
+                                client.partial_update(
+                                    "informatieobjecttype",
+                                    {"eindeGeldigheid": iotype_data["beginGeldigheid"]},
+                                    url=remote["url"],
+                                )
                             session.log_info(
                                 f"{log_scope} closed existing published on '{iotype_data['beginGeldigheid']}'"
                             )
@@ -177,7 +297,8 @@ def update_informatieobjecttypen(session, iotypen_data: List[dict]):
                     session.log_info(f"{log_scope} existing published stays active")
 
                 # create new resource
-                iotype = client.create("informatieobjecttype", data=iotype_data)
+                with api_span(session, "create", "informatieobjecttype"):
+                    iotype = client.create("informatieobjecttype", data=iotype_data)
                 session.log_info(f"{log_scope} created new concept")
                 session.counter.increment_updated(ObjectTypenKeys.informatieobjecttypen)
 
@@ -209,22 +330,29 @@ def update_zaaktype_children(
     generically update/create a list of zaaktype child-resources
     """
     zaaktype_url = zaaktype["url"]
-    client = session.client_from_url(zaaktype_url)
+    identificatie = zaaktype["identificatie"]
+    # the zaaktype lives in the service of the catalog
+    client = session.client_from_url(session.catalogus_url)
 
-    # fetch existing and make lookup
-    remote_list = get_paginated_results(
-        client,
-        resource,
-        query_params={"zaaktype": zaaktype_url, "status": "alles"},
-    )
+    # fetch existing (or use the prefetched) and make lookup
+    children_index = session.children_index.get(resource)
+    if children_index is not None:
+        with session.lock:
+            remote_list = list(children_index[zaaktype_url])
+    else:
+        with api_span(session, "list", resource, identificatie):
+            remote_list = get_paginated_results(
+                client,
+                resource,
+                query_params={"zaaktype": zaaktype_url, "status": "alles"},
+            )
     remote_map = {o[match_field]: o for o in remote_list}
 
     objects = []
 
     # update/create resources
-    for i, child_data in enumerate(children_data, start=1):
-        if i % FLUSH_OBJECTS == 0:
-            session.flush_counts()
+    for child_data in children_data:
+        session.flush_counts()
 
         _log_scope = f"{log_scope} {resource} {match_field}='{child_data[match_field]}'"
         child_data["zaaktype"] = zaaktype_url
@@ -232,13 +360,18 @@ def update_zaaktype_children(
             # check the lookup for existing resource
             remote = remote_map.get(child_data[match_field])
             if remote:
-                obj = client.update(resource, child_data, url=remote["url"])
+                with api_span(session, "update", resource, identificatie):
+                    obj = client.update(resource, child_data, url=remote["url"])
                 session.counter.increment_updated(type_key)
                 session.log_info(f"{_log_scope} updated existing")
             else:
-                obj = client.create(resource, child_data)
+                with api_span(session, "create", resource, identificatie):
+                    obj = client.create(resource, child_data)
                 session.counter.increment_created(type_key)
                 session.log_info(f"{_log_scope} created new")
+                if children_index is not None:
+                    with session.lock:
+                        children_index[zaaktype_url].append(obj)
 
         except (ClientError, HTTPError) as exc:
             session.counter.increment_errored(type_key)
@@ -281,77 +414,207 @@ def update_zaaktype_informatieobjecttypen(
     )
 
 
-def load_data(
-    session,
-    zaaktypen_data: List[dict],
-    iotypen_data: List[dict],
-):
+def prepare_load(session, iotypen_data: List[dict]) -> Optional[Dict[str, str]]:
     """
-    load data to catalog
+    load the informatieobjecttypen and build the prefetched indexes
+
+    returns the urls of the informatieobjecttypen by omschrijving, or None if we can't continue
     """
     try:
-        iotypen = update_informatieobjecttypen(session, iotypen_data)
+        with session.timings.stage(JobStage.load_iotypen):
+            iotypen = update_informatieobjecttypen(session, iotypen_data)
     except (ClientError, HTTPError) as exc:
         session.log_error(
             f"informatieobjecttypen can't be created: {format_exception(exc)}",
             ObjectTypenKeys.informatieobjecttypen,
         )
         # bail?
-        return
+        return None
 
     iotypen_urls = {iotype["omschrijving"]: iotype["url"] for iotype in iotypen}
 
-    for zaaktype_data in zaaktypen_data:
-        log_scope = f"zaaktype {zaaktype_data['identificatie']}:"
+    if session.job.catalog.prefetch_zaaktypen:
+        try:
+            with session.timings.stage(JobStage.prefetch_zaaktypen):
+                session.zaaktypen_index = prefetch_zaaktypen(session)
+        except (ClientError, HTTPError) as exc:
+            session.log_error(
+                f"zaaktypen can't be fetched: {format_exception(exc)}",
+                ObjectTypenKeys.zaaktypen,
+            )
+            return None
 
-        children = zaaktype_data.pop("_children")
+    if session.job.catalog.prefetch_children:
         try:
-            zaaktype = update_zaaktype(session, zaaktype_data)
+            with session.timings.stage(JobStage.prefetch_children):
+                zaaktype_urls = get_catalog_zaaktype_urls(session)
         except (ClientError, HTTPError) as exc:
-            session.counter.increment_errored(ObjectTypenKeys.zaaktypen)
             session.log_error(
-                f"{log_scope} can't be created: {format_exception(exc)}",
+                f"zaaktypen can't be fetched: {format_exception(exc)}",
                 ObjectTypenKeys.zaaktypen,
             )
-            continue
+            return None
 
-        session.flush_counts()
+        for resource in ZAAKTYPE_CHILD_RESOURCES:
+            try:
+                with session.timings.stage(JobStage.prefetch_children):
+                    session.children_index[resource] = prefetch_zaaktype_children(
+                        session, resource, zaaktype_urls
+                    )
+            except (ClientError, HTTPError) as exc:
+                session.log_error(
+                    f"{resource} can't be fetched: {format_exception(exc)}"
+                )
+                return None
 
-        # create zaaktype relative objects
-        update_zaaktype_children(
-            session,
-            log_scope,
-            children["roltypen"],
-            zaaktype,
-            "roltype",
-            ObjectTypenKeys.roltypen,
-            "omschrijving",
-        )
+    return iotypen_urls
 
-        update_zaaktype_children(
-            session,
-            log_scope,
-            children["statustypen"],
-            zaaktype,
-            "statustype",
-            ObjectTypenKeys.statustypen,
-            "volgnummer",
-        )
 
-        update_zaaktype_children(
-            session,
-            log_scope,
-            children["resultaattypen"],
-            zaaktype,
-            "resultaattype",
-            ObjectTypenKeys.resultaattypen,
-            "omschrijving",
-        )
+def load_data(
+    session,
+    zaaktypen_data: List[dict],
+    iotypen_data: List[dict],
+):
+    """
+    load data to catalog
+    """
+    iotypen_urls = prepare_load(session, iotypen_data)
+    if iotypen_urls is None:
+        return
+
+    workers = session.job.catalog.loader_workers
+    with session.timings.stage(JobStage.load_zaaktypen):
+        if workers > 1 and len(zaaktypen_data) > 1:
+            load_zaaktypen_concurrent(session, zaaktypen_data, iotypen_urls, workers)
+        else:
+            for zaaktype_data in zaaktypen_data:
+                load_zaaktype(session, zaaktype_data, iotypen_urls)
+
+
+def call_in_worker(transaction, func: callable, *args):
+    """
+    call a function from a worker thread, in the APM transaction of the thread that submitted it
+    """
+    # the APM context is per thread, without the transaction the spans of the worker are dropped
+    execution_context.set_transaction(transaction)
+    try:
+        return func(*args)
+    finally:
+        execution_context.set_transaction(None)
+        # we're in our own thread with our own database connections
+        connections.close_all()
+
+
+def load_zaaktypen_concurrent(
+    session,
+    zaaktypen_data: List[dict],
+    iotypen_urls: Dict[str, str],
+    workers: int,
+):
+    """
+    load the zaaktypen in a pool of worker threads
+
+    zaaktypen with the same identificatie are versions of the same remote zaaktype, these are loaded
+      one after the other in a single worker so two workers never update the same zaaktype.
+
+    every zaaktype gets its own worker session with buffered logs, these are written in the original
+      order of the zaaktypen as they complete so the logs of each zaaktype stay together.
+    """
+    groups = OrderedDict()
+    tasks = []
+    for zaaktype_data in zaaktypen_data:
+        identificatie = zaaktype_data["identificatie"]
+        worker_session = session.create_worker_session()
+        groups.setdefault(identificatie, []).append((worker_session, zaaktype_data))
+        tasks.append((worker_session, identificatie))
+
+    transaction = execution_context.get_transaction()
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="loader"
+    ) as executor:
+        futures = {
+            identificatie: executor.submit(
+                call_in_worker, transaction, load_zaaktype_group, group, iotypen_urls
+            )
+            for identificatie, group in groups.items()
+        }
+
+        try:
+            for worker_session, identificatie in tasks:
+                try:
+                    futures[identificatie].result()
+                finally:
+                    session.merge_worker_session(worker_session)
+                session.flush_counts()
+        except BaseException:
+            # on errors don't start the zaaktypen that are still waiting
+            for future in futures.values():
+                future.cancel()
+            raise
+
+
+def load_zaaktype_group(group: List[tuple], iotypen_urls: Dict[str, str]):
+    """
+    load the zaaktypen with the same identificatie in their original order
+    """
+    for worker_session, zaaktype_data in group:
+        load_zaaktype(worker_session, zaaktype_data, iotypen_urls)
 
-        update_zaaktype_informatieobjecttypen(
-            session,
-            log_scope,
-            children["zaakinformatieobjecttypen"],
-            iotypen_urls,
-            zaaktype,
+
+def load_zaaktype(session, zaaktype_data: dict, iotypen_urls: Dict[str, str]):
+    """
+    load a single zaaktype and its children
+    """
+    log_scope = f"zaaktype {zaaktype_data['identificatie']}:"
+
+    children = zaaktype_data.pop("_children")
+    try:
+        zaaktype = update_zaaktype(session, zaaktype_data)
+    except (ClientError, HTTPError) as exc:
+        session.counter.increment_errored(ObjectTypenKeys.zaaktypen)
+        session.log_error(
+            f"{log_scope} can't be created: {format_exception(exc)}",
+            ObjectTypenKeys.zaaktypen,
         )
+        return
+
+    session.flush_counts()
+
+    # create zaaktype relative objects
+    update_zaaktype_children(
+        session,
+        log_scope,
+        children["roltypen"],
+        zaaktype,
+        "roltype",
+        ObjectTypenKeys.roltypen,
+        "omschrijving",
+    )
+
+    update_zaaktype_children(
+        session,
+        log_scope,
+        children["statustypen"],
+        zaaktype,
+        "statustype",
+        ObjectTypenKeys.statustypen,
+        "volgnummer",
+    )
+
+    update_zaaktype_children(
+        session,
+        log_scope,
+        children["resultaattypen"],
+        zaaktype,
+        "resultaattype",
+        ObjectTypenKeys.resultaattypen,
+        "omschrijving",
+    )
+
+    update_zaaktype_informatieobjecttypen(
+        session,
+        log_scope,
+        children["zaakinformatieobjecttypen"],
+        iotypen_urls,
+        zaaktype,
+    )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from importer.core.models import Job, JobLog
+
+
+class Command(BaseCommand):
+    help = "Delete the logs of completed and failed Jobs that stopped some days ago (run this periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.JOBLOG_RETENTION_DAYS,
+            help="Keep logs of jobs that stopped less than this many days ago",
+        )
+
+    def handle(self, **options):
+        count = JobLog.objects.filter_expired(options["days"]).purge()
+        self.stdout.write(f"Deleted {count} logs")
+
+        archived = Job.objects.filter_expired(options["days"]).exclude(log_archive="")
+        for job in archived:
+            job.log_archive.delete(save=False)
+            job.save(update_fields=("log_archive",))
+        self.stdout.write(f"Deleted {len(archived)} log archives")
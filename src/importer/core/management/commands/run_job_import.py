@@ -11,6 +11,12 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("job_id", type=int)
         parser.add_argument("--queue", action="store_true", default=False)
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            default=False,
+            help="Profile the job and store the result with the job",
+        )
 
     def handle(self, **options):
         job_id = options["job_id"]
@@ -20,8 +26,10 @@ class Command(BaseCommand):
             self.stdout.print(f"Job {job_id} not found")
             exit(1)
         else:
-            job.joblog_set.all().delete()
+            job.joblog_set.purge()
             job.state = JobState.queued
+            if options["profile"]:
+                job.profiling = True
             job.save()
 
             if options["queue"]:
@@ -0,0 +1,206 @@
+from typing import List, Optional
+
+from django.db.models import Count
+
+from importer.core.choices import JobLogLevel, JobState
+from importer.core.constants import ObjectTypenKeys
+from importer.core.models import Job
+from importer.utils.cache import CACHE_METRIC, cache_metrics
+from importer.utils.metrics import (
+    MetricsBuffer,
+    format_sample,
+    get_histogram_samples,
+    read_samples,
+    render_family,
+)
+
+JOB_DURATION_METRIC = "importer_job_duration_seconds"
+JOB_DURATION_BUCKETS = (10, 30, 60, 120, 300, 600, 1800, 3600)
+JOB_PHASES = ("precheck", "import")
+
+OBJECTS_METRIC = "importer_objects_total"
+JOBLOGS_METRIC = "importer_joblogs_total"
+
+HTTP_REQUESTS_METRIC = "importer_http_requests_total"
+HTTP_DURATION_METRIC = "importer_http_request_duration_seconds"
+HTTP_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HTTP_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+HTTP_RESOURCES = (
+    "catalogus",
+    "zaaktype",
+    "informatieobjecttype",
+    "roltype",
+    "statustype",
+    "resultaattype",
+    "zaakinformatieobjecttype",
+    "other",
+)
+HTTP_STATUSES = ("2xx", "3xx", "4xx", "5xx", "error")
+
+SELECTIELIJST_CACHES = (
+    "selectielijst:procestypen",
+    "selectielijst:resultaattypeomschrijvingen",
+    "selectielijst:resultaaten",
+)
+CACHE_RESULTS = ("hit", "stale", "miss")
+
+
+def get_status_class(status_code: Optional[int]) -> str:
+    if not status_code:
+        return "error"
+    return f"{status_code // 100}xx"
+
+
+def observe_http_request(
+    metrics: MetricsBuffer,
+    method: str,
+    resource: str,
+    status_code: Optional[int],
+    duration: float,
+):
+    if resource not in HTTP_RESOURCES:
+        resource = "other"
+    metrics.increment(
+        HTTP_REQUESTS_METRIC,
+        method=method.upper(),
+        resource=resource,
+        status=get_status_class(status_code),
+    )
+    metrics.observe(
+        HTTP_DURATION_METRIC, duration, HTTP_DURATION_BUCKETS, resource=resource
+    )
+
+
+def record_job_metrics(job, phase: str, duration: float):
+    """
+    record the duration and the handled objects of a finished precheck or import task
+    """
+    assert phase in JOB_PHASES
+    metrics = MetricsBuffer()
+    metrics.observe(JOB_DURATION_METRIC, duration, JOB_DURATION_BUCKETS, phase=phase)
+
+    data = (job.statistics or dict()).get("data", dict())
+    for type_key, value in data.items():
+        if phase == "precheck":
+            count = value.get("counted", 0)
+        else:
+            count = (
+                value.get("updated", 0)
+                + value.get("created", 0)
+                + value.get("errored", 0)
+            )
+        if count:
+            metrics.increment(OBJECTS_METRIC, count, phase=phase, type_key=type_key)
+
+    metrics.flush()
+    # write the remaining cache lookups of this process as well
+    cache_metrics.flush()
+
+
+def get_job_state_lines() -> List[str]:
+    counts = {
+        row["state"]: row["count"]
+        for row in Job.objects.order_by().values("state").annotate(count=Count("id"))
+    }
+    lines = render_family(
+        "importer_jobs",
+        "gauge",
+        "Number of import jobs by state.",
+        [
+            (format_sample("importer_jobs", {"state": state}), counts.get(state, 0))
+            for state in JobState.values
+        ],
+    )
+    lines += render_family(
+        "importer_jobs_queued",
+        "gauge",
+        "Number of import jobs waiting for a worker.",
+        [("importer_jobs_queued", Job.objects.filter_queued().count())],
+    )
+    return lines
+
+
+def render_counter(name: str, help_text: str, label_sets: List[dict]) -> List[str]:
+    samples = [format_sample(name, labels) for labels in label_sets]
+    values = read_samples(samples)
+    return render_family(
+        name,
+        "counter",
+        help_text,
+        [(sample, values[sample]) for sample in samples if sample in values],
+    )
+
+
+def render_histogram(
+    name: str, help_text: str, buckets: tuple, label_sets: List[dict]
+) -> List[str]:
+    histograms = [get_histogram_samples(name, buckets, labels) for labels in label_sets]
+    values = read_samples(sample for samples in histograms for sample in samples)
+    return render_family(
+        name,
+        "histogram",
+        help_text,
+        [
+            (sample, values.get(sample, 0))
+            for samples in histograms
+            # only the label sets with observations, the last sample is the count
+            if samples[-1] in values
+            for sample in samples
+        ],
+    )
+
+
+def collect_metrics() -> str:
+    """
+    all metrics in the Prometheus text format
+
+    the job counts come from the database, the other metrics are written by the workers of all instances
+      to the shared cache, see importer.utils.metrics.
+    """
+    lines = get_job_state_lines()
+    lines += render_histogram(
+        JOB_DURATION_METRIC,
+        "Duration of the precheck and import tasks.",
+        JOB_DURATION_BUCKETS,
+        [{"phase": phase} for phase in JOB_PHASES],
+    )
+    lines += render_counter(
+        OBJECTS_METRIC,
+        "Objects handled by finished precheck and import tasks.",
+        [
+            {"phase": phase, "type_key": type_key}
+            for phase in JOB_PHASES
+            for type_key in ObjectTypenKeys.values
+        ],
+    )
+    lines += render_counter(
+        HTTP_REQUESTS_METRIC,
+        "Requests to the Catalogi API by method, resource and status class.",
+        [
+            {"method": method, "resource": resource, "status": status}
+            for method in HTTP_METHODS
+            for resource in HTTP_RESOURCES
+            for status in HTTP_STATUSES
+        ],
+    )
+    lines += render_histogram(
+        HTTP_DURATION_METRIC,
+        "Latency of the requests to the Catalogi API.",
+        HTTP_DURATION_BUCKETS,
+        [{"resource": resource} for resource in HTTP_RESOURCES],
+    )
+    lines += render_counter(
+        CACHE_METRIC,
+        "Lookups of the cached Selectielijst data by result.",
+        [
+            {"cache": name, "result": result}
+            for name in SELECTIELIJST_CACHES
+            for result in CACHE_RESULTS
+        ],
+    )
+    lines += render_counter(
+        JOBLOGS_METRIC,
+        "Job logs written to the database by level.",
+        [{"level": level} for level in JobLogLevel.values],
+    )
+    return "\n".join(lines) + "\n"
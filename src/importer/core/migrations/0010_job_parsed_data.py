@@ -0,0 +1,28 @@
+# Generated by Django 2.2.20 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+import importer.core.models
+import importer.utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_auto_20210301_1526"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="parsed_data",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="Compressed result of the precheck, reused by the import.",
+                storage=importer.utils.storage.PrivateFileSystemStorage(),
+                upload_to=importer.core.models.get_job_parsed_file_name,
+                verbose_name="Parsed data",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.20 on 2026-10-17 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_job_parsed_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogconfig",
+            name="prefetch_zaaktypen",
+            field=models.BooleanField(
+                default=False,
+                help_text="Fetch all zaaktypen of the catalog once at the start of an import, instead of searching every zaaktype separately.",
+                verbose_name="Prefetch zaaktypen",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.20 on 2026-10-17 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_catalogconfig_prefetch_zaaktypen"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogconfig",
+            name="prefetch_children",
+            field=models.BooleanField(
+                default=False,
+                help_text="Fetch all roltypen, statustypen, resultaattypen and zaakinformatieobjecttypen once at the start of an import, instead of for every zaaktype separately. Note this fetches these resources for all catalogs of the service.",
+                verbose_name="Prefetch zaaktype children",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.20 on 2026-10-17 12:04
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_catalogconfig_prefetch_children"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogconfig",
+            name="loader_workers",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Number of zaaktypen to load in parallel during an import. Use 1 to load them one after another.",
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(32),
+                ],
+                verbose_name="Loader workers",
+            ),
+        ),
+    ]
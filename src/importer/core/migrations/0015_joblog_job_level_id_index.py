@@ -0,0 +1,19 @@
+# Generated by Django 2.2.20 on 2026-10-17 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_catalogconfig_loader_workers"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="joblog",
+            index=models.Index(
+                fields=["job", "level", "id"], name="core_joblog_job_level_id"
+            ),
+        ),
+    ]
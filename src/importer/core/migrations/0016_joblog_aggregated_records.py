@@ -0,0 +1,69 @@
+# Generated by Django 2.2.20 on 2026-10-17 15:05
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_joblog_job_level_id_index"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="joblog",
+            options={"ordering": ("id",)},
+        ),
+        migrations.AddField(
+            model_name="joblog",
+            name="code",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("default_value", "Default value used"),
+                    ("unknown_choice", "Unknown choice"),
+                    ("trimmed", "Value trimmed"),
+                    (
+                        "doorlooptijd_fallback",
+                        "Afdoeningstermijn used as doorlooptijd",
+                    ),
+                    ("brondatum_default", "Brondatum archiefprocedure default used"),
+                ],
+                max_length=32,
+                verbose_name="Code",
+            ),
+        ),
+        migrations.AddField(
+            model_name="joblog",
+            name="count",
+            field=models.PositiveIntegerField(default=1, verbose_name="Count"),
+        ),
+        migrations.AddField(
+            model_name="joblog",
+            name="sample",
+            field=django.contrib.postgres.fields.jsonb.JSONField(
+                blank=True,
+                default=list,
+                help_text="Some of the objects this log applies to",
+                verbose_name="Sample",
+            ),
+        ),
+        migrations.AddField(
+            model_name="joblog",
+            name="type_key",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("rt", "Roltypen"),
+                    ("zt", "Zaaktypen"),
+                    ("st", "Statustypen"),
+                    ("rst", "Resultaattypen"),
+                    ("iot", "Informatieobjecttypen"),
+                    ("ziot", "Zaakinformatieobjecttypen"),
+                ],
+                max_length=8,
+                verbose_name="Type",
+            ),
+        ),
+    ]
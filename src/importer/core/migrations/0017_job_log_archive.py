@@ -0,0 +1,39 @@
+# Generated by Django 2.2.20 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+import importer.core.models
+import importer.utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_joblog_aggregated_records"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="log_archive",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="Compressed JSON lines file with all logs of the job.",
+                storage=importer.utils.storage.PrivateFileSystemStorage(),
+                upload_to=importer.core.models.get_job_log_archive_file_name,
+                verbose_name="Log archive",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="log_mode",
+            field=models.CharField(
+                choices=[("database", "Database"), ("archive", "Archive")],
+                default="database",
+                help_text="Store all logs in the database, or only the warnings and errors with all logs in a compressed archive file.",
+                max_length=32,
+                verbose_name="Log mode",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.20 on 2026-10-17 16:20
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_job_log_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="timings",
+            field=django.contrib.postgres.fields.jsonb.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Duration and processed objects per stage of the precheck and import.",
+                verbose_name="Timings",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.20 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+import importer.core.models
+import importer.utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_job_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="profile",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="ZIP file with the pstats and the collapsed stacks of the profiled precheck and import.",
+                storage=importer.utils.storage.PrivateFileSystemStorage(),
+                upload_to=importer.core.models.get_job_profile_file_name,
+                verbose_name="Profile",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="profiling",
+            field=models.BooleanField(
+                default=False,
+                help_text="Run the precheck and import under a profiler, this slows them down.",
+                verbose_name="Profiling",
+            ),
+        ),
+    ]
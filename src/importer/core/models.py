@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, timedelta
 from json import JSONDecodeError
 from urllib.parse import urljoin
 
@@ -20,7 +20,8 @@ from zds_client import ClientError, get_operation_url
 from zgw_consumers.constants import APITypes
 from zgw_consumers.models import Service
 
-from importer.core.choices import JobLogLevel, JobState
+from importer.core.choices import JobLogCode, JobLogLevel, JobLogMode, JobState
+from importer.core.constants import ObjectTypenKeys
 from importer.utils.storage import private_storage
 
 
@@ -80,6 +81,32 @@ class CatalogConfig(models.Model):
         blank=True,
         editable=False,
     )
+    prefetch_zaaktypen = models.BooleanField(
+        _("Prefetch zaaktypen"),
+        default=False,
+        help_text=_(
+            "Fetch all zaaktypen of the catalog once at the start of an import, "
+            "instead of searching every zaaktype separately."
+        ),
+    )
+    prefetch_children = models.BooleanField(
+        _("Prefetch zaaktype children"),
+        default=False,
+        help_text=_(
+            "Fetch all roltypen, statustypen, resultaattypen and zaakinformatieobjecttypen "
+            "once at the start of an import, instead of for every zaaktype separately. "
+            "Note this fetches these resources for all catalogs of the service."
+        ),
+    )
+    loader_workers = models.PositiveSmallIntegerField(
+        _("Loader workers"),
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(32)],
+        help_text=_(
+            "Number of zaaktypen to load in parallel during an import. "
+            "Use 1 to load them one after another."
+        ),
+    )
 
     class Meta:
         verbose_name = _("Catalog configuration")
@@ -122,10 +149,32 @@ def get_job_source_file_name(instance, filename):
     return f"jobs/source/{filename}"
 
 
+def get_job_parsed_file_name(instance, filename):
+    return f"jobs/parsed/{filename}"
+
+
+def get_job_log_archive_file_name(instance, filename):
+    return f"jobs/logs/{filename}"
+
+
+def get_job_profile_file_name(instance, filename):
+    return f"jobs/profiles/{filename}"
+
+
 class JobQueryset(models.QuerySet):
     def filter_queued(self):
         return self.filter(state=JobState.queued).order_by("pk")
 
+    def filter_expired(self, days: int):
+        """
+        completed or failed jobs that stopped more than 'days' ago
+        """
+        cutoff = timezone.now() - timedelta(days=days)
+        return self.filter(
+            state__in=(JobState.completed, JobState.error),
+            stopped_at__lt=cutoff,
+        )
+
 
 class Job(models.Model):
     catalog = models.ForeignKey(
@@ -144,6 +193,32 @@ class Job(models.Model):
         validators=[FileExtensionValidator(["xml"])],
         help_text=_("i-Navigator XML export file."),
     )
+    parsed_data = models.FileField(
+        _("Parsed data"),
+        upload_to=get_job_parsed_file_name,
+        storage=private_storage,
+        blank=True,
+        editable=False,
+        help_text=_("Compressed result of the precheck, reused by the import."),
+    )
+    log_archive = models.FileField(
+        _("Log archive"),
+        upload_to=get_job_log_archive_file_name,
+        storage=private_storage,
+        blank=True,
+        editable=False,
+        help_text=_("Compressed JSON lines file with all logs of the job."),
+    )
+    profile = models.FileField(
+        _("Profile"),
+        upload_to=get_job_profile_file_name,
+        storage=private_storage,
+        blank=True,
+        editable=False,
+        help_text=_(
+            "ZIP file with the pstats and the collapsed stacks of the profiled precheck and import."
+        ),
+    )
     start_date = models.DateField(
         _("Start date"),
         default=date.today,
@@ -154,6 +229,22 @@ class Job(models.Model):
         default=False,
         help_text=_("Close existing records if a new version is created"),
     )
+    log_mode = models.CharField(
+        _("Log mode"),
+        max_length=32,
+        default=JobLogMode.database,
+        choices=JobLogMode.choices,
+        help_text=_(
+            "Store all logs in the database, or only the warnings and errors with all logs in a compressed archive file."
+        ),
+    )
+    profiling = models.BooleanField(
+        _("Profiling"),
+        default=False,
+        help_text=_(
+            "Run the precheck and import under a profiler, this slows them down."
+        ),
+    )
     state = models.CharField(
         _("State"),
         max_length=32,
@@ -166,6 +257,14 @@ class Job(models.Model):
         default=dict,
         blank=True,
     )
+    timings = JSONField(
+        _("Timings"),
+        default=dict,
+        blank=True,
+        help_text=_(
+            "Duration and processed objects per stage of the precheck and import."
+        ),
+    )
     created_at = models.DateTimeField(
         _("Job created"), auto_now_add=True, db_index=True
     )
@@ -237,6 +336,23 @@ class Job(models.Model):
     get_duration_display.short_description = _("Job Duration")
 
 
+class JobLogQueryset(models.QuerySet):
+    def purge(self) -> int:
+        """
+        delete the logs, returns the number of deleted logs
+
+        JobLog has no relations or signals so Django deletes these with a single DELETE query, keep it that way
+        """
+        count, _ = self.delete()
+        return count
+
+    def filter_expired(self, days: int):
+        """
+        logs of completed or failed jobs that stopped more than 'days' ago
+        """
+        return self.filter(job__in=Job.objects.filter_expired(days))
+
+
 class JobLog(models.Model):
     job = models.ForeignKey(
         "core.Job",
@@ -256,6 +372,38 @@ class JobLog(models.Model):
 
     message = models.TextField(_("Message"), default="")
 
+    # aggregated log records, see ImportSession.log_record()
+    code = models.CharField(
+        _("Code"),
+        max_length=32,
+        blank=True,
+        choices=JobLogCode.choices,
+    )
+    type_key = models.CharField(
+        _("Type"),
+        max_length=8,
+        blank=True,
+        choices=ObjectTypenKeys.choices,
+    )
+    count = models.PositiveIntegerField(_("Count"), default=1)
+    sample = JSONField(
+        _("Sample"),
+        default=list,
+        blank=True,
+        help_text=_("Some of the objects this log applies to"),
+    )
+
+    objects = JobLogQueryset.as_manager()
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            # paginated and level filtered logs of a job
+            models.Index(
+                fields=["job", "level", "id"], name="core_joblog_job_level_id"
+            ),
+        ]
+
     def message_trim_line(self, length=64):
         line = self.message.splitlines()[0]
         out = line[:length]
@@ -1,6 +1,6 @@
 import logging
 import re
-from typing import Optional, Tuple
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
 
 from dateutil.parser import isoparse
 from lxml import etree
@@ -9,6 +9,7 @@ from zgw_consumers.api_models.constants import (
     VertrouwelijkheidsAanduidingen,
 )
 
+from .choices import JobLogCode, JobLogLevel, JobStage
 from .constants import (
     Archiefnominatie,
     BrondatumArchiefprocedureAfleidingswijze,
@@ -16,11 +17,6 @@ from .constants import (
     RichtingChoices,
 )
 from .reporting import format_exception
-from .selectielijst import (
-    get_procestypen,
-    get_resultaaten,
-    get_resultaattype_omschrijvingen,
-)
 
 DEFAULT_VERTROUWELIJKHEID = VertrouwelijkheidsAanduidingen.openbaar
 DEFAULT_ROL_OMSCHRIVING = RolOmschrijving.adviseur
@@ -49,11 +45,16 @@ def find(el: etree.ElementBase, path: str, required=True) -> str:
         return result or ""
 
 
-def value_or_default(session, log_scope, value, default, type_key):
+def value_or_default(session, log_scope, field_name, value, default, type_key):
     """return value if set, else log and return default"""
     if not value:
-        session.log_info(
-            f"{log_scope} not defined. It will be set as '{default}'", type_key
+        session.log_record(
+            JobLogLevel.info,
+            JobLogCode.default_value,
+            log_scope,
+            type_key,
+            field=field_name,
+            default=default,
         )
         return default
     else:
@@ -63,9 +64,14 @@ def value_or_default(session, log_scope, value, default, type_key):
 def trim_string(session, log_scope, string, length, field_name, type_key):
     ret = string[:length].strip()
     if ret != string:
-        session.log_info(
-            f"{log_scope} Imported value for '{field_name}' is trimmed from {len(string)} characters to {length}.",
+        session.log_record(
+            JobLogLevel.info,
+            JobLogCode.trimmed,
+            log_scope,
             type_key,
+            detail=f"{len(string)} characters",
+            field=field_name,
+            length=length,
         )
     return ret
 
@@ -112,6 +118,7 @@ def quote_join(seq):
 def get_choice_field(
     session,
     log_scope,
+    field_name: str,
     value: str,
     choices: dict,
     type_key: str,
@@ -129,17 +136,28 @@ def get_choice_field(
     if not value:
         if required:
             session.log_error(
-                f"{log_scope} not defined but marked as required. If continued, this will be set as '{default}'",
+                f"{log_scope} {field_name} not defined but marked as required. If continued, this will be set as '{default}'",
                 type_key,
             )
         else:
-            session.log_info(
-                f"{log_scope} not defined. It will be set as '{default}'", type_key
+            session.log_record(
+                JobLogLevel.info,
+                JobLogCode.default_value,
+                log_scope,
+                type_key,
+                field=field_name,
+                default=default,
             )
     else:
-        session.log_warning(
-            f"{log_scope} cannot find '{formatted_value}' in options {quote_join(choices)}. It will be set as '{default}'",
+        session.log_record(
+            JobLogLevel.warning,
+            JobLogCode.unknown_choice,
+            log_scope,
             type_key,
+            field=field_name,
+            value=formatted_value,
+            options=quote_join(choices),
+            default=default,
         )
     return default
 
@@ -175,7 +193,9 @@ def get_resultaat_number(resultaattype: etree.ElementBase) -> str:
     return ""
 
 
-def get_procestype(process: etree.ElementBase, processtype_year: int) -> str:
+def get_procestype(
+    session, log_scope, process: etree.ElementBase, processtype_year: int
+) -> str:
     # use vernietigingsgrondslag from the first resultaattype of this zaaktype
     resultaattype = process.find("resultaattypen/resultaattype")
     resultaat_number = get_resultaat_number(resultaattype)
@@ -185,9 +205,13 @@ def get_procestype(process: etree.ElementBase, processtype_year: int) -> str:
         return ""
 
     procestype_number = int(resultaat_number.split(".")[0])
-    procestype = [
-        p for p in get_procestypen(processtype_year) if p["nummer"] == procestype_number
-    ][0]
+    procestype = session.selectielijst.get_procestype(
+        processtype_year, procestype_number
+    )
+    if not procestype:
+        raise ParserException(
+            f'{log_scope} Imported "resultaat" number ({resultaat_number}) does not match a "procestype" in the Selectielijst API.'
+        )
 
     return procestype["url"]
 
@@ -197,12 +221,11 @@ def get_resultaattype_omschrijving(
 ) -> str:
     # Infer URL from naam-model
     omschrijving = find(resultaattype, "velden/naam-model", False)
-    resultaattype_omschrijvingen = get_resultaattype_omschrijvingen()
-    filtered_omschrijvingen = [
-        r for r in resultaattype_omschrijvingen if r["omschrijving"] == omschrijving
-    ]
+    resultaattype_omschrijving = session.selectielijst.get_resultaattype_omschrijving(
+        omschrijving
+    )
 
-    if not filtered_omschrijvingen:
+    if not resultaattype_omschrijving:
         # decision by Joeri (2-4-2021, ticket #77) to silently use default 'Onbekend' and not log,
         #   because the user data has unmatchable names and as 'resultaattypeomschrijving' is problematic in the API spec/design
         # session.log_warning(
@@ -211,7 +234,7 @@ def get_resultaattype_omschrijving(
         # )
         return DEFAULT_RESULTAATTYPE_OMSCHRIJVINGEN
 
-    return filtered_omschrijvingen[0]["url"]
+    return resultaattype_omschrijving["url"]
 
 
 def get_resultaat(
@@ -223,18 +246,13 @@ def get_resultaat(
             f'{log_scope} Imported "resultaat" does not contain a resultaat number to find a matching entry in the Selectielijst API.'
         )
 
-    resultaten = get_resultaaten()
-    filtered_resultaaten = [
-        r
-        for r in resultaten
-        if r["volledigNummer"] == resultaat_number and r["procesType"] == processtype
-    ]
-    if not filtered_resultaaten:
+    resultaat = session.selectielijst.get_resultaat(resultaat_number, processtype)
+    if not resultaat:
         raise ParserException(
             f'{log_scope} Imported "resultaat" does not contain a valid combination of resultaat number ({resultaat_number}) and processType ({processtype}) to match "volledigNummer" and "procesType" in the Selectielijst API.'
         )
 
-    return filtered_resultaaten[0]["url"]
+    return resultaat["url"]
 
 
 def construct_zaaktype_data(
@@ -265,28 +283,32 @@ def construct_zaaktype_data(
     )
     handeling_initiator = value_or_default(
         session,
-        f"{log_scope} handelingInitiator",
+        log_scope,
+        "handelingInitiator",
         find(fields, "zaaktype-naam/structuur/handeling-initiator", False),
         DEFAULT_HANDELING_INITIATOR,
         ObjectTypenKeys.zaaktypen,
     )
     aanleiding = value_or_default(
         session,
-        f"{log_scope} aanleiding",
+        log_scope,
+        "aanleiding",
         find(fields, "aanleiding", False),
         DEFAULT_AANLEIDING,
         ObjectTypenKeys.zaaktypen,
     )
     onderwerp = value_or_default(
         session,
-        f"{log_scope} onderwerp",
+        log_scope,
+        "onderwerp",
         find(fields, "zaaktype-naam/structuur/onderwerp", False),
         DEFAULT_ONDERWERP,
         ObjectTypenKeys.zaaktypen,
     )
     handeling_behandelaar = value_or_default(
         session,
-        f"{log_scope} handeling_behandelaar",
+        log_scope,
+        "handeling_behandelaar",
         find(fields, "zaaktype-naam/structuur/handeling-behandelaar", False),
         DEFAULT_HANDELING_BEHANDELAAR,
         ObjectTypenKeys.zaaktypen,
@@ -305,9 +327,12 @@ def construct_zaaktype_data(
             find(fields, "afdoeningstermijn"),
             find(fields, "afdoeningstermijn-eenheid"),
         )
-        session.log_info(
-            f'{log_scope} Used "afdoeningstermijn" ({doorlooptijd}) for "Zaaktype.doorlooptijd": Import has no value for "wettelijke-afdoeningstermijn".',
+        session.log_record(
+            JobLogLevel.info,
+            JobLogCode.doorlooptijd_fallback,
+            log_scope,
             ObjectTypenKeys.zaaktypen,
+            detail=doorlooptijd,
         )
 
     verlengings_termijn = get_duration(
@@ -321,7 +346,8 @@ def construct_zaaktype_data(
         "omschrijvingGeneriek": omschrijvingGeneriek,
         "vertrouwelijkheidaanduiding": get_choice_field(
             session,
-            f"{log_scope} vertrouwelijkheidaanduiding",
+            log_scope,
+            "vertrouwelijkheidaanduiding",
             find(fields, "vertrouwelijkheid", False),
             VertrouwelijkheidsAanduidingen.values,
             ObjectTypenKeys.zaaktypen,
@@ -349,7 +375,9 @@ def construct_zaaktype_data(
         "verantwoordingsrelatie": get_array(
             find(fields, "verantwoordingsrelatie", False)
         ),  # always empty?
-        "selectielijstProcestype": get_procestype(process, processtype_year),
+        "selectielijstProcestype": get_procestype(
+            session, log_scope, process, processtype_year
+        ),
         "referentieproces": {"naam": find(fields, "ztc-procestype")},
         # Set during `load_data`
         # "catalogus": "",
@@ -372,7 +400,8 @@ def construct_roltype_data(session, log_scope, roltype: etree.ElementBase) -> di
         "omschrijving": find(fields, "naam"),
         "omschrijvingGeneriek": get_choice_field(
             session,
-            f"{log_scope} omschrijvingGeneriek",
+            log_scope,
+            "omschrijvingGeneriek",
             find(fields, "naam-model", False),
             RolOmschrijving.values,
             ObjectTypenKeys.roltypen,
@@ -404,7 +433,8 @@ def construct_resultaattype_data(
     toelichting = find(fields, "toelichting", False)
     afleidingswijze = get_choice_field(
         session,
-        f"{log_scope} afleidingswijze",
+        log_scope,
+        "afleidingswijze",
         find(fields, "brondatum-archiefprocedure", False),
         BrondatumArchiefprocedureAfleidingswijze.values,
         ObjectTypenKeys.resultaattypen,
@@ -447,7 +477,8 @@ def construct_resultaattype_data(
         "toelichting": toelichting,
         "archiefnominatie": get_choice_field(
             session,
-            f"{log_scope} archiefnominatie",
+            log_scope,
+            "archiefnominatie",
             find(fields, "waardering", False),
             Archiefnominatie.values,
             ObjectTypenKeys.resultaattypen,
@@ -474,16 +505,15 @@ def construct_resultaattype_data(
     if brondatum_params["afleidingswijze"] == "ander_datumkenmerk":
         brondatum_params["objecttype"] = "overige"
         brondatum_params["registratie"] = "TODO"
-        session.log_info(
-            f"{log_scope} resultaattype '{resultaattype_data['omschrijving']}' doesn't have "
-            f"brondatumArchiefprocedure.objecttype. It will be set as 'overige'",
-            ObjectTypenKeys.resultaattypen,
-        )
-        session.log_info(
-            f"{log_scope} resultaattype '{resultaattype_data['omschrijving']}' doesn't have "
-            f"brondatumArchiefprocedure.registratie. It will be set as 'TODO'",
-            ObjectTypenKeys.resultaattypen,
-        )
+        for field_name in ("objecttype", "registratie"):
+            session.log_record(
+                JobLogLevel.info,
+                JobLogCode.brondatum_default,
+                f"{log_scope} resultaattype '{resultaattype_data['omschrijving']}'",
+                ObjectTypenKeys.resultaattypen,
+                field=field_name,
+                default=brondatum_params[field_name],
+            )
 
     return resultaattype_data
 
@@ -509,7 +539,8 @@ def construct_iotype_data(session, log_scope, document: etree.ElementBase) -> di
         # FIXME this field is always empty in the example xml
         "vertrouwelijkheidaanduiding": get_choice_field(
             session,
-            f"{log_scope} vertrouwelijkheidaanduiding",
+            log_scope,
+            "vertrouwelijkheidaanduiding",
             find(fields, "vertrouwelijkheid", False),
             VertrouwelijkheidsAanduidingen.values,
             ObjectTypenKeys.informatieobjecttypen,
@@ -537,7 +568,8 @@ def construct_ziotype_data(session, log_scope, document: etree.ElementBase) -> d
         "volgnummer": int(document.get("volgnummer")),
         "richting": get_choice_field(
             session,
-            f"{log_scope} richting",
+            log_scope,
+            "richting",
             find(fields, "type", False),
             RichtingChoices.values,
             ObjectTypenKeys.zaakinformatieobjecttypen,
@@ -548,11 +580,13 @@ def construct_ziotype_data(session, log_scope, document: etree.ElementBase) -> d
     }
 
 
-def parse_xml(
-    session, tree: etree.ElementTree, processtype_year: int
-) -> Tuple[list, list]:
-
+def read_preambule(source: BinaryIO) -> Optional[etree.ElementBase]:
     """
+    stream the XML until the /dsp/preambule element and return it, without reading the processen
+
+    the preambule is the first element of a valid file, so we stop at the first element that ends
+      outside of it instead of reading a file without preambule to the end
+
     <dsp
     xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
     <preambule>
@@ -561,133 +595,193 @@ def parse_xml(
         <gebruiker>admin</gebruiker>
         <specificatieversie>ICR1.5.13</specificatieversie>
     """
+    for event, elem in etree.iterparse(source, events=("end",)):
+        if elem.tag == "preambule":
+            parent = elem.getparent()
+            if (
+                parent is not None
+                and parent.tag == "dsp"
+                and parent.getparent() is None
+            ):
+                return elem
+        elif any(ancestor.tag == "preambule" for ancestor in elem.iterancestors()):
+            # part of the preambule
+            continue
+        elem.clear()
+        return None
+    return None
 
-    zaaktypen_data = []
-    iotypen_dict = {}
-    for process in tree.xpath("/dsp/processen")[0]:
-        log_scope = f"zaaktype {process.get('id')}:"
 
-        try:
-            zaaktype_data = construct_zaaktype_data(
-                session, log_scope, process, processtype_year
-            )
-            session.counter.increment_counted(ObjectTypenKeys.zaaktypen)
-        except ParserException as exc:
-            session.counter.increment_errored(ObjectTypenKeys.zaaktypen)
-            session.log_error(
-                format_exception(exc),
-                ObjectTypenKeys.zaaktypen,
-            )
+def iter_processes(source: BinaryIO) -> Iterator[etree.ElementBase]:
+    """
+    stream the /dsp/processen/proces elements from the XML
+
+    every element is cleared (together with its already handled siblings) once the consumer
+      asks for the next one, so the memory use doesn't grow with the size of the file
+    """
+    for event, process in etree.iterparse(source, events=("end",), tag="proces"):
+        processen = process.getparent()
+        if processen is None or processen.tag != "processen":
             continue
 
-        roltypen_data = []
-        for roltype in process.find("roltypen"):
-            try:
-                rolype_data = construct_roltype_data(session, log_scope, roltype)
-                roltypen_data.append(rolype_data)
-                session.counter.increment_counted(ObjectTypenKeys.roltypen)
-            except ParserException as exc:
-                session.counter.increment_errored(ObjectTypenKeys.roltypen)
-                session.log_error(
-                    f"{log_scope} Imported roltype '{roltype.get('omschrijving')}' cannot be parsed: {format_exception(exc)}",
-                    ObjectTypenKeys.roltypen,
-                )
-                continue
+        # drop the siblings we handled earlier
+        while process.getprevious() is not None:
+            del processen[0]
 
-        statustypen_data = []
-        for statustype in process.find("statustypen"):
-            try:
-                statusype_data = construct_statustype_data(
-                    session, log_scope, statustype
-                )
-                statustypen_data.append(statusype_data)
-                session.counter.increment_counted(ObjectTypenKeys.statustypen)
-            except ParserException as exc:
-                session.counter.increment_errored(ObjectTypenKeys.statustypen)
-                session.log_error(
-                    f"{log_scope} Imported statustype '{statustype.get('volgnummer')}' cannot be parsed: {format_exception(exc)}",
-                    ObjectTypenKeys.statustypen,
-                )
-                continue
+        yield process
 
-        resultaattypen_data = []
-        for resultaattype in process.find("resultaattypen"):
-            try:
-                resultaatype_data = construct_resultaattype_data(
-                    session,
-                    log_scope,
-                    resultaattype,
-                    zaaktype_data["selectielijstProcestype"],
-                )
-                resultaattypen_data.append(resultaatype_data)
-                session.counter.increment_counted(ObjectTypenKeys.resultaattypen)
-            except ParserException as exc:
-                session.counter.increment_errored(ObjectTypenKeys.resultaattypen)
-                session.log_error(
-                    f"{log_scope} Imported resultaattype '{resultaattype.get('id')}' cannot be parsed: {format_exception(exc)}",
-                    ObjectTypenKeys.resultaattypen,
-                )
-                continue
+        process.clear()
 
-        iotypen_data = []
-        for iotype in process.find("documenttypen"):
-            try:
-                ioype_data = construct_iotype_data(session, log_scope, iotype)
-                iotypen_data.append(ioype_data)
-                # note we dont count here since we de-duplicate later
-            except ParserException as exc:
-                session.counter.increment_errored(ObjectTypenKeys.informatieobjecttypen)
-                session.log_error(
-                    f"{log_scope} Imported documenttype '{iotype.get('omschrijving')}' cannot be parsed: {format_exception(exc)}",
-                    ObjectTypenKeys.informatieobjecttypen,
-                )
-                continue
 
-        ziotypen_data = []
-        for ziotype in process.find("documenttypen"):
+def iterparse_xml(
+    session, source: BinaryIO, processtype_year: int
+) -> Tuple[list, list]:
+    """
+    parse the zaaktypen and informatieobjecttypen while streaming the XML from a file
+    """
+    processes = session.timings.iter_stage(
+        JobStage.read_processes, iter_processes(source)
+    )
+    return parse_processes(session, processes, processtype_year)
+
+
+def parse_processes(
+    session, processes: Iterable[etree.ElementBase], processtype_year: int
+) -> Tuple[list, list]:
+    zaaktypen_data = []
+    iotypen_dict = {}
+    for process in processes:
+        log_scope = f"zaaktype {process.get('id')}:"
+        with session.capture_span(
+            "parse zaaktype",
+            span_subtype="parser",
+            type_key=ObjectTypenKeys.zaaktypen,
+            zaaktype=process.get("id"),
+        ):
+
             try:
-                zioype_data = construct_ziotype_data(session, log_scope, ziotype)
-                ziotypen_data.append(zioype_data)
-                session.counter.increment_counted(
-                    ObjectTypenKeys.zaakinformatieobjecttypen
+                zaaktype_data = construct_zaaktype_data(
+                    session, log_scope, process, processtype_year
                 )
+                session.counter.increment_counted(ObjectTypenKeys.zaaktypen)
             except ParserException as exc:
-                session.counter.increment_errored(
-                    ObjectTypenKeys.zaakinformatieobjecttypen
-                )
+                session.counter.increment_errored(ObjectTypenKeys.zaaktypen)
                 session.log_error(
-                    f"{log_scope} Imported documenttype-zaaktype relatie '{ziotype.get('volgnummer')}' cannot be parsed: {format_exception(exc)}",
-                    ObjectTypenKeys.zaakinformatieobjecttypen,
+                    format_exception(exc),
+                    ObjectTypenKeys.zaaktypen,
                 )
                 continue
 
-        zaaktype_data["_children"] = {
-            "roltypen": roltypen_data,
-            "statustypen": statustypen_data,
-            "resultaattypen": resultaattypen_data,
-            "zaakinformatieobjecttypen": ziotypen_data,
-        }
-
-        zaaktypen_data.append(zaaktype_data)
+            roltypen_data = []
+            for roltype in process.find("roltypen"):
+                try:
+                    rolype_data = construct_roltype_data(session, log_scope, roltype)
+                    roltypen_data.append(rolype_data)
+                    session.counter.increment_counted(ObjectTypenKeys.roltypen)
+                except ParserException as exc:
+                    session.counter.increment_errored(ObjectTypenKeys.roltypen)
+                    session.log_error(
+                        f"{log_scope} Imported roltype '{roltype.get('omschrijving')}' cannot be parsed: {format_exception(exc)}",
+                        ObjectTypenKeys.roltypen,
+                    )
+                    continue
 
-        for iotype_data in iotypen_data:
-            omschrijving = iotype_data["omschrijving"]
+            statustypen_data = []
+            for statustype in process.find("statustypen"):
+                try:
+                    statusype_data = construct_statustype_data(
+                        session, log_scope, statustype
+                    )
+                    statustypen_data.append(statusype_data)
+                    session.counter.increment_counted(ObjectTypenKeys.statustypen)
+                except ParserException as exc:
+                    session.counter.increment_errored(ObjectTypenKeys.statustypen)
+                    session.log_error(
+                        f"{log_scope} Imported statustype '{statustype.get('volgnummer')}' cannot be parsed: {format_exception(exc)}",
+                        ObjectTypenKeys.statustypen,
+                    )
+                    continue
+
+            resultaattypen_data = []
+            for resultaattype in process.find("resultaattypen"):
+                try:
+                    resultaatype_data = construct_resultaattype_data(
+                        session,
+                        log_scope,
+                        resultaattype,
+                        zaaktype_data["selectielijstProcestype"],
+                    )
+                    resultaattypen_data.append(resultaatype_data)
+                    session.counter.increment_counted(ObjectTypenKeys.resultaattypen)
+                except ParserException as exc:
+                    session.counter.increment_errored(ObjectTypenKeys.resultaattypen)
+                    session.log_error(
+                        f"{log_scope} Imported resultaattype '{resultaattype.get('id')}' cannot be parsed: {format_exception(exc)}",
+                        ObjectTypenKeys.resultaattypen,
+                    )
+                    continue
+
+            iotypen_data = []
+            for iotype in process.find("documenttypen"):
+                try:
+                    ioype_data = construct_iotype_data(session, log_scope, iotype)
+                    iotypen_data.append(ioype_data)
+                    # note we dont count here since we de-duplicate later
+                except ParserException as exc:
+                    session.counter.increment_errored(
+                        ObjectTypenKeys.informatieobjecttypen
+                    )
+                    session.log_error(
+                        f"{log_scope} Imported documenttype '{iotype.get('omschrijving')}' cannot be parsed: {format_exception(exc)}",
+                        ObjectTypenKeys.informatieobjecttypen,
+                    )
+                    continue
 
-            if (
-                omschrijving in iotypen_dict
-                and iotype_data != iotypen_dict[omschrijving]
-                and iotypen_dict[omschrijving]["beginGeldigheid"]
-            ):
-                session.log_warning(
-                    f"{log_scope} Skipping creation of \"Informatieobjectype\" ({omschrijving}): Import contains multiple \"documenttypen\" with the same omschrijving ({iotype_data['omschrijving']})",
-                    ObjectTypenKeys.informatieobjecttypen,
-                )
-            else:
-                if omschrijving not in iotypen_dict:
-                    # we count these here for de-duplication
+            ziotypen_data = []
+            for ziotype in process.find("documenttypen"):
+                try:
+                    zioype_data = construct_ziotype_data(session, log_scope, ziotype)
+                    ziotypen_data.append(zioype_data)
                     session.counter.increment_counted(
-                        ObjectTypenKeys.informatieobjecttypen
+                        ObjectTypenKeys.zaakinformatieobjecttypen
+                    )
+                except ParserException as exc:
+                    session.counter.increment_errored(
+                        ObjectTypenKeys.zaakinformatieobjecttypen
+                    )
+                    session.log_error(
+                        f"{log_scope} Imported documenttype-zaaktype relatie '{ziotype.get('volgnummer')}' cannot be parsed: {format_exception(exc)}",
+                        ObjectTypenKeys.zaakinformatieobjecttypen,
+                    )
+                    continue
+
+            zaaktype_data["_children"] = {
+                "roltypen": roltypen_data,
+                "statustypen": statustypen_data,
+                "resultaattypen": resultaattypen_data,
+                "zaakinformatieobjecttypen": ziotypen_data,
+            }
+
+            zaaktypen_data.append(zaaktype_data)
+
+            for iotype_data in iotypen_data:
+                omschrijving = iotype_data["omschrijving"]
+
+                if (
+                    omschrijving in iotypen_dict
+                    and iotype_data != iotypen_dict[omschrijving]
+                    and iotypen_dict[omschrijving]["beginGeldigheid"]
+                ):
+                    session.log_warning(
+                        f"{log_scope} Skipping creation of \"Informatieobjectype\" ({omschrijving}): Import contains multiple \"documenttypen\" with the same omschrijving ({iotype_data['omschrijving']})",
+                        ObjectTypenKeys.informatieobjecttypen,
                     )
-                iotypen_dict[omschrijving] = iotype_data
+                else:
+                    if omschrijving not in iotypen_dict:
+                        # we count these here for de-duplication
+                        session.counter.increment_counted(
+                            ObjectTypenKeys.informatieobjecttypen
+                        )
+                    iotypen_dict[omschrijving] = iotype_data
 
     return zaaktypen_data, list(iotypen_dict.values())
@@ -0,0 +1,113 @@
+import cProfile
+import logging
+import marshal
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from importer.core.artifacts import save_profile
+
+logger = logging.getLogger(__name__)
+
+# seconds between the samples of the stacks
+PROFILE_SAMPLE_INTERVAL = 0.01
+# frames kept per traced memory allocation
+PROFILE_TRACEMALLOC_FRAMES = 1
+
+
+def format_frame(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+def get_stack(root: str, frame) -> str:
+    """
+    the stack of the frame in the collapsed format, outermost frame first, eg: 'MainThread;mod:main;mod:run'
+    """
+    frames = []
+    while frame is not None:
+        frames.append(format_frame(frame))
+        frame = frame.f_back
+    frames.append(root)
+    return ";".join(reversed(frames))
+
+
+class StackSampler(threading.Thread):
+    """
+    samples the stacks of all other threads of the process at an interval
+
+    unlike cProfile this includes the loader workers, and the counts per stack are what flamegraph tools expect.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            self.counts[get_stack(names.get(ident, str(ident)), frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def get_collapsed(self) -> str:
+        """
+        the samples in the collapsed stack format of flamegraph.pl and speedscope: a line with the stack and its count
+        """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self.counts.items())
+        )
+
+
+@contextmanager
+def profile_job(job, phase: str):
+    """
+    run the precheck or import under cProfile and the stack sampler if profiling is enabled for the job
+
+    the pstats and the collapsed stacks are added to the profile of the job as '<phase>.pstats'
+      and '<phase>.collapsed'. cProfile only sees the thread of the task.
+
+    memory allocations are traced as well, so the stage timings include the largest allocations.
+    """
+    if not job.profiling:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+    trace_memory = not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        if trace_memory:
+            tracemalloc.stop()
+        profiler.create_stats()
+        try:
+            save_profile(
+                job,
+                {
+                    f"{phase}.pstats": marshal.dumps(profiler.stats),
+                    f"{phase}.collapsed": sampler.get_collapsed().encode("utf8"),
+                },
+            )
+        except Exception:
+            # the profile shouldn't change the outcome of the job
+            logger.exception(f"[Job#{job.id}] cannot save the profile")
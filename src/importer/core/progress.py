@@ -0,0 +1,63 @@
+import time
+from typing import List, Optional
+
+from django.core.cache import caches
+
+from importer.core.choices import JobState
+
+# the progress of running jobs lives in the Redis cache, so polling it doesn't touch the database
+PROGRESS_CACHE = "default"
+PROGRESS_TIMEOUT = 60 * 60
+PROGRESS_LOG_TAIL = 100
+
+LIVE_STATES = (JobState.checking, JobState.running)
+
+
+def get_progress_key(job_id: int) -> str:
+    return f"importer:job-progress:{job_id}"
+
+
+def publish_progress(job, statistics: dict, logs: List[dict]):
+    """
+    publish a snapshot of the statistics and the latest logs of a running job
+
+    the logs are numbered per session, so readers can tell which logs they have seen
+    """
+    caches[PROGRESS_CACHE].set(
+        get_progress_key(job.id),
+        {
+            "state": job.state,
+            "statistics": statistics,
+            "logs": logs[-PROGRESS_LOG_TAIL:],
+            "updated_at": time.time(),
+        },
+        timeout=PROGRESS_TIMEOUT,
+    )
+
+
+def clear_progress(job_id: int):
+    caches[PROGRESS_CACHE].delete(get_progress_key(job_id))
+
+
+def get_progress(job_id: int) -> Optional[dict]:
+    return caches[PROGRESS_CACHE].get(get_progress_key(job_id))
+
+
+def get_live_progress(job_id: int) -> Optional[dict]:
+    """
+    the progress of a live job, or None for a job that is waiting or done
+    """
+    progress = get_progress(job_id)
+    if not progress or progress["state"] not in LIVE_STATES:
+        return None
+    return progress
+
+
+def get_new_logs(logs: List[dict], after: int) -> List[dict]:
+    """
+    the logs of a log tail numbered after `after`, all of them if the tail is of a new session
+    """
+    if logs and logs[-1]["id"] < after:
+        # a new session numbers its logs from the start
+        return logs
+    return [log for log in logs if log["id"] > after]
@@ -1,69 +1,362 @@
 import logging
-from collections import defaultdict
+import math
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
 
+from django.conf import settings
+from django.db import transaction
+
+import elasticapm
 from zds_client import ClientError
 from zgw_consumers.client import ZGWClient
 from zgw_consumers.models import Service
 
-from importer.core.choices import JobLogLevel
+from importer.core.artifacts import LogArchiveWriter
+from importer.core.choices import (
+    JobLogCode,
+    JobLogLevel,
+    JobLogMode,
+    JobStage,
+    JobState,
+)
 from importer.core.constants import ObjectTypenKeys
+from importer.core.metrics import JOBLOGS_METRIC, observe_http_request
 from importer.core.models import JobLog
+from importer.core.progress import PROGRESS_LOG_TAIL, publish_progress
+from importer.core.selectielijst import SelectielijstIndex
+from importer.utils.client import build_http_session
+from importer.utils.memory import format_mb, get_peak_rss, get_rss, reset_peak_rss
+from importer.utils.metrics import MetricsBuffer
 
 logger = logging.getLogger(__name__)
 
+LOG_LEVELS = {
+    JobLogLevel.info: logging.INFO,
+    JobLogLevel.warning: logging.WARNING,
+    JobLogLevel.error: logging.ERROR,
+}
+
+# write the buffered logs when we have this many, or when the oldest is this many seconds old
+LOG_BUFFER_SIZE = 500
+LOG_BUFFER_TIMEOUT = 2
+# number of affected objects kept with an aggregated log record
+LOG_SAMPLE_SIZE = 10
+# allocations kept per stage when tracemalloc is tracing, and how much the traced peak must grow before
+#   the allocations are taken again
+TRACEMALLOC_TOP = 10
+TRACEMALLOC_SNAPSHOT_GROWTH = 1.1
+# latency percentiles of the outbound requests
+HTTP_PERCENTILES = (50, 95, 99)
+
 
 class ImportSession:
     """
     helper object to hold and process logs, stats etc during parsing and loading, keeps import code cleaner.
 
-    the log feature is a just a list of JobLog objects.
+    the log feature is a just a list of JobLog objects, these are buffered and written to the database in batches.
+
+    repetitive messages are logged as coded records with log_record(), these are aggregated into a single
+      JobLog per message with a count and a sample of the affected objects, see flush_records().
+
+    with the archive log mode all logs are written to the log archive file of the job, and only the warnings
+      and errors to the database.
     """
 
     def __init__(self, job):
         self.job = job
         self.logs = list()
+        self._log_buffer = list()
+        self._log_buffer_started = None
+        # the latest logs for the live progress, numbered in the order they were logged
+        self._log_tail = deque(maxlen=PROGRESS_LOG_TAIL)
+        self._log_count = 0
+        if job.log_mode == JobLogMode.archive:
+            self.log_archive = LogArchiveWriter(job)
+        else:
+            self.log_archive = None
+        # aggregated log records by level, code, type_key and params
+        self._records = dict()
         self.counter = TypeCounter()
+        self.timings = StageTimings(self.counter, settings.JOB_MEMORY_LIMIT)
+        # metrics for the shared Prometheus endpoint, written with the statistics
+        self.metrics = MetricsBuffer()
+        self.http_counter = HttpCounter(self.metrics)
+        self._flushed_counts = None
+        self._flushed_counts_at = None
+        # clients by Service api_root, sharing one http session to keep connections alive
         self._clients = dict()
+        # the client of every url we resolved to a Service
+        self._client_urls = dict()
+        # every loader worker needs its own connection, so keep at least that many alive
+        self.http_session = build_http_session(
+            max(settings.HTTP_POOL_SIZE, job.catalog.loader_workers)
+        )
+        self.selectielijst = SelectielijstIndex(self)
+        # remote zaaktypen by identificatie, if prefetched by the loader
+        self.zaaktypen_index = None
+        # remote zaaktype children by resource and zaaktype url, if prefetched by the loader
+        self.children_index = dict()
+        # guards the shared state when the loader runs with multiple workers
+        self.lock = threading.RLock()
 
     @property
     def catalogus_url(self):
         return self.job.catalog.url
 
     def client_from_url(self, url) -> ZGWClient:
-        if url in self._clients:
-            return self._clients[url]
-        client = Service.get_client(url)
-        if not client:
-            raise ClientError(f"a ZGW service must be configured first for url '{url}'")
-        self._clients[url] = client
-        return client
-
-    def add_log(self, level, message):
+        """
+        get the client for the Service of the url, every Service has one client for the whole session
+        """
+        with self.lock:
+            client = self._client_urls.get(url)
+            if client:
+                return client
+
+            service = Service.get_service(url)
+            if not service:
+                raise ClientError(
+                    f"a ZGW service must be configured first for url '{url}'"
+                )
+            client = self._clients.get(service.api_root)
+            if not client:
+                client = service.build_client()
+                client.http_session = self.http_session
+                client.http_counter = self.http_counter
+                self._clients[service.api_root] = client
+            self._client_urls[url] = client
+            return client
+
+    def capture_span(
+        self, name, span_type="app", span_subtype=None, span_action=None, **labels
+    ):
+        """
+        APM span labeled with the job id and the given labels, this does nothing without an active transaction
+        """
+        labels["job_id"] = self.job.id
+        return elasticapm.capture_span(
+            name,
+            span_type=span_type,
+            span_subtype=span_subtype,
+            span_action=span_action,
+            labels={k: v for k, v in labels.items() if v is not None},
+        )
+
+    def close(self):
+        self.http_session.close()
+        if self.log_archive:
+            self.log_archive.close()
+
+    def create_worker_session(self) -> "WorkerSession":
+        return WorkerSession(self)
+
+    def merge_worker_session(self, worker_session: "WorkerSession"):
+        """
+        write the buffered logs of a worker session, in the order they were logged
+        """
+        for log in worker_session.logs:
+            log.job = self.job
+            self._buffer_log(log)
+        worker_session.logs = list()
+
+    def add_log(self, level, message, type_key=None, **fields):
         assert level in JobLogLevel.values
-        self.logs.append(JobLog(level=level, message=message))
-        self.job.add_log(level, message)
+        self._buffer_log(
+            JobLog(
+                job=self.job,
+                level=level,
+                message=message,
+                type_key=type_key or "",
+                **fields,
+            )
+        )
+
+    def _buffer_log(self, log):
+        self.logs.append(log)
+        self._log_count += 1
+        self._log_tail.append(
+            {"id": self._log_count, "level": log.level, "message": log.message}
+        )
+
+        if self.log_archive:
+            self.log_archive.write(log)
+            if log.level == JobLogLevel.info:
+                return
+
+        if not self._log_buffer:
+            self._log_buffer_started = time.monotonic()
+        self._log_buffer.append(log)
+
+        if (
+            len(self._log_buffer) >= LOG_BUFFER_SIZE
+            or time.monotonic() - self._log_buffer_started >= LOG_BUFFER_TIMEOUT
+        ):
+            self.flush_logs()
+
+    def flush_logs(self):
+        """
+        write the buffered logs to the database
+        """
+        if not self._log_buffer:
+            return
+        with transaction.atomic():
+            JobLog.objects.bulk_create(self._log_buffer)
+        for log in self._log_buffer:
+            self.metrics.increment(JOBLOGS_METRIC, level=log.level)
+        self._log_buffer = list()
 
     def log_info(self, message, type_key=None):
-        self.add_log(JobLogLevel.info, message)
+        self.add_log(JobLogLevel.info, message, type_key)
         logger.info(message)
-        # lets not count info level but keep the 'type_key' argument for uniformity
+        # lets not count info level, the 'type_key' is only kept on the log
 
     def log_warning(self, message, type_key=None):
-        self.add_log(JobLogLevel.warning, message)
+        self.add_log(JobLogLevel.warning, message, type_key)
         logger.warning(message)
         if type_key:
             self.counter.increment_issue_count(type_key, JobLogLevel.warning)
 
     def log_error(self, message, type_key=None):
-        self.add_log(JobLogLevel.error, message)
+        self.add_log(JobLogLevel.error, message, type_key)
         logger.error(message)
         if type_key:
             self.counter.increment_issue_count(type_key, JobLogLevel.error)
 
-    def flush_counts(self):
-        counts = self.counter.get_data()
-        self.job.set_statistics(counts)
+    def log_record(self, level, code, log_scope, type_key=None, detail=None, **params):
+        """
+        log a coded message for an object, records with the same params are aggregated until flush_records()
+
+        the params go into the message so they must be the same for many objects, put a value of the
+          object itself in the detail, this is added to its entry in the sample.
+        """
+        assert level in JobLogLevel.values
+        assert code in JobLogCode.values
+        message = JobLogCode.format_message(code, **params)
+        scope = log_scope.rstrip(":")
+        if detail is not None:
+            scope = f"{scope} ({detail})"
+        key = (level, code, type_key, tuple(sorted(params.items())))
+
+        with self.lock:
+            record = self._records.get(key)
+            if record:
+                record.count += 1
+                if len(record.sample) < LOG_SAMPLE_SIZE:
+                    record.sample.append(scope)
+            else:
+                self._records[key] = JobLog(
+                    job=self.job,
+                    level=level,
+                    code=code,
+                    type_key=type_key or "",
+                    message=message,
+                    sample=[scope],
+                )
+
+        logger.log(LOG_LEVELS[level], f"{scope} {message}")
+        if type_key and level != JobLogLevel.info:
+            self.counter.increment_issue_count(type_key, level)
+
+    def flush_records(self):
+        """
+        add the aggregated log records to the logs
+        """
+        with self.lock:
+            records = list(self._records.values())
+            self._records.clear()
+        for record in records:
+            self._buffer_log(record)
+
+    def flush_counts(self, force=False):
+        """
+        write the buffered logs and the statistics, at most once per STATISTICS_FLUSH_INTERVAL unless forced
+
+        the statistics are only written if they changed since the last write
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._flushed_counts_at is not None
+            and now - self._flushed_counts_at < settings.STATISTICS_FLUSH_INTERVAL
+        ):
+            return
+        self._flushed_counts_at = now
+
+        with self.capture_span("flush counts", span_subtype="reporting"):
+            self.flush_logs()
+            counts = self.counter.get_data()
+            http = self.http_counter.get_data()
+            if http:
+                counts["http"] = http
+            if counts != self._flushed_counts:
+                self.job.set_statistics(counts)
+                self._flushed_counts = counts
+
+            publish_progress(self.job, counts, list(self._log_tail))
+            self.metrics.flush()
+
+        self.timings.check_memory()
+
+    def save_timings(self, phase: str):
+        """
+        write the stage timings of the precheck or import phase
+        """
+        self.job.timings[phase] = self.timings.get_data()
+        self.job.save(update_fields=("timings",))
+
+
+class WorkerSession(ImportSession):
+    """
+    session for a loader worker thread
+
+    shares the counter, clients and indexes of the parent session but buffers the logs instead of writing
+      them to the database, the parent writes them with merge_worker_session() so the logs of a zaaktype
+      stay together and the worker never touches the database.
+    """
+
+    def __init__(self, parent: ImportSession):
+        self.parent = parent
+        self.job = parent.job
+        self.logs = list()
+        self._records = parent._records
+        self.counter = parent.counter
+        self.timings = parent.timings
+        self.metrics = parent.metrics
+        self.http_counter = parent.http_counter
+        self._clients = parent._clients
+        self._client_urls = parent._client_urls
+        self.http_session = parent.http_session
+        self.selectielijst = parent.selectielijst
+        self.zaaktypen_index = parent.zaaktypen_index
+        self.children_index = parent.children_index
+        self.lock = parent.lock
+        self._catalogus_url = parent.catalogus_url
+
+    @property
+    def catalogus_url(self):
+        return self._catalogus_url
+
+    def add_log(self, level, message, type_key=None, **fields):
+        assert level in JobLogLevel.values
+        self.logs.append(
+            JobLog(level=level, message=message, type_key=type_key or "", **fields)
+        )
+
+    def flush_logs(self):
+        # the parent writes the logs after merging
+        pass
+
+    def flush_records(self):
+        # the records are shared with the parent
+        pass
+
+    def flush_counts(self, force=False):
+        # the parent flushes after merging
+        pass
 
 
 @dataclass()
@@ -80,7 +373,8 @@ class TypeCounterData:
             "created": self.created,
             "errored": self.errored,
             "counted": self.counted,
-            "issues": self.issues,
+            # copy so workers can't change it while it is serialized
+            "issues": dict(self.issues),
         }
 
 
@@ -94,43 +388,284 @@ class TypeCounter:
 
     def __init__(self):
         self.data = defaultdict(TypeCounterData)
+        self._lock = threading.Lock()
 
     def increment_updated(self, type_key):
         assert type_key in ObjectTypenKeys.values
-        self.data[type_key].updated += 1
+        with self._lock:
+            self.data[type_key].updated += 1
 
     def increment_created(self, type_key):
         assert type_key in ObjectTypenKeys.values
-        self.data[type_key].created += 1
+        with self._lock:
+            self.data[type_key].created += 1
 
     def increment_errored(self, type_key):
         assert type_key in ObjectTypenKeys.values
-        self.data[type_key].errored += 1
+        with self._lock:
+            self.data[type_key].errored += 1
 
     def increment_counted(self, type_key):
         assert type_key in ObjectTypenKeys.values
-        self.data[type_key].counted += 1
+        with self._lock:
+            self.data[type_key].counted += 1
 
     def increment_issue_count(self, type_key, level):
         assert type_key in ObjectTypenKeys.values
         assert level in JobLogLevel.values
-        self.data[type_key].issues[level] += 1
+        with self._lock:
+            self.data[type_key].issues[level] += 1
 
     def reset_numbers(self):
-        for data in self.data.values():
-            data.updated = 0
-            data.created = 0
-            data.errored = 0
+        with self._lock:
+            for data in self.data.values():
+                data.updated = 0
+                data.created = 0
+                data.errored = 0
 
     def reset_issues(self):
-        for data in self.data.values():
-            for level in data.issues:
-                del data.issues[level]
+        with self._lock:
+            for data in self.data.values():
+                for level in data.issues:
+                    del data.issues[level]
 
     def get_data(self):
-        data = {"data": {k: v.get_data() for k, v in self.data.items()}}
+        with self._lock:
+            data = {"data": {k: v.get_data() for k, v in self.data.items()}}
         return data
 
+    def get_totals(self) -> dict:
+        """
+        number of handled objects per type_key
+        """
+        with self._lock:
+            return {
+                k: v.updated + v.created + v.errored + v.counted
+                for k, v in self.data.items()
+            }
+
+    def set_data(self, data):
+        """
+        restore the counters from the output of get_data()
+        """
+        with self._lock:
+            self.data.clear()
+            for key, value in data.get("data", dict()).items():
+                self.data[key] = TypeCounterData(
+                    updated=value["updated"],
+                    created=value["created"],
+                    errored=value["errored"],
+                    counted=value["counted"],
+                    issues=defaultdict(int, value["issues"]),
+                )
+
+
+def get_percentile(values: List[float], percentile: int) -> float:
+    """
+    nearest-rank percentile of a sorted list
+    """
+    index = max(math.ceil(percentile / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+class HttpCounter:
+    """
+    outbound requests of the ZGW clients by method and resource, with the number of responses per status
+      code and the latencies to calculate the percentiles
+
+    requests that failed without a response are counted with the status 'error'.
+
+    with a MetricsBuffer every request is also added to the shared metrics.
+    """
+
+    def __init__(self, metrics: Optional[MetricsBuffer] = None):
+        self.metrics = metrics
+        self.statuses = defaultdict(Counter)
+        self.latencies = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(
+        self, method: str, resource: str, status_code: Optional[int], duration: float
+    ):
+        key = (method.upper(), resource)
+        with self._lock:
+            self.statuses[key][str(status_code or "error")] += 1
+            self.latencies[key].append(duration)
+        if self.metrics:
+            observe_http_request(self.metrics, method, resource, status_code, duration)
+
+    def get_data(self) -> list:
+        with self._lock:
+            items = [
+                (key, dict(statuses), list(self.latencies[key]))
+                for key, statuses in self.statuses.items()
+            ]
+
+        calls = []
+        for (method, resource), statuses, latencies in sorted(items):
+            latencies.sort()
+            data = {
+                "method": method,
+                "resource": resource,
+                "count": len(latencies),
+                "statuses": statuses,
+                "duration": round(sum(latencies), 3),
+            }
+            for percentile in HTTP_PERCENTILES:
+                # in milliseconds
+                data[f"p{percentile}"] = round(
+                    get_percentile(latencies, percentile) * 1000, 1
+                )
+            calls.append(data)
+        return calls
+
+
+def get_rate(count: int, duration: float) -> Optional[float]:
+    if count and duration > 0:
+        return round(count / duration, 1)
+    return None
+
+
+class MemoryLimitExceeded(Exception):
+    pass
+
+
+class StageTimings:
+    """
+    wall time, number of handled objects and memory use per stage, in total and per type_key
+
+    stages can be nested, the time, objects and memory growth of a nested stage are not counted again for
+      the outer stage. the objects are taken from the TypeCounter so this needs no changes in the parser
+      and loader.
+
+    the memory is the peak RSS of the process at the end of the stage and how much the stage raised it.
+      when tracemalloc is tracing (see profile_job()) the largest allocations are kept with the stage
+      that raised the traced peak.
+
+    with a memory_limit (in bytes) check_memory() raises MemoryLimitExceeded, this is checked at the end
+      of every stage and when the statistics are written.
+
+    stages are timed in the thread that runs the job, objects handled by loader workers are counted in the
+      stage that waits for them.
+    """
+
+    def __init__(self, counter: TypeCounter, memory_limit: Optional[int] = None):
+        self.counter = counter
+        self.memory_limit = memory_limit
+        # stage data by name, in the order the stages were first entered
+        self.data = dict()
+        self._stack = list()
+        # traced peak when the allocations were last taken
+        self._snapshot_peak = 0
+        reset_peak_rss()
+
+    def check_memory(self):
+        if not self.memory_limit:
+            return
+        rss = get_rss()
+        if rss is not None and rss > self.memory_limit:
+            raise MemoryLimitExceeded(
+                f"memory use of {format_mb(rss)} MB exceeds the limit of {format_mb(self.memory_limit)} MB"
+            )
+
+    def _take_allocations(self, data: dict):
+        peak = tracemalloc.get_traced_memory()[1]
+        if peak <= self._snapshot_peak * TRACEMALLOC_SNAPSHOT_GROWTH:
+            return
+        self._snapshot_peak = peak
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        data["allocations"] = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]
+        ]
+
+    @contextmanager
+    def stage(self, name: str):
+        assert name in JobStage.values
+        frame = {
+            "start": time.perf_counter(),
+            "totals": self.counter.get_totals(),
+            "child_duration": 0.0,
+            "child_counts": Counter(),
+            "peak_rss": get_peak_rss(),
+            "child_rss_growth": 0,
+        }
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame["start"]
+            counts = Counter(self.counter.get_totals())
+            counts.subtract(frame["totals"])
+            peak_rss = get_peak_rss()
+            rss_growth = peak_rss - frame["peak_rss"]
+
+            data = self.data.setdefault(
+                name,
+                {"duration": 0.0, "types": Counter(), "peak_rss": 0, "rss_growth": 0},
+            )
+            data["duration"] += elapsed - frame["child_duration"]
+            data["types"].update(counts)
+            data["types"].subtract(frame["child_counts"])
+            data["peak_rss"] = max(data["peak_rss"], peak_rss)
+            data["rss_growth"] += rss_growth - frame["child_rss_growth"]
+            if tracemalloc.is_tracing():
+                self._take_allocations(data)
+
+            if self._stack:
+                parent = self._stack[-1]
+                parent["child_duration"] += elapsed
+                parent["child_counts"].update(counts)
+                parent["child_rss_growth"] += rss_growth
+
+        self.check_memory()
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        time the work to produce every item of the iterable in the given stage, like the streaming XML parser
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def get_data(self) -> list:
+        stages = []
+        for name, data in self.data.items():
+            duration = data["duration"]
+            types = {
+                key: {"count": count, "rate": get_rate(count, duration)}
+                for key, count in data["types"].items()
+                if count > 0
+            }
+            count = sum(t["count"] for t in types.values())
+            memory = {"peak_rss": data["peak_rss"], "rss_growth": data["rss_growth"]}
+            if "allocations" in data:
+                memory["allocations"] = data["allocations"]
+            stages.append(
+                {
+                    "stage": name,
+                    "duration": round(duration, 3),
+                    "count": count,
+                    "rate": get_rate(count, duration),
+                    "types": types,
+                    "memory": memory,
+                }
+            )
+        return stages
+
 
 def transform_precheck_statistics(raw_data):
     """
@@ -192,9 +727,148 @@ def transform_import_statistics(raw_data):
         ]
         rows.append(row)
 
+    rows.extend(transform_http_statistics(raw_data.get("http")))
+
+    return rows
+
+
+def transform_statistics(state: str, raw_data):
+    """
+    Transform the statistics of a job into table rows for display, as a precheck or as an import
+    """
+    if state in (JobState.checking, JobState.precheck):
+        return transform_precheck_statistics(raw_data)
+    else:
+        return transform_import_statistics(raw_data)
+
+
+def transform_http_statistics(calls):
+    """
+    Transform the outbound request statistics into table rows for display, with the same number of
+      columns as the import statistics
+
+    Output something like:
+
+    [
+        ["HTTP requests", "requests", "p50 ms", "p95 ms", "p99 ms", "status codes"],
+        ["GET zaaktype", 12, 35.2, 80.1, 95.0, "200: 12"],
+        ...
+    ]
+    """
+    if not calls:
+        return []
+
+    rows = [["HTTP requests", "requests", "p50 ms", "p95 ms", "p99 ms", "status codes"]]
+    for call in calls:
+        statuses = ", ".join(
+            f"{status}: {count}" for status, count in sorted(call["statuses"].items())
+        )
+        rows.append(
+            [
+                f"{call['method']} {call['resource']}",
+                call["count"],
+                call["p50"],
+                call["p95"],
+                call["p99"],
+                statuses,
+            ]
+        )
+    return rows
+
+
+def transform_timings(raw_data):
+    """
+    Transform the stage timings of the precheck and import into table rows for display
+
+    Output something like:
+
+    [
+        ["", "seconds", "objects", "objects/s"],
+        ["Precheck", "", "", ""],
+        ["Parse XML", "1.234", 30, 24.3],
+        ["- Zaaktypen", "", 10, 8.1],
+        ...
+    ]
+    """
+    if not raw_data:
+        return []
+
+    rows = [["", "seconds", "objects", "objects/s"]]
+    for phase, label in (("precheck", "Precheck"), ("import", "Import")):
+        if not raw_data.get(phase):
+            continue
+        rows.append([label, "", "", ""])
+        for stage in raw_data[phase]:
+            rows.append(
+                [
+                    JobStage.values.get(stage["stage"], stage["stage"]),
+                    f"{stage['duration']:.3f}",
+                    stage["count"] or "",
+                    stage["rate"] or "",
+                ]
+            )
+            for key, value in stage["types"].items():
+                rows.append(
+                    [
+                        f"- {ObjectTypenKeys.values.get(key, key)}",
+                        "",
+                        value["count"],
+                        value["rate"] or "",
+                    ]
+                )
+
     return rows
 
 
+def transform_memory(raw_data):
+    """
+    Transform the memory use per stage of the precheck and import into table rows for display
+
+    Output something like:
+
+    [
+        ["", "peak RSS MB", "RSS growth MB", "allocated MB", "blocks"],
+        ["Precheck", "", "", "", ""],
+        ["Parse XML", 120.5, 80.2, "", ""],
+        ["- /app/src/importer/core/parser.py:123", "", "", 20.1, 1234],
+        ...
+    ]
+    """
+    rows = []
+    for phase, label in (("precheck", "Precheck"), ("import", "Import")):
+        stages = [
+            stage for stage in (raw_data or dict()).get(phase, []) if "memory" in stage
+        ]
+        if not stages:
+            continue
+        rows.append([label, "", "", "", ""])
+        for stage in stages:
+            memory = stage["memory"]
+            rows.append(
+                [
+                    JobStage.values.get(stage["stage"], stage["stage"]),
+                    format_mb(memory["peak_rss"]),
+                    format_mb(memory["rss_growth"]),
+                    "",
+                    "",
+                ]
+            )
+            for allocation in memory.get("allocations", []):
+                rows.append(
+                    [
+                        f"- {allocation['location']}",
+                        "",
+                        "",
+                        format_mb(allocation["size"]),
+                        allocation["count"],
+                    ]
+                )
+
+    if not rows:
+        return []
+    return [["", "peak RSS MB", "RSS growth MB", "allocated MB", "blocks"]] + rows
+
+
 def _format_logstats_dict(info):
     """
     Format a dictionary of {log_level: count} into a readable one-line string
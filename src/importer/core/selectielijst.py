@@ -1,9 +1,13 @@
+from contextlib import contextmanager
 from operator import itemgetter
-from typing import List
+from typing import List, Optional
+
+from django.utils.functional import cached_property
 
 from zgw_consumers.client import ZGWClient
 from zgw_consumers.service import get_paginated_results
 
+from importer.core.choices import JobStage
 from importer.utils.cache import cache
 
 
@@ -15,20 +19,24 @@ def get_client() -> ZGWClient:
     return config.service.build_client()
 
 
-@cache("selectielijst:procestypen", timeout=60 * 60 * 24)
+@cache("selectielijst:procestypen", timeout=60 * 60 * 24, stale_timeout=60 * 60 * 24)
 def get_procestypen(processtype_year: int = None) -> List[dict]:
     client = get_client()
     query_params = {"jaar": processtype_year} if processtype_year else None
     return client.list("procestype", query_params=query_params)
 
 
-@cache("selectielijst:resultaattypeomschrijvingen", timeout=60 * 60 * 24)
+@cache(
+    "selectielijst:resultaattypeomschrijvingen",
+    timeout=60 * 60 * 24,
+    stale_timeout=60 * 60 * 24,
+)
 def get_resultaattype_omschrijvingen() -> List[dict]:
     client = get_client()
     return client.list("resultaattypeomschrijvinggeneriek")
 
 
-@cache("selectielijst:resultaaten", timeout=60 * 60 * 24)
+@cache("selectielijst:resultaaten", timeout=60 * 60 * 24, stale_timeout=60 * 60 * 24)
 def get_resultaaten() -> List[dict]:
     client = get_client()
     return get_paginated_results(client, "resultaat")
@@ -36,3 +44,66 @@ def get_resultaaten() -> List[dict]:
 
 def get_procestype_years():
     return list(sorted(set(map(itemgetter("jaar"), get_procestypen()))))
+
+
+class SelectielijstIndex:
+    """
+    lookup maps over the Selectielijst data, build once per job so matching an object doesn't scan the full lists
+
+    the maps are build on first use and keep the first match, like the list filtering did
+    """
+
+    def __init__(self, session=None):
+        self._procestypen = dict()
+        # the ImportSession, to time and trace the fetches
+        self.session = session
+
+    @contextmanager
+    def _fetch(self, resource: str):
+        if not self.session:
+            yield
+            return
+
+        span = self.session.capture_span(
+            f"selectielijst {resource}", span_subtype="selectielijst", resource=resource
+        )
+        with self.session.timings.stage(JobStage.selectielijst), span:
+            yield
+
+    def _get_procestypen(self, processtype_year: int) -> dict:
+        if processtype_year not in self._procestypen:
+            index = {}
+            with self._fetch("procestypen"):
+                procestypen = get_procestypen(processtype_year)
+            for procestype in procestypen:
+                index.setdefault(procestype["nummer"], procestype)
+            self._procestypen[processtype_year] = index
+        return self._procestypen[processtype_year]
+
+    @cached_property
+    def _resultaten(self) -> dict:
+        index = {}
+        with self._fetch("resultaten"):
+            resultaten = get_resultaaten()
+        for resultaat in resultaten:
+            key = (resultaat["volledigNummer"], resultaat["procesType"])
+            index.setdefault(key, resultaat)
+        return index
+
+    @cached_property
+    def _resultaattype_omschrijvingen(self) -> dict:
+        index = {}
+        with self._fetch("resultaattypeomschrijvingen"):
+            omschrijvingen = get_resultaattype_omschrijvingen()
+        for omschrijving in omschrijvingen:
+            index.setdefault(omschrijving["omschrijving"], omschrijving)
+        return index
+
+    def get_procestype(self, processtype_year: int, nummer: int) -> Optional[dict]:
+        return self._get_procestypen(processtype_year).get(nummer)
+
+    def get_resultaat(self, volledig_nummer: str, procestype: str) -> Optional[dict]:
+        return self._resultaten.get((volledig_nummer, procestype))
+
+    def get_resultaattype_omschrijving(self, omschrijving: str) -> Optional[dict]:
+        return self._resultaattype_omschrijvingen.get(omschrijving)
@@ -8,7 +8,10 @@ from celery import shared_task
 
 from importer.core.choices import JobState
 from importer.core.importer import precheck_import, run_import
+from importer.core.metrics import record_job_metrics
 from importer.core.models import Job
+from importer.core.profiling import profile_job
+from importer.core.progress import clear_progress
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +45,8 @@ def precheck_job_task(job_id):
         )
 
         # run the precheck
-        precheck_import(job)
+        with profile_job(job, "precheck"):
+            precheck_import(job)
 
         job.mark_precheck()
         job.save()
@@ -54,9 +58,13 @@ def precheck_job_task(job_id):
         logger.exception(f"[Job#{job_id}] exception")
         if settings.DEBUG:
             raise
+    finally:
+        # the job isn't live anymore so the progress is read from the database again
+        clear_progress(job_id)
 
     duration = time.monotonic() - start_time
     logger.info(f"[Job#{job_id}] task duration {str(duration)}")
+    record_job_metrics(job, "precheck", duration)
 
 
 @shared_task
@@ -88,7 +96,8 @@ def import_job_task(job_id):
         )
 
         # run the importer
-        run_import(job)
+        with profile_job(job, "import"):
+            run_import(job)
 
         job.mark_completed()
         job.save()
@@ -100,6 +109,10 @@ def import_job_task(job_id):
         logger.exception(f"[Job#{job_id}] exception")
         if settings.DEBUG:
             raise
+    finally:
+        # the job isn't live anymore so the progress is read from the database again
+        clear_progress(job_id)
 
     duration = time.monotonic() - start_time
     logger.info(f"[Job#{job_id}] task duration {str(duration)}")
+    record_job_metrics(job, "import", duration)
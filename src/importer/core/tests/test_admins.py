@@ -1,13 +1,23 @@
+import csv
+import io
+import json
 from datetime import date
+from unittest.mock import patch
 
 from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 import requests_mock
 from webtest import Upload
 from zgw_consumers.constants import APITypes
 
-from importer.core.choices import JobState
+from importer.core.choices import JobLogCode, JobLogLevel, JobLogMode, JobState
+from importer.core.constants import ObjectTypenKeys
 from importer.core.models import CatalogConfig, Job, SelectielijstConfig
+from importer.core.progress import clear_progress, publish_progress
+from importer.core.reporting import ImportSession
 from importer.core.tests.base import AdminWebTest
 from importer.core.tests.factories import (
     CatalogConfigFactory,
@@ -130,6 +140,19 @@ class JobAdminViewTest(AdminWebTest):
         response = self.app.get(url, status=200)
         self.assertEqual(response.body, xml_data)
 
+    def test_profile_link(self):
+        job = CompletedJobFactory()
+        response = self.app.get(self.reverse_change_url(job))
+        self.assertPyQueryNotExists(response, ".form-row.field-profile_fmt a")
+
+        job.profile.save("foo.zip", ContentFile(b"zip"))
+        response = self.app.get(self.reverse_change_url(job))
+        link = response.pyquery(".form-row.field-profile_fmt div.readonly a")[0]
+        url = link.attrib["href"]
+        self.assertIn("/private_media/jobs/profiles/", url)
+        response = self.app.get(url, status=200)
+        self.assertEqual(response.body, b"zip")
+
     def test_change_initialized(self):
         job = JobFactory()
         job.source.save("foo.xml", ContentFile(self.get_test_data("example.xml")))
@@ -149,7 +172,9 @@ class JobAdminViewTest(AdminWebTest):
         response = self.app.get(self.reverse_change_url(job))
 
         # readonly mode
-        self.assertFormHasNoFields(response, allow_fields=["state", "_continue", None])
+        self.assertFormHasNoFields(
+            response, allow_fields=["state", "profiling", "_continue", None]
+        )
         self.assertSubmitButtonExists(response)
 
         self.assertFormRowReadonly(response, "catalog_fmt")
@@ -171,6 +196,160 @@ class JobAdminViewTest(AdminWebTest):
         self.assertPyQueryNotExists(response, ".value-display-table")
         self.assertPyQueryNotExists(response, ".joblog-display-table")
 
+    def test_progress_view(self):
+        job = RunningJobFactory()
+        url = reverse("admin:core_job_progress", args=[job.id])
+
+        # not live: read from the database
+        response = self.app.get(url)
+        self.assertEqual(response.json["state"], JobState.running)
+        self.assertEqual(response.json["logs"], [])
+
+        # live: read from the cache
+        publish_progress(
+            job,
+            {"data": {"zt": {"created": 3, "counted": 5}}},
+            [{"id": 1, "level": "info", "message": "foo"}],
+        )
+        self.addCleanup(clear_progress, job.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.app.get(url)
+        self.assertFalse([q for q in queries if "core_job" in q["sql"]])
+
+        self.assertEqual(response.json["state"], JobState.running)
+        self.assertEqual(
+            response.json["logs"], [{"id": 1, "level": "info", "message": "foo"}]
+        )
+        self.assertIn(["Zaaktypen", 0, 3, 0, 5, ""], response.json["rows"])
+
+    def test_progress_view_after(self):
+        job = RunningJobFactory()
+        url = reverse("admin:core_job_progress", args=[job.id])
+        publish_progress(
+            job,
+            {"data": {}},
+            [
+                {"id": 1, "level": "info", "message": "foo"},
+                {"id": 2, "level": "info", "message": "bar"},
+            ],
+        )
+        self.addCleanup(clear_progress, job.id)
+
+        # only the logs the page didn't show yet
+        response = self.app.get(url, {"after": 1})
+        self.assertEqual([log["message"] for log in response.json["logs"]], ["bar"])
+        response = self.app.get(url, {"after": 2})
+        self.assertEqual(response.json["logs"], [])
+
+        # the numbers of a new session start over
+        response = self.app.get(url, {"after": 10})
+        self.assertEqual(
+            [log["message"] for log in response.json["logs"]], ["foo", "bar"]
+        )
+
+        self.app.get(url, {"after": "foo"}, status=400)
+
+    def test_export_view(self):
+        job = CompletedJobFactory(
+            statistics={
+                "data": {"zt": {"created": 3, "counted": 5, "issues": {}}},
+                "http": [
+                    {
+                        "method": "GET",
+                        "resource": "zaaktype",
+                        "count": 3,
+                        "duration": 0.08,
+                        "p50": 20.0,
+                        "p95": 35.5,
+                        "p99": 40.1,
+                        "statuses": {"200": 2, "404": 1},
+                    }
+                ],
+            }
+        )
+        session = ImportSession(job)
+        session.log_info("info-1")
+        for i in (1, 2):
+            session.log_record(
+                JobLogLevel.warning,
+                JobLogCode.default_value,
+                f"zaaktype {i}:",
+                ObjectTypenKeys.zaaktypen,
+                field="aanleiding",
+                default="n.v.t.",
+            )
+        session.flush_records()
+        session.log_error("error-1", ObjectTypenKeys.roltypen)
+        session.flush_logs()
+        warning = "aanleiding not defined. It will be set as 'n.v.t.'"
+        url = reverse("admin:core_job_export", args=[job.id])
+
+        response = self.app.get(url)
+        self.assertEqual(response.content_type, "text/csv")
+        self.assertEqual(
+            response.headers["Content-Disposition"],
+            f'attachment; filename="job-{job.id}-logs.csv"',
+        )
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        self.assertEqual(
+            [row["message"] for row in rows], ["info-1", warning, "error-1"]
+        )
+        self.assertEqual(rows[1]["sample"], "zaaktype 1; zaaktype 2")
+        self.assertEqual(rows[2]["type_key"], ObjectTypenKeys.roltypen)
+
+        # filtered
+        response = self.app.get(
+            url, {"format": "jsonl", "level": ["warning", "error"], "type": "zt"}
+        )
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["message"] for row in rows], [warning])
+        self.assertEqual(rows[0]["sample"], ["zaaktype 1", "zaaktype 2"])
+
+        # statistics
+        response = self.app.get(url, {"data": "statistics", "format": "jsonl"})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertIn(
+            {
+                "type_key": "zt",
+                "label": "Zaaktypen",
+                "updated": 0,
+                "created": 3,
+                "errored": 0,
+                "counted": 5,
+                "info": 0,
+                "warning": 0,
+                "error": 0,
+            },
+            rows,
+        )
+
+        # HTTP requests
+        response = self.app.get(url, {"data": "http"})
+        self.assertEqual(
+            response.headers["Content-Disposition"],
+            f'attachment; filename="job-{job.id}-http.csv"',
+        )
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "method": "GET",
+                    "resource": "zaaktype",
+                    "count": "3",
+                    "duration": "0.08",
+                    "p50": "20.0",
+                    "p95": "35.5",
+                    "p99": "40.1",
+                    "statuses": "200: 2; 404: 1",
+                }
+            ],
+        )
+
+        self.app.get(url, {"format": "xml"}, status=400)
+        self.app.get(url, {"level": "foo"}, status=400)
+
     def test_change_running(self):
         job = RunningJobFactory()
         response = self.app.get(self.reverse_change_url(job))
@@ -214,6 +393,115 @@ class JobAdminViewTest(AdminWebTest):
         self.assertPyQueryExists(response, ".value-display-table tr td")
         self.assertPyQueryExists(response, ".joblog-display-table")
 
+    @patch("importer.core.admin.JOBLOGS_PER_PAGE", 2)
+    def test_change_completed_logs(self):
+        job = CompletedJobFactory()
+        JobLogFactory(job=job, level=JobLogLevel.info, message="info-1")
+        JobLogFactory(job=job, level=JobLogLevel.error, message="error-1")
+        JobLogFactory(job=job, level=JobLogLevel.info, message="info-2")
+        JobLogFactory(job=job, level=JobLogLevel.warning, message="warning-1")
+        url = self.reverse_change_url(job)
+
+        def get_messages(response):
+            return [
+                el.text.strip()
+                for el in response.pyquery(".joblog-display-table .field-message p")
+            ]
+
+        # first page of all levels
+        response = self.app.get(url)
+        self.assertEqual(get_messages(response), ["info-1", "error-1"])
+
+        response = self.app.get(url, {"log_page": 2})
+        self.assertEqual(get_messages(response), ["info-2", "warning-1"])
+
+        # filtered in the query
+        response = self.app.get(url, {"log_level": "info"})
+        self.assertEqual(get_messages(response), ["info-1", "info-2"])
+
+        response = self.app.get(url, {"log_level": "interesting"})
+        self.assertEqual(get_messages(response), ["error-1", "warning-1"])
+
+        # unknown filter shows all
+        response = self.app.get(url, {"log_level": "foo"})
+        self.assertEqual(get_messages(response), ["info-1", "error-1"])
+
+    def test_change_completed_log_archive(self):
+        job = CompletedJobFactory(log_mode=JobLogMode.archive)
+        session = ImportSession(job)
+        session.log_info("info-1")
+        session.log_error("error-1")
+        session.flush_logs()
+        session.close()
+        url = self.reverse_change_url(job)
+
+        def get_messages(response):
+            return [
+                el.text.strip()
+                for el in response.pyquery(".joblog-display-table .field-message p")
+            ]
+
+        # info logs are read from the archive
+        response = self.app.get(url)
+        self.assertEqual(get_messages(response), ["info-1", "error-1"])
+
+        response = self.app.get(url, {"log_level": "info"})
+        self.assertEqual(get_messages(response), ["info-1"])
+
+        response = self.app.get(url, {"log_level": "error"})
+        self.assertEqual(get_messages(response), ["error-1"])
+
+        archive_url = reverse(
+            "staff_private_file", kwargs={"path": job.log_archive.name}
+        )
+        response = response.click(href=archive_url)
+        self.assertEqual(response.content_type, "application/x-ndjson")
+
+    @patch("importer.core.admin.JOBLOGS_PER_PAGE", 2)
+    def test_change_completed_log_archive_pages(self):
+        job = CompletedJobFactory(log_mode=JobLogMode.archive)
+        session = ImportSession(job)
+        for i in range(5):
+            session.log_info(f"info-{i}")
+        session.flush_logs()
+        session.close()
+        url = self.reverse_change_url(job)
+
+        def get_messages(response):
+            return [
+                el.text.strip()
+                for el in response.pyquery(".joblog-display-table .field-message p")
+            ]
+
+        response = self.app.get(url, {"log_page": 2})
+        self.assertEqual(get_messages(response), ["info-2", "info-3"])
+        self.assertIn("Page 2 of 3 (5 logs)", response.pyquery(".paginator").text())
+
+        # out of range shows the last page
+        response = self.app.get(url, {"log_page": 10})
+        self.assertEqual(get_messages(response), ["info-4"])
+
+    def test_change_completed_log_archive_truncated(self):
+        job = CompletedJobFactory(log_mode=JobLogMode.archive)
+        session = ImportSession(job)
+        for i in range(100):
+            session.log_info(f"info-{i}")
+        session.close()
+
+        job.refresh_from_db()
+        with job.log_archive.open("rb") as f:
+            content = f.read()
+        with job.log_archive.open("wb") as f:
+            f.write(content[: len(content) // 2])
+
+        response = self.app.get(self.reverse_change_url(job))
+        self.assertEqual(response.status_code, 200)
+        messages = [
+            el.text.strip()
+            for el in response.pyquery(".joblog-display-table .field-message p")
+        ]
+        self.assertEqual(messages[0], "info-0")
+
     def test_change_error(self):
         job = ErrorJobFactory()
         logs = [JobLogFactory(job=job) for _ in range(3)]
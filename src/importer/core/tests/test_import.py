@@ -1,13 +1,27 @@
+import threading
+from contextlib import nullcontext
 from datetime import date
+from unittest.mock import patch
 
+from django.core.cache import caches
 from django.core.files.base import ContentFile
 from django.test import TestCase, override_settings
 
 import requests_mock
+from elasticapm.traces import execution_context
 from freezegun import freeze_time
 from zgw_consumers.constants import APITypes
 
-from importer.core.choices import JobState
+from importer.core.artifacts import get_source_fingerprint, load_parsed_data
+from importer.core.choices import JobLogLevel, JobState
+from importer.core.importer import precheck_import
+from importer.core.loader import (
+    get_catalog_zaaktype_urls,
+    load_data,
+    prefetch_zaaktype_children,
+)
+from importer.core.metrics import JOBLOGS_METRIC
+from importer.core.reporting import ImportSession
 from importer.core.tasks import import_job_task
 from importer.core.tests.base import MockMatcherCheck, TestCaseMixin
 from importer.core.tests.factories import (
@@ -15,6 +29,7 @@ from importer.core.tests.factories import (
     JobFactory,
     ZGWServiceFactory,
 )
+from importer.utils.metrics import format_sample, read_samples
 
 catalog_response = {
     "url": "http://test/api/catalogussen/7c0e6595-adbe-45b4-b092-31ba75c7dd74",
@@ -218,6 +233,30 @@ class ImportTest(TestCaseMixin, TestCase):
         job.source.save("foo.xml", ContentFile(self.get_test_data(xml_file)))
         return job
 
+    def setup_create_children_mocks(self, m, quoted_zaaktype_url):
+        for resource in (
+            "roltypen",
+            "statustypen",
+            "resultaattypen",
+            "zaaktype-informatieobjecttypen",
+        ):
+            m.get(
+                f"http://test/api/{resource}?zaaktype={quoted_zaaktype_url}&status=alles",
+                json=empty_list_response,
+            )
+        m.post("http://test/api/roltypen", json=roltype_response, status_code=201)
+        m.post("http://test/api/statustypen", json=statustype_response, status_code=201)
+        m.post(
+            "http://test/api/resultaattypen",
+            json=resultaattype_response,
+            status_code=201,
+        )
+        m.post(
+            "http://test/api/zaaktype-informatieobjecttypen",
+            json=zaaktypeinformatieobjecttype_response,
+            status_code=201,
+        )
+
     @override_settings(CACHES=TEST_CACHES)
     @requests_mock.Mocker()
     def test_positive_create_flow(self, m):
@@ -314,6 +353,12 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 0,
         }
+        # the latencies of the requests differ per run
+        http = job.statistics.pop("http")
+        calls = {f"{c['method']} {c['resource']}": c["statuses"] for c in http}
+        self.assertEqual(calls["GET zaaktype"], {"200": 1})
+        self.assertEqual(calls["POST zaaktype"], {"201": 1})
+        self.assertEqual(calls["POST roltype"], {"201": 1})
         self.assertEqual(
             job.statistics,
             {
@@ -431,6 +476,8 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 1,
         }
+        # the latencies of the requests differ per run
+        job.statistics.pop("http", None)
         self.assertEqual(
             job.statistics,
             {
@@ -546,6 +593,8 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 1,
         }
+        # the latencies of the requests differ per run
+        job.statistics.pop("http", None)
         self.assertEqual(
             job.statistics,
             {
@@ -683,6 +732,8 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 1,
         }
+        # the latencies of the requests differ per run
+        job.statistics.pop("http", None)
         self.assertEqual(
             job.statistics,
             {
@@ -698,6 +749,24 @@ class ImportTest(TestCaseMixin, TestCase):
         )
         self.assertEqual(job.state, JobState.completed)
 
+    @override_settings(CACHES=TEST_CACHES, JOB_MEMORY_LIMIT=1024)
+    @requests_mock.Mocker()
+    def test_memory_limit(self, m):
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+
+        import_job_task(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, JobState.error)
+        log = job.joblog_set.last()
+        self.assertEqual(log.level, JobLogLevel.error)
+        self.assertRegex(
+            log.message,
+            r"^import stopped: memory use of [0-9.]+ MB exceeds the limit of 0.0 MB$",
+        )
+        # the stage that crossed the limit is timed
+        self.assertEqual(job.timings["import"][0]["stage"], "check_job")
+
     @override_settings(CACHES=TEST_CACHES)
     @requests_mock.Mocker()
     def test_negative_init_flow(self, m):
@@ -736,6 +805,8 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 0,
         }
+        # the latencies of the requests differ per run
+        job.statistics.pop("http", None)
         self.assertEqual(
             job.statistics,
             {
@@ -811,6 +882,8 @@ class ImportTest(TestCaseMixin, TestCase):
             "issues": {},
             "updated": 0,
         }
+        # the latencies of the requests differ per run
+        job.statistics.pop("http", None)
         self.assertEqual(
             job.statistics,
             {
@@ -838,8 +911,473 @@ class ImportTest(TestCaseMixin, TestCase):
         )
         self.assertEqual(job.state, JobState.completed)
 
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_prefetch_zaaktypen_flow(self, m):
+        """
+        Test the zaaktypen of the catalog are fetched once and matched from the index
+        """
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+        job.catalog.prefetch_zaaktypen = True
+        job.catalog.save()
+        match_check = MockMatcherCheck(m, ignore_predefined=True)
+
+        concept = {
+            "url": "http://test/api/zaaktypen/2",
+            "identificatie": "B1796",
+            "concept": True,
+            "beginGeldigheid": "2020-01-01",
+            "eindeGeldigheid": None,
+        }
+        other = {
+            "url": "http://test/api/zaaktypen/3",
+            "identificatie": "B0000",
+            "concept": False,
+            "beginGeldigheid": "2020-01-01",
+            "eindeGeldigheid": None,
+        }
+
+        m.get(
+            "http://test/api/informatieobjecttypen?catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json=empty_list_response,
+        )
+        m.post(
+            "http://test/api/informatieobjecttypen",
+            json=informatieobjecttype_response,
+            status_code=201,
+        )
+        m.get(
+            "http://test/api/zaaktypen?catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json={
+                "count": 2,
+                "results": [concept, other],
+                "next": None,
+                "previous": None,
+            },
+        )
+        m.put(
+            "http://test/api/zaaktypen/2",
+            json=concept,
+        )
+        self.setup_create_children_mocks(m, "http%3A%2F%2Ftest%2Fapi%2Fzaaktypen%2F2")
+
+        import_job_task(job.id)
+        job.refresh_from_db()
+
+        if not match_check.all_called():
+            self.fail(match_check.get_diff())
+
+        zaaktype_requests = [r for r in m.request_history if r.path == "/api/zaaktypen"]
+        self.assertEqual(len(zaaktype_requests), 1)
+
+        logs = chop_precheck_from_logs(job.joblog_set.all())
+        messages = [log.message for log in logs]
+        self.assertIn("zaaktype B1796 updated existing concept", messages)
+        self.assertEqual(job.statistics["data"]["zt"]["updated"], 1)
+        self.assertEqual(job.state, JobState.completed)
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_prefetch_children_flow(self, m):
+        """
+        Test the zaaktype children are fetched once and matched from the index
+        """
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+        job.catalog.prefetch_children = True
+        job.catalog.save()
+
+        m.get(
+            "http://test/api/informatieobjecttypen?catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json=empty_list_response,
+        )
+        m.post(
+            "http://test/api/informatieobjecttypen",
+            json=informatieobjecttype_response,
+            status_code=201,
+        )
+        # the zaaktypen of the catalog, registered before the search so that matches first
+        m.get(
+            "http://test/api/zaaktypen?catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json={
+                "count": 1,
+                "results": [
+                    {
+                        "url": "http://test/api/zaaktypen/50",
+                        "identificatie": "B1795",
+                    }
+                ],
+                "next": None,
+                "previous": None,
+            },
+        )
+        m.get(
+            "http://test/api/zaaktypen?identificatie=B1796&catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json=empty_list_response,
+        )
+        m.post(
+            "http://test/api/zaaktypen",
+            json=zaaktype_response,
+            status_code=201,
+        )
+        for resource in (
+            "roltypen",
+            "statustypen",
+            "resultaattypen",
+            "zaaktype-informatieobjecttypen",
+        ):
+            # a child of a zaaktype of the catalog and one in another catalog
+            m.get(
+                f"http://test/api/{resource}?status=alles",
+                json={
+                    "count": 2,
+                    "results": [
+                        {
+                            "url": f"http://test/api/{resource}/{i}",
+                            "zaaktype": f"http://test/api/zaaktypen/{i}",
+                            "omschrijving": "Other",
+                            "volgnummer": 1,
+                            "informatieobjecttype": "http://test/api/informatieobjecttypen/99",
+                        }
+                        for i in (50, 99)
+                    ],
+                    "next": None,
+                    "previous": None,
+                },
+            )
+        self.setup_create_children_mocks(m, "http%3A%2F%2Ftest%2Fapi%2Fzaaktypen%2F1")
+
+        import_job_task(job.id)
+        job.refresh_from_db()
+
+        child_requests = [
+            r
+            for r in m.request_history
+            if r.method == "GET"
+            and r.path
+            in (
+                "/api/roltypen",
+                "/api/statustypen",
+                "/api/resultaattypen",
+                "/api/zaaktype-informatieobjecttypen",
+            )
+        ]
+        self.assertEqual(len(child_requests), 4)
+        self.assertTrue(all("zaaktype" not in r.qs for r in child_requests))
+
+        self.assertEqual(job.statistics["data"]["rt"]["created"], 1)
+        self.assertEqual(job.state, JobState.completed)
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_prefetch_children_catalog(self, m):
+        """
+        Test the prefetched zaaktype children only include the zaaktypen of the catalog
+        """
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+        m.get(
+            "http://test/api/zaaktypen",
+            json={
+                "count": 1,
+                "results": [
+                    {"url": "http://test/api/zaaktypen/50", "identificatie": "B1795"}
+                ],
+                "next": None,
+                "previous": None,
+            },
+        )
+        m.get(
+            "http://test/api/roltypen",
+            json={
+                "count": 2,
+                "results": [
+                    {
+                        "url": f"http://test/api/roltypen/{i}",
+                        "zaaktype": f"http://test/api/zaaktypen/{i}",
+                    }
+                    for i in (50, 99)
+                ],
+                "next": None,
+                "previous": None,
+            },
+        )
+
+        session = ImportSession(job)
+        zaaktype_urls = get_catalog_zaaktype_urls(session)
+        index = prefetch_zaaktype_children(session, "roltype", zaaktype_urls)
+
+        self.assertEqual(zaaktype_urls, {"http://test/api/zaaktypen/50"})
+        self.assertEqual(list(index.keys()), ["http://test/api/zaaktypen/50"])
+        zaaktype_request = m.request_history[-2]
+        self.assertEqual(
+            zaaktype_request.qs["catalogus"],
+            ["http://test/api/catalogussen/7c0e6595-adbe-45b4-b092-31ba75c7dd74"],
+        )
+
+    def setup_concurrent_load(self, m):
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+        job.catalog.loader_workers = 4
+        job.catalog.save()
+
+        def create_zaaktype(request, context):
+            context.status_code = 201
+            data = request.json()
+            return {
+                "url": f"http://test/api/zaaktypen/{data['identificatie']}",
+                "identificatie": data["identificatie"],
+                "concept": True,
+                "beginGeldigheid": data["beginGeldigheid"],
+                "eindeGeldigheid": None,
+            }
+
+        m.get("http://test/api/informatieobjecttypen", json=empty_list_response)
+        m.get("http://test/api/zaaktypen", json=empty_list_response)
+        m.post("http://test/api/zaaktypen", json=create_zaaktype)
+        m.get("http://test/api/roltypen", json=empty_list_response)
+        m.post("http://test/api/roltypen", json=roltype_response, status_code=201)
+        m.get("http://test/api/statustypen", json=empty_list_response)
+        m.post("http://test/api/statustypen", json=statustype_response, status_code=201)
+        m.get("http://test/api/resultaattypen", json=empty_list_response)
+        m.get(
+            "http://test/api/zaaktype-informatieobjecttypen", json=empty_list_response
+        )
+
+        identificaties = [f"B{i}" for i in range(8)]
+        zaaktypen_data = [
+            {
+                "identificatie": identificatie,
+                "beginGeldigheid": "2020-01-01",
+                "_children": {
+                    "roltypen": [{"omschrijving": "Initiator"}],
+                    "statustypen": [{"volgnummer": 1}],
+                    "resultaattypen": [],
+                    "zaakinformatieobjecttypen": [],
+                },
+            }
+            for identificatie in identificaties
+        ]
+
+        expected = []
+        for identificatie in identificaties:
+            expected += [
+                f"zaaktype {identificatie} created new concept",
+                f"zaaktype {identificatie}: roltype omschrijving='Initiator' created new",
+                f"zaaktype {identificatie}: statustype volgnummer='1' created new",
+            ]
+        return job, zaaktypen_data, expected
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_concurrent_load(self, m):
+        """
+        Test loading zaaktypen with multiple workers keeps the logs of each zaaktype together
+        """
+        job, zaaktypen_data, expected = self.setup_concurrent_load(m)
+
+        session = ImportSession(job)
+        load_data(session, zaaktypen_data, [])
+        session.flush_counts(force=True)
+
+        messages = list(job.joblog_set.values_list("message", flat=True))
+        self.assertEqual(messages, expected)
+
+        job.refresh_from_db()
+        self.assertEqual(job.statistics["data"]["zt"]["created"], 8)
+        self.assertEqual(job.statistics["data"]["rt"]["created"], 8)
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_concurrent_load_apm_spans(self, m):
+        """
+        Test the Catalogi API spans of the workers are captured in the transaction of the import
+        """
+        job, zaaktypen_data, expected = self.setup_concurrent_load(m)
+        transaction = object()
+        spans = []
+
+        def capture_span(name, **kwargs):
+            spans.append(
+                (
+                    name,
+                    threading.current_thread().name,
+                    execution_context.get_transaction(),
+                )
+            )
+            return nullcontext()
+
+        session = ImportSession(job)
+        execution_context.set_transaction(transaction)
+        self.addCleanup(execution_context.set_transaction, None)
+        with patch(
+            "importer.core.reporting.elasticapm.capture_span", side_effect=capture_span
+        ):
+            load_data(session, zaaktypen_data, [])
+
+        worker_spans = [span for span in spans if span[0] == "catalogi zaaktype create"]
+        self.assertEqual(len(worker_spans), 8)
+        for name, thread_name, span_transaction in worker_spans:
+            self.assertTrue(thread_name.startswith("loader"))
+            self.assertIs(span_transaction, transaction)
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_concurrent_load_same_identificatie(self, m):
+        """
+        Test versions of the same zaaktype are loaded one after the other by a single worker
+        """
+        job, zaaktypen_data, expected = self.setup_concurrent_load(m)
+        zaaktypen_data.insert(
+            4,
+            {
+                "identificatie": "B0",
+                "beginGeldigheid": "2021-01-01",
+                "_children": {
+                    "roltypen": [],
+                    "statustypen": [],
+                    "resultaattypen": [],
+                    "zaakinformatieobjecttypen": [],
+                },
+            },
+        )
+        created = []
+
+        def create_zaaktype(request, context):
+            data = request.json()
+            created.append(
+                (
+                    data["identificatie"],
+                    data["beginGeldigheid"],
+                    threading.current_thread().name,
+                )
+            )
+            context.status_code = 201
+            return {
+                "url": f"http://test/api/zaaktypen/{data['identificatie']}",
+                "identificatie": data["identificatie"],
+                "concept": True,
+                "beginGeldigheid": data["beginGeldigheid"],
+                "eindeGeldigheid": None,
+            }
+
+        m.post("http://test/api/zaaktypen", json=create_zaaktype)
+
+        session = ImportSession(job)
+        load_data(session, zaaktypen_data, [])
+        session.flush_counts(force=True)
+
+        versions = [entry for entry in created if entry[0] == "B0"]
+        self.assertEqual([entry[1] for entry in versions], ["2020-01-01", "2021-01-01"])
+        self.assertEqual(versions[0][2], versions[1][2])
+
+        # the logs still follow the original order
+        messages = list(job.joblog_set.values_list("message", flat=True))
+        self.assertEqual(messages[12], "zaaktype B0 created new concept")
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_import_reuses_precheck(self, m):
+        """
+        Test the import uses the stored result of the precheck instead of parsing again
+        """
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+
+        precheck_import(job)
+        job.refresh_from_db()
+        self.assertTrue(job.parsed_data)
+
+        precheck_messages = [log.message for log in job.joblog_set.all()]
+        precheck_statistics = job.statistics
+
+        m.get(
+            "http://test/api/informatieobjecttypen?catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json=empty_list_response,
+        )
+        m.post(
+            "http://test/api/informatieobjecttypen",
+            json=informatieobjecttype_response,
+            status_code=201,
+        )
+        m.get(
+            "http://test/api/zaaktypen?identificatie=B1796&catalogus=http%3A%2F%2Ftest%2Fapi%2Fcatalogussen%2F7c0e6595-adbe-45b4-b092-31ba75c7dd74&status=alles",
+            json=empty_list_response,
+        )
+        m.post(
+            "http://test/api/zaaktypen",
+            json=zaaktype_response,
+            status_code=201,
+        )
+        self.setup_create_children_mocks(m, "http%3A%2F%2Ftest%2Fapi%2Fzaaktypen%2F1")
+
+        m.reset_mock()
+        import_job_task(job.id)
+        job.refresh_from_db()
+
+        self.assertEqual(job.state, JobState.completed)
+
+        # no calls to the Selectielijst API
+        hosts = {r.hostname for r in m.request_history}
+        self.assertNotIn("selectielijst.openzaak.nl", hosts)
+
+        # the precheck logs are replayed before the loading logs
+        messages = [log.message for log in job.joblog_set.all()]
+        end = messages.index("End of precheck, start loading..")
+        self.assertEqual(
+            messages[:end],
+            [
+                message
+                for message in precheck_messages
+                if not message.startswith("zaaktype B1796 '")
+            ],
+        )
+        self.assertEqual(
+            job.statistics["data"]["zt"]["issues"],
+            precheck_statistics["data"]["zt"]["issues"],
+        )
+        self.assertEqual(job.statistics["data"]["zt"]["created"], 1)
+
+        # timings of both phases
+        precheck_stages = {stage["stage"]: stage for stage in job.timings["precheck"]}
+        self.assertEqual(
+            set(precheck_stages),
+            {
+                "check_job",
+                "read_source",
+                "check_xml",
+                "read_processes",
+                "selectielijst",
+                "parse_processes",
+                "save_parsed_data",
+            },
+        )
+        self.assertEqual(precheck_stages["parse_processes"]["types"]["zt"]["count"], 1)
+        self.assertEqual(precheck_stages["read_processes"]["count"], 0)
+
+        import_stages = {stage["stage"]: stage for stage in job.timings["import"]}
+        self.assertEqual(
+            set(import_stages),
+            {
+                "check_job",
+                "read_source",
+                "load_parsed_data",
+                "load_iotypen",
+                "load_zaaktypen",
+            },
+        )
+        self.assertEqual(import_stages["load_zaaktypen"]["types"]["zt"]["count"], 1)
+
+    @override_settings(CACHES=TEST_CACHES)
+    @requests_mock.Mocker()
+    def test_parsed_data_invalidated(self, m):
+        job = self.setup_import_job(m, "example-stripped-single.xml")
+        precheck_import(job)
+
+        self.assertIsNotNone(load_parsed_data(job, get_source_fingerprint(job)))
+
+        job.year = 2019
+        self.assertIsNone(load_parsed_data(job, get_source_fingerprint(job)))
+
     @requests_mock.Mocker()
     def test_error_malformed_xml(self, m):
+        caches["default"].clear()
         job = self.setup_import_job(m, "invalid-malformed.xml")
 
         # for debugging run the import function
@@ -858,6 +1396,10 @@ class ImportTest(TestCaseMixin, TestCase):
         self.assertEqual(job.statistics, {})
         self.assertEqual(job.state, JobState.error)
 
+        # the logs written at the end are counted in the metrics
+        sample = format_sample(JOBLOGS_METRIC, {"level": JobLogLevel.error})
+        self.assertEqual(read_samples([sample]), {sample: 1})
+
     @requests_mock.Mocker()
     def test_error_schema_xml(self, m):
         job = self.setup_import_job(m, "invalid-schema.xml")
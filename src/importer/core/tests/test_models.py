@@ -1,12 +1,22 @@
 from datetime import datetime, timedelta
+from io import StringIO
 
+from django.core.files.base import ContentFile
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
 import pytz
 
 from importer.core.choices import JobLogLevel, JobState
-from importer.core.models import Job
-from importer.core.tests.factories import JobFactory, JobLogFactory
+from importer.core.models import Job, JobLog
+from importer.core.tests.factories import (
+    CompletedJobFactory,
+    ErrorJobFactory,
+    JobFactory,
+    JobLogFactory,
+    RunningJobFactory,
+)
 
 
 class JobTests(TestCase):
@@ -147,3 +157,44 @@ class JobLogTests(TestCase):
     def test_icons(self):
         log = JobLogFactory(level=JobLogLevel.warning, message="0123456789abcdef")
         self.assertEqual(log.get_level_icon(), "⚠️️")
+
+    def test_purge(self):
+        job = JobFactory()
+        JobLogFactory.create_batch(3, job=job)
+        other = JobLogFactory()
+
+        with self.assertNumQueries(1):
+            count = job.joblog_set.purge()
+
+        self.assertEqual(count, 3)
+        self.assertEqual(list(JobLog.objects.all()), [other])
+
+    def test_purge_expired(self):
+        old = timezone.now() - timedelta(days=100)
+        recent = timezone.now() - timedelta(days=10)
+
+        expired = [
+            JobLogFactory(job=CompletedJobFactory(stopped_at=old)),
+            JobLogFactory(job=ErrorJobFactory(stopped_at=old)),
+        ]
+        kept = [
+            JobLogFactory(job=CompletedJobFactory(stopped_at=recent)),
+            JobLogFactory(job=RunningJobFactory()),
+        ]
+        self.assertEqual(set(JobLog.objects.filter_expired(days=90)), set(expired))
+
+        call_command("purge_job_logs", days=90, stdout=StringIO())
+        self.assertEqual(set(JobLog.objects.all()), set(kept))
+
+    def test_purge_expired_log_archive(self):
+        old = timezone.now() - timedelta(days=100)
+        job = CompletedJobFactory(stopped_at=old)
+        job.log_archive.save("logs.jsonl.gz", ContentFile(b""))
+        storage = job.log_archive.storage
+        name = job.log_archive.name
+
+        call_command("purge_job_logs", days=90, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.log_archive.name, "")
+        self.assertFalse(storage.exists(name))
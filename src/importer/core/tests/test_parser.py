@@ -0,0 +1,69 @@
+from io import BytesIO
+
+from django.test import TestCase
+
+import requests_mock
+from lxml import etree
+
+from importer.core.parser import iter_processes, iterparse_xml, read_preambule
+from importer.core.reporting import ImportSession
+from importer.core.tests.base import TestCaseMixin
+from importer.core.tests.factories import JobFactory
+
+
+class StreamingParserTests(TestCaseMixin, TestCase):
+    def test_read_preambule(self):
+        source = BytesIO(self.get_test_data("example.xml"))
+        preambule = read_preambule(source)
+        self.assertEqual(preambule.find("specificatieversie").text, "ICR1.5.13")
+
+    def test_read_preambule_missing(self):
+        source = BytesIO(self.get_test_data("invalid-schema.xml"))
+        self.assertIsNone(read_preambule(source))
+
+    def test_read_preambule_not_first(self):
+        # malformed after the first process, we don't read that far
+        source = BytesIO(
+            b"<dsp><processen><proces><naam>foo</naam></proces>"
+            b"<proces><<<<</processen></dsp>"
+        )
+        self.assertIsNone(read_preambule(source))
+
+    def test_read_preambule_malformed(self):
+        source = BytesIO(self.get_test_data("invalid-malformed.xml"))
+        with self.assertRaises(etree.LxmlError):
+            read_preambule(source)
+
+    def test_iter_processes_clears_elements(self):
+        source = BytesIO(self.get_test_data("example.xml"))
+        seen = []
+        for process in iter_processes(source):
+            # earlier siblings have been removed from the tree
+            self.assertIsNone(process.getprevious())
+            seen.append(process.get("id"))
+
+        self.assertEqual(len(seen), 3)
+
+    @requests_mock.Mocker()
+    def test_iterparse_xml(self, m):
+        self.setup_selectielijst_service()
+        self.setup_selectielijst_mocks(m)
+        job = JobFactory()
+        session = ImportSession(job)
+
+        source = BytesIO(self.get_test_data("example.xml"))
+        zaaktypen, iotypen = iterparse_xml(session, source, job.year)
+
+        self.assertEqual(
+            [zaaktype["identificatie"] for zaaktype in zaaktypen],
+            ["B1796", "B1799", "B1801"],
+        )
+        # the children are kept with each zaaktype for the loader
+        self.assertEqual(
+            set(zaaktypen[0]["_children"]),
+            {"roltypen", "statustypen", "resultaattypen", "zaakinformatieobjecttypen"},
+        )
+        self.assertTrue(iotypen)
+        self.assertEqual(
+            len({iotype["omschrijving"] for iotype in iotypen}), len(iotypen)
+        )
@@ -0,0 +1,72 @@
+import pstats
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+
+from django.test import TestCase
+
+from importer.core.profiling import StackSampler, get_stack, profile_job
+from importer.core.tests.factories import JobFactory
+
+
+def work():
+    return sum(i * i for i in range(10000))
+
+
+class ProfilingTest(TestCase):
+    def test_profile_job(self):
+        job = JobFactory(profiling=True)
+
+        with profile_job(job, "precheck"):
+            work()
+            # for the allocations in the stage timings
+            self.assertTrue(tracemalloc.is_tracing())
+        with profile_job(job, "import"):
+            work()
+
+        self.assertFalse(tracemalloc.is_tracing())
+
+        job.refresh_from_db()
+        with job.profile.open("rb") as f:
+            with zipfile.ZipFile(f) as archive:
+                self.assertEqual(
+                    sorted(archive.namelist()),
+                    [
+                        "import.collapsed",
+                        "import.pstats",
+                        "precheck.collapsed",
+                        "precheck.pstats",
+                    ],
+                )
+                data = archive.read("import.pstats")
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            stats = pstats.Stats(f.name)
+        functions = [func for (filename, line, func) in stats.stats]
+        self.assertIn("work", functions)
+
+    def test_profile_job_disabled(self):
+        job = JobFactory()
+
+        with profile_job(job, "import"):
+            work()
+
+        job.refresh_from_db()
+        self.assertFalse(job.profile)
+
+    def test_stack_sampler(self):
+        sampler = StackSampler()
+        sampler.sample()
+
+        # at least the stack of the test itself
+        collapsed = sampler.get_collapsed()
+        self.assertIn(f"{__name__}:test_stack_sampler;", collapsed)
+
+    def test_get_stack(self):
+        stack = get_stack("root", sys._getframe()).split(";")
+
+        self.assertEqual(stack[0], "root")
+        self.assertEqual(stack[-1], f"{__name__}:test_get_stack")
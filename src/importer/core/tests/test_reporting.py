@@ -1,21 +1,33 @@
 import json
+import tracemalloc
+from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.translation import gettext as _
 
 from requests import HTTPError
 from zds_client import ClientError
 
-from importer.core.choices import JobLogLevel
+from importer.core.artifacts import iter_log_archive
+from importer.core.choices import JobLogCode, JobLogLevel, JobLogMode, JobStage
 from importer.core.constants import ObjectTypenKeys
+from importer.core.progress import clear_progress, get_progress
 from importer.core.reporting import (
+    HttpCounter,
     ImportSession,
+    MemoryLimitExceeded,
+    StageTimings,
+    TypeCounter,
     format_exception,
+    transform_http_statistics,
     transform_import_statistics,
+    transform_memory,
     transform_precheck_statistics,
+    transform_timings,
 )
-from importer.core.tests.factories import JobFactory
+from importer.core.tests.factories import JobFactory, ZGWServiceFactory
+from importer.utils.client import SessionClient
 
 
 class ImportSessionUtilsTest(TestCase):
@@ -25,6 +37,9 @@ class ImportSessionUtilsTest(TestCase):
         session.log_info("foo-info")
         session.log_warning("foo-warning")
         session.log_error("foo-error")
+        # logs are buffered
+        self.assertEqual(job.joblog_set.all().count(), 0)
+        session.flush_logs()
         self.assertEqual(job.joblog_set.all().count(), 3)
 
     def test_importsession_import_Logs(self):
@@ -33,6 +48,7 @@ class ImportSessionUtilsTest(TestCase):
         session.log_info("foo-info")
         session.log_warning("foo-warning")
         session.log_error("foo-error")
+        session.flush_logs()
         logs = list(job.joblog_set.values("level", "message"))
         self.assertEqual(
             logs,
@@ -43,6 +59,94 @@ class ImportSessionUtilsTest(TestCase):
             ],
         )
 
+    @patch("importer.core.reporting.LOG_BUFFER_SIZE", 3)
+    def test_importsession_logs_buffer_size(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        session.log_info("foo-1")
+        session.log_info("foo-2")
+        self.assertEqual(job.joblog_set.count(), 0)
+
+        session.log_info("foo-3")
+        self.assertEqual(job.joblog_set.count(), 3)
+
+        session.log_info("foo-4")
+        session.flush_counts()
+        self.assertEqual(job.joblog_set.count(), 4)
+
+    @patch("importer.core.reporting.LOG_BUFFER_TIMEOUT", 0)
+    def test_importsession_logs_buffer_timeout(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        session.log_info("foo-1")
+        self.assertEqual(job.joblog_set.count(), 1)
+
+    @patch("importer.core.reporting.LOG_SAMPLE_SIZE", 2)
+    def test_importsession_log_records(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        session.log_info("foo-info")
+        for i in range(3):
+            session.log_record(
+                JobLogLevel.info,
+                JobLogCode.default_value,
+                f"zaaktype {i}:",
+                ObjectTypenKeys.zaaktypen,
+                field="aanleiding",
+                default="n.v.t.",
+            )
+        for i, original_length in enumerate((100, 120)):
+            session.log_record(
+                JobLogLevel.warning,
+                JobLogCode.trimmed,
+                f"zaaktype {i}:",
+                ObjectTypenKeys.zaaktypen,
+                detail=f"{original_length} characters",
+                field="omschrijving",
+                length=80,
+            )
+
+        # records are aggregated until flushed
+        session.flush_logs()
+        self.assertEqual(job.joblog_set.count(), 1)
+
+        session.flush_records()
+        session.flush_logs()
+        logs = list(
+            job.joblog_set.values(
+                "level", "code", "type_key", "message", "count", "sample"
+            )
+        )
+        self.assertEqual(
+            logs[1:],
+            [
+                {
+                    "level": JobLogLevel.info,
+                    "code": JobLogCode.default_value,
+                    "type_key": ObjectTypenKeys.zaaktypen,
+                    "message": "aanleiding not defined. It will be set as 'n.v.t.'",
+                    "count": 3,
+                    "sample": ["zaaktype 0", "zaaktype 1"],
+                },
+                {
+                    "level": JobLogLevel.warning,
+                    "code": JobLogCode.trimmed,
+                    "type_key": ObjectTypenKeys.zaaktypen,
+                    "message": "Imported value for 'omschrijving' is trimmed to 80 characters.",
+                    "count": 2,
+                    "sample": [
+                        "zaaktype 0 (100 characters)",
+                        "zaaktype 1 (120 characters)",
+                    ],
+                },
+            ],
+        )
+        # issues are counted per occurrence
+        self.assertEqual(
+            session.counter.get_data()["data"][ObjectTypenKeys.zaaktypen]["issues"],
+            {JobLogLevel.warning: 2},
+        )
+
     def test_importsession_log_stats(self):
         job = JobFactory()
         session = ImportSession(job)
@@ -72,6 +176,45 @@ class ImportSessionUtilsTest(TestCase):
         session.flush_counts()
         self.assertEqual(data, job.statistics)
 
+    @override_settings(STATISTICS_FLUSH_INTERVAL=60)
+    def test_importsession_flush_counts_interval(self):
+        job = JobFactory()
+        session = ImportSession(job)
+
+        with patch.object(job, "set_statistics") as set_statistics:
+            session.counter.increment_created(ObjectTypenKeys.roltypen)
+            session.flush_counts()
+            self.assertEqual(set_statistics.call_count, 1)
+
+            # too soon
+            session.counter.increment_created(ObjectTypenKeys.roltypen)
+            session.flush_counts()
+            self.assertEqual(set_statistics.call_count, 1)
+
+            # forced
+            session.flush_counts(force=True)
+            self.assertEqual(set_statistics.call_count, 2)
+
+            # nothing changed
+            session.flush_counts(force=True)
+            self.assertEqual(set_statistics.call_count, 2)
+
+    def test_importsession_publishes_progress(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        self.addCleanup(clear_progress, job.id)
+
+        session.counter.increment_created(ObjectTypenKeys.roltypen)
+        session.log_info("foo-info")
+        session.flush_counts()
+
+        progress = get_progress(job.id)
+        self.assertEqual(progress["state"], job.state)
+        self.assertEqual(progress["statistics"], session.counter.get_data())
+        self.assertEqual(
+            progress["logs"], [{"id": 1, "level": "info", "message": "foo-info"}]
+        )
+
     def test_importsession_counter_stats(self):
         job = JobFactory()
         session = ImportSession(job)
@@ -126,6 +269,175 @@ class ImportSessionUtilsTest(TestCase):
         session.flush_counts()
         self.assertEqual(data, job.statistics)
 
+    def test_importsession_log_archive(self):
+        job = JobFactory(log_mode=JobLogMode.archive)
+        session = ImportSession(job)
+        session.log_info("foo-info")
+        session.log_warning("foo-warning")
+        session.log_error("foo-error")
+        session.flush_logs()
+        session.close()
+
+        # only warnings and errors in the database
+        logs = list(job.joblog_set.values_list("level", "message"))
+        self.assertEqual(
+            logs,
+            [
+                (JobLogLevel.warning, "foo-warning"),
+                (JobLogLevel.error, "foo-error"),
+            ],
+        )
+
+        # everything in the archive
+        job.refresh_from_db()
+        self.assertEqual(job.log_archive.name, f"jobs/logs/{job.id}.jsonl.gz")
+        logs = [(log.level, log.message) for log in iter_log_archive(job)]
+        self.assertEqual(
+            logs,
+            [
+                (JobLogLevel.info, "foo-info"),
+                (JobLogLevel.warning, "foo-warning"),
+                (JobLogLevel.error, "foo-error"),
+            ],
+        )
+
+        # a new session replaces the archive
+        session = ImportSession(job)
+        session.log_info("bar-info")
+        session.close()
+        logs = [(log.level, log.message) for log in iter_log_archive(job)]
+        self.assertEqual(logs, [(JobLogLevel.info, "bar-info")])
+        self.assertEqual(job.log_archive.name, f"jobs/logs/{job.id}.jsonl.gz")
+
+    def test_log_archive_truncated(self):
+        job = JobFactory(log_mode=JobLogMode.archive)
+        session = ImportSession(job)
+        for i in range(1000):
+            session.log_info(f"foo-info-{i}")
+        session.close()
+
+        job.refresh_from_db()
+        with job.log_archive.open("rb") as f:
+            content = f.read()
+        with job.log_archive.open("wb") as f:
+            f.write(content[: len(content) // 2])
+
+        # the logs before the cut are still readable
+        logs = [log.message for log in iter_log_archive(job)]
+        self.assertTrue(0 < len(logs) < 1000)
+        self.assertEqual(logs, [f"foo-info-{i}" for i in range(len(logs))])
+
+    def test_worker_session_buffers_logs(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        worker_session = session.create_worker_session()
+
+        worker_session.log_info("foo-info")
+        worker_session.log_error("foo-error", ObjectTypenKeys.zaaktypen)
+        worker_session.counter.increment_created(ObjectTypenKeys.zaaktypen)
+
+        # nothing is written until the parent merges
+        self.assertEqual(job.joblog_set.count(), 0)
+        # but the counter is shared
+        self.assertEqual(session.counter.data[ObjectTypenKeys.zaaktypen].created, 1)
+
+        session.merge_worker_session(worker_session)
+        session.flush_logs()
+        logs = list(job.joblog_set.values_list("message", "type_key"))
+        self.assertEqual(
+            logs, [("foo-info", ""), ("foo-error", ObjectTypenKeys.zaaktypen)]
+        )
+        self.assertEqual(worker_session.logs, [])
+
+    def test_merge_worker_session_log_fields(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        worker_session = session.create_worker_session()
+        worker_session.add_log(
+            JobLogLevel.warning,
+            "foo-warning",
+            ObjectTypenKeys.roltypen,
+            code=JobLogCode.default_value,
+            count=2,
+            sample=["zaaktype 1", "zaaktype 2"],
+        )
+
+        session.merge_worker_session(worker_session)
+        session.flush_logs()
+        log = job.joblog_set.get()
+        self.assertEqual(log.type_key, ObjectTypenKeys.roltypen)
+        self.assertEqual(log.code, JobLogCode.default_value)
+        self.assertEqual(log.count, 2)
+        self.assertEqual(log.sample, ["zaaktype 1", "zaaktype 2"])
+
+    def test_client_from_url_per_service(self):
+        ZGWServiceFactory(api_root="http://test/api/")
+        ZGWServiceFactory(api_root="http://other/api/")
+        job = JobFactory()
+        session = ImportSession(job)
+
+        with self.assertNumQueries(1):
+            client = session.client_from_url("http://test/api/zaaktypen/1")
+            self.assertIs(
+                session.client_from_url("http://test/api/zaaktypen/1"), client
+            )
+        self.assertIs(session.client_from_url("http://test/api/roltypen/1"), client)
+
+        self.assertIsInstance(client, SessionClient)
+        self.assertIs(client.http_session, session.http_session)
+
+        other = session.client_from_url("http://other/api/zaaktypen/1")
+        self.assertIsNot(other, client)
+        self.assertIs(other.http_session, session.http_session)
+
+        with self.assertRaises(ClientError):
+            session.client_from_url("http://unknown/api/zaaktypen/1")
+
+    def test_client_from_url_longest_api_root(self):
+        ZGWServiceFactory(api_root="http://test/api/")
+        job = JobFactory()
+        session = ImportSession(job)
+        client = session.client_from_url("http://test/api/zaaktypen/1")
+
+        # a more specific Service is used, even with a client for a shorter api_root
+        ZGWServiceFactory(api_root="http://test/api/catalogi/")
+        other = session.client_from_url("http://test/api/catalogi/zaaktypen/1")
+        self.assertIsNot(other, client)
+        self.assertEqual(other.base_url, "http://test/api/catalogi/")
+
+    @override_settings(HTTP_POOL_SIZE=10)
+    def test_http_pool_size_loader_workers(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        adapter = session.http_session.get_adapter("http://test/api/")
+        self.assertEqual(adapter._pool_maxsize, 10)
+
+        job.catalog.loader_workers = 16
+        session = ImportSession(job)
+        adapter = session.http_session.get_adapter("http://test/api/")
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+    @patch("importer.core.reporting.elasticapm.capture_span")
+    def test_capture_span_labels(self, capture_span):
+        job = JobFactory()
+        session = ImportSession(job)
+
+        session.capture_span(
+            "catalogi zaaktype create",
+            span_type="external",
+            span_action="create",
+            type_key=ObjectTypenKeys.zaaktypen,
+            zaaktype=None,
+        )
+
+        capture_span.assert_called_once_with(
+            "catalogi zaaktype create",
+            span_type="external",
+            span_subtype=None,
+            span_action="create",
+            labels={"job_id": job.id, "type_key": ObjectTypenKeys.zaaktypen},
+        )
+
 
 class ResportingUtilsTest(TestCase):
     def test_transform_precheck_statistics(self):
@@ -207,6 +519,78 @@ class ResportingUtilsTest(TestCase):
         self.assertEqual(actual, expected)
 
 
+class HttpCounterTest(TestCase):
+    def test_get_data(self):
+        counter = HttpCounter()
+        for i in range(1, 101):
+            counter.record("get", "zaaktype", 200, i / 1000)
+        counter.record("POST", "roltype", 201, 0.5)
+        counter.record("POST", "roltype", None, 2)
+
+        self.assertEqual(
+            counter.get_data(),
+            [
+                {
+                    "method": "GET",
+                    "resource": "zaaktype",
+                    "count": 100,
+                    "statuses": {"200": 100},
+                    "duration": 5.05,
+                    "p50": 50.0,
+                    "p95": 95.0,
+                    "p99": 99.0,
+                },
+                {
+                    "method": "POST",
+                    "resource": "roltype",
+                    "count": 2,
+                    "statuses": {"201": 1, "error": 1},
+                    "duration": 2.5,
+                    "p50": 500.0,
+                    "p95": 2000.0,
+                    "p99": 2000.0,
+                },
+            ],
+        )
+
+    def test_session_statistics(self):
+        job = JobFactory()
+        session = ImportSession(job)
+        session.http_counter.record("GET", "zaaktype", 200, 0.1)
+        session.flush_counts(force=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.statistics["http"][0]["count"], 1)
+
+    def test_transform_http_statistics(self):
+        calls = [
+            {
+                "method": "GET",
+                "resource": "zaaktype",
+                "count": 3,
+                "statuses": {"404": 1, "200": 2},
+                "duration": 0.3,
+                "p50": 100.0,
+                "p95": 120.0,
+                "p99": 120.0,
+            }
+        ]
+        expected = [
+            [
+                "HTTP requests",
+                "requests",
+                "p50 ms",
+                "p95 ms",
+                "p99 ms",
+                "status codes",
+            ],
+            ["GET zaaktype", 3, 100.0, 120.0, 120.0, "200: 2, 404: 1"],
+        ]
+        self.assertEqual(transform_http_statistics(calls), expected)
+        self.assertEqual(transform_import_statistics({"http": calls})[-2:], expected)
+        self.assertEqual(transform_http_statistics(None), [])
+
+
 class FormatUtilTest(TestCase):
     def test_format_exception_single(self):
         exc = ClientError(
@@ -265,3 +649,145 @@ class FormatUtilTest(TestCase):
         actual = format_exception(exc)
         expected = "problem"
         self.assertEqual(actual, expected)
+
+
+class StageTimingsTest(TestCase):
+    @patch("importer.core.reporting.get_peak_rss")
+    @patch("importer.core.reporting.time.perf_counter")
+    def test_nested_stages(self, perf_counter, get_peak_rss):
+        perf_counter.side_effect = [0, 1, 3, 6, 10, 11]
+        get_peak_rss.side_effect = [100, 100, 150, 150, 170, 200]
+        counter = TypeCounter()
+        timings = StageTimings(counter)
+
+        with timings.stage(JobStage.parse_processes):
+            counter.increment_counted(ObjectTypenKeys.zaaktypen)
+            with timings.stage(JobStage.selectielijst):
+                pass
+            counter.increment_counted(ObjectTypenKeys.roltypen)
+            with timings.stage(JobStage.selectielijst):
+                counter.increment_errored(ObjectTypenKeys.roltypen)
+
+        self.assertEqual(
+            timings.get_data(),
+            [
+                {
+                    "stage": "selectielijst",
+                    "duration": 6,
+                    "count": 1,
+                    "rate": 0.2,
+                    "types": {"rt": {"count": 1, "rate": 0.2}},
+                    "memory": {"peak_rss": 170, "rss_growth": 70},
+                },
+                {
+                    "stage": "parse_processes",
+                    "duration": 5,
+                    "count": 2,
+                    "rate": 0.4,
+                    "types": {
+                        "zt": {"count": 1, "rate": 0.2},
+                        "rt": {"count": 1, "rate": 0.2},
+                    },
+                    "memory": {"peak_rss": 200, "rss_growth": 30},
+                },
+            ],
+        )
+
+    def test_memory_limit(self):
+        timings = StageTimings(TypeCounter(), memory_limit=1024 * 1024)
+
+        with self.assertRaisesRegex(MemoryLimitExceeded, "exceeds the limit of 1.0 MB"):
+            with timings.stage(JobStage.parse_processes):
+                pass
+
+        # without a limit
+        timings = StageTimings(TypeCounter())
+        with timings.stage(JobStage.parse_processes):
+            pass
+
+    def test_allocations(self):
+        timings = StageTimings(TypeCounter())
+
+        tracemalloc.start()
+        try:
+            with timings.stage(JobStage.parse_processes):
+                data = [str(i) * 100 for i in range(10000)]
+        finally:
+            tracemalloc.stop()
+
+        memory = timings.get_data()[0]["memory"]
+        self.assertLessEqual(len(memory["allocations"]), 10)
+        self.assertIn(__file__, memory["allocations"][0]["location"])
+        self.assertGreater(memory["allocations"][0]["size"], 1000000)
+        del data
+
+    def test_transform_memory(self):
+        self.assertEqual(transform_memory({}), [])
+        # timings from before the memory was tracked
+        self.assertEqual(
+            transform_memory({"precheck": [{"stage": "parse_processes"}]}), []
+        )
+
+        rows = transform_memory(
+            {
+                "import": [
+                    {
+                        "stage": "load_zaaktypen",
+                        "memory": {
+                            "peak_rss": 200 * 1024 * 1024,
+                            "rss_growth": 50 * 1024 * 1024,
+                            "allocations": [
+                                {
+                                    "location": "foo.py:1",
+                                    "size": 1024 * 1024,
+                                    "count": 3,
+                                }
+                            ],
+                        },
+                    }
+                ]
+            }
+        )
+        self.assertEqual(
+            rows,
+            [
+                ["", "peak RSS MB", "RSS growth MB", "allocated MB", "blocks"],
+                ["Import", "", "", "", ""],
+                ["Load zaaktypen", 200.0, 50.0, "", ""],
+                ["- foo.py:1", "", "", 1.0, 3],
+            ],
+        )
+
+    def test_iter_stage(self):
+        timings = StageTimings(TypeCounter())
+        items = list(timings.iter_stage(JobStage.read_processes, range(3)))
+        self.assertEqual(items, [0, 1, 2])
+        self.assertEqual(
+            [stage["stage"] for stage in timings.get_data()], ["read_processes"]
+        )
+
+    def test_transform_timings(self):
+        self.assertEqual(transform_timings({}), [])
+
+        rows = transform_timings(
+            {
+                "precheck": [
+                    {
+                        "stage": "parse_processes",
+                        "duration": 2,
+                        "count": 4,
+                        "rate": 2.0,
+                        "types": {"zt": {"count": 4, "rate": 2.0}},
+                    }
+                ]
+            }
+        )
+        self.assertEqual(
+            rows,
+            [
+                ["", "seconds", "objects", "objects/s"],
+                ["Precheck", "", "", ""],
+                ["Parse processes", "2.000", 4, 2.0],
+                ["- Zaaktypen", "", 4, 2.0],
+            ],
+        )
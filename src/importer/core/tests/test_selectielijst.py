@@ -1,4 +1,6 @@
 import re
+from io import BytesIO
+from unittest.mock import patch
 
 from django.test import TestCase
 
@@ -10,9 +12,10 @@ from importer.core.parser import (
     DEFAULT_RESULTAATTYPE_OMSCHRIJVINGEN,
     get_resultaat_number,
     get_resultaattype_omschrijving,
-    parse_xml,
+    iterparse_xml,
 )
 from importer.core.reporting import ImportSession
+from importer.core.selectielijst import SelectielijstIndex
 from importer.core.tests.base import TestCaseMixin
 from importer.core.tests.factories import JobFactory
 
@@ -80,6 +83,53 @@ class SelectielijstTests(TestCaseMixin, TestCase):
         omschrijving = get_resultaattype_omschrijving(session, "dummy", result_type)
         self.assertNotEqual(omschrijving, DEFAULT_RESULTAATTYPE_OMSCHRIJVINGEN)
 
+    @requests_mock.Mocker()
+    def test_index(self, m):
+        self.setup_selectielijst_service()
+        self.setup_selectielijst_mocks(m)
+
+        index = SelectielijstIndex()
+
+        procestype = index.get_procestype(2020, 11)
+        self.assertEqual(procestype["nummer"], 11)
+        self.assertIsNone(index.get_procestype(2020, 999))
+
+        resultaat = index.get_resultaat("11.1", procestype["url"])
+        self.assertEqual(resultaat["volledigNummer"], "11.1")
+        self.assertEqual(resultaat["procesType"], procestype["url"])
+        self.assertIsNone(index.get_resultaat("999.1", procestype["url"]))
+
+        omschrijving = index.get_resultaattype_omschrijving("Afgewezen")
+        self.assertEqual(omschrijving["omschrijving"], "Afgewezen")
+        self.assertIsNone(index.get_resultaattype_omschrijving("not-an-omschrijving"))
+
+        # every list is fetched once
+        index.get_procestype(2020, 1)
+        index.get_resultaat("1.1", procestype["url"])
+        index.get_resultaattype_omschrijving("Afgebroken")
+        paths = [r.path for r in m.request_history if "schema" not in r.path]
+        self.assertEqual(len(paths), len(set(paths)))
+
+    @requests_mock.Mocker()
+    def test_index_session(self, m):
+        self.setup_selectielijst_service()
+        self.setup_selectielijst_mocks(m)
+        job = JobFactory()
+        session = ImportSession(job)
+
+        with patch.object(
+            session, "capture_span", wraps=session.capture_span
+        ) as capture_span:
+            session.selectielijst.get_resultaattype_omschrijving("Afgewezen")
+
+        # traced with the labels of the session, and timed in its stage
+        capture_span.assert_called_once_with(
+            "selectielijst resultaattypeomschrijvingen",
+            span_subtype="selectielijst",
+            resource="resultaattypeomschrijvingen",
+        )
+        self.assertEqual(session.timings.get_data()[0]["stage"], "selectielijst")
+
     @requests_mock.Mocker()
     def test_get_example_bulk(self, m):
         self.setup_selectielijst_service()
@@ -87,12 +137,10 @@ class SelectielijstTests(TestCaseMixin, TestCase):
         """
         see if we can get values from feedback example
         """
-        tree = etree.fromstring(
-            self.get_test_data("DSP-export 2021.03.30T21.21.36.xml")
-        )
+        source = BytesIO(self.get_test_data("DSP-export 2021.03.30T21.21.36.xml"))
         job = JobFactory()
         session = ImportSession(job)
-        zaaktypen, iotypen = parse_xml(session, tree, job.year)
+        zaaktypen, iotypen = iterparse_xml(session, source, job.year)
         logs = [
             log.message
             for log in session.logs
@@ -1,8 +1,19 @@
+import gzip
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.test import override_settings
 from django.urls import reverse
 
 from django_webtest import WebTest
 
 from importer.accounts.tests.factories import StaffUserFactory, UserFactory
+from importer.core.choices import JobState
+from importer.core.constants import ObjectTypenKeys
+from importer.core.metrics import record_job_metrics
+from importer.core.reporting import ImportSession
+from importer.core.tests.factories import JobFactory
+from importer.utils.storage import private_storage
 
 
 class PrivateStorageTest(WebTest):
@@ -19,3 +30,86 @@ class PrivateStorageTest(WebTest):
         # allowed, expect 404 because file doesn't exist
         self.app.set_user(StaffUserFactory())
         self.app.get(url, status=404)
+
+    def test_private_file_decompress(self):
+        name = private_storage.save(
+            "jobs/logs/test.jsonl.gz", ContentFile(gzip.compress(b'{"foo": 1}\n'))
+        )
+        url = reverse("staff_private_file", kwargs=dict(path=name))
+
+        self.app.set_user(StaffUserFactory())
+        response = self.app.get(url, {"decompress": 1})
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        self.assertEqual(
+            response.headers["Content-Disposition"],
+            f'attachment; filename="{name.split("/")[-1][:-3]}"',
+        )
+        self.assertEqual(response.body, b'{"foo": 1}\n')
+
+        url = reverse("staff_private_file", kwargs=dict(path="x/y.jsonl.gz"))
+        self.app.get(url, {"decompress": 1}, status=404)
+
+
+class MetricsViewTest(WebTest):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+
+    def test_metrics(self):
+        JobFactory(state=JobState.queued)
+        job = JobFactory(state=JobState.completed)
+        session = ImportSession(job)
+        session.counter.increment_updated(ObjectTypenKeys.zaaktypen)
+        session.counter.increment_updated(ObjectTypenKeys.zaaktypen)
+        session.counter.increment_created(ObjectTypenKeys.zaaktypen)
+        session.http_counter.record("GET", "zaaktype", 200, 0.2)
+        session.http_counter.record("POST", "roltype", None, 1)
+        session.log_error("foo")
+        session.flush_counts(force=True)
+        record_job_metrics(job, "import", 90)
+
+        response = self.app.get(reverse("metrics"), user=StaffUserFactory())
+
+        self.assertEqual(
+            response.headers["Content-Type"], "text/plain; version=0.0.4; charset=utf-8"
+        )
+        lines = response.text.splitlines()
+        for expected in [
+            "# TYPE importer_jobs gauge",
+            'importer_jobs{state="queued"} 1',
+            'importer_jobs{state="completed"} 1',
+            'importer_jobs{state="error"} 0',
+            "importer_jobs_queued 1",
+            'importer_job_duration_seconds_bucket{le="60",phase="import"} 0',
+            'importer_job_duration_seconds_bucket{le="120",phase="import"} 1',
+            'importer_job_duration_seconds_sum{phase="import"} 90',
+            'importer_objects_total{phase="import",type_key="zt"} 3',
+            'importer_http_requests_total{method="GET",resource="zaaktype",status="2xx"} 1',
+            'importer_http_requests_total{method="POST",resource="roltype",status="error"} 1',
+            'importer_http_request_duration_seconds_count{resource="zaaktype"} 1',
+            'importer_joblogs_total{level="error"} 1',
+        ]:
+            self.assertIn(expected, lines)
+        # no samples for unused label sets
+        self.assertNotIn(
+            'importer_job_duration_seconds_count{phase="precheck"} 0', lines
+        )
+
+    def test_metrics_requires_staff(self):
+        url = reverse("metrics")
+        self.app.get(url, status=403)
+        self.app.get(url, user=UserFactory(), status=403)
+        self.app.get(url, headers={"Authorization": "Bearer "}, status=403)
+        self.app.get(url, user=StaffUserFactory(), status=200)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        url = reverse("metrics")
+        self.app.get(url, status=403)
+        self.app.get(url, headers={"Authorization": "Bearer wrong"}, status=403)
+        self.app.get(url, headers={"Authorization": "Bearer secret"}, status=200)
+        self.app.get(url, user=StaffUserFactory(), status=200)
+
+    @override_settings(METRICS_PUBLIC=True)
+    def test_metrics_public(self):
+        self.app.get(reverse("metrics"), status=200)
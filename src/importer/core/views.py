@@ -1,20 +1,80 @@
+import gzip
 import logging
+import os
 
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.views import View
 
 from django_sendfile import sendfile
 
+from importer.core.metrics import collect_metrics
 from importer.utils.storage import private_storage
 
 logger = logging.getLogger(__name__)
 
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def iter_decompressed(fs_path):
+    with gzip.open(fs_path, "rb") as f:
+        yield from iter(lambda: f.read(DECOMPRESS_CHUNK_SIZE), b"")
+
 
 class StaffPrivateFileView(View):
     def get(self, request, path):
         if request.user.is_authenticated and request.user.is_staff:
             fs_path = private_storage.path(path)
             logger.info(f"private file access: user_id={request.user.id} path={path}")
+            if request.GET.get("decompress") and path.endswith(".gz"):
+                return self.stream_decompressed(fs_path)
             return sendfile(request, fs_path, attachment=True)
 
         raise PermissionDenied
+
+    def stream_decompressed(self, fs_path):
+        """
+        stream a compressed file like the log archive of a job as plain text
+        """
+        if not os.path.isfile(fs_path):
+            raise Http404
+
+        filename = os.path.basename(fs_path)[: -len(".gz")]
+        if filename.endswith(".jsonl"):
+            content_type = "application/x-ndjson"
+        else:
+            content_type = "application/octet-stream"
+
+        response = StreamingHttpResponse(
+            iter_decompressed(fs_path), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class MetricsView(View):
+    """
+    metrics of the jobs and the workers of all instances in the Prometheus text format
+
+    readable by staff users and by scrapers that send the METRICS_TOKEN setting as bearer token, or by
+      everyone with the METRICS_PUBLIC setting
+    """
+
+    def has_access(self, request) -> bool:
+        if settings.METRICS_PUBLIC:
+            return True
+        if request.user.is_authenticated and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and constant_time_compare(
+            request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+        )
+
+    def get(self, request):
+        if not self.has_access(request):
+            raise PermissionDenied
+
+        return HttpResponse(collect_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
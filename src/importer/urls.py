@@ -7,7 +7,7 @@ from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import include, path, re_path
 from django.views.generic.base import TemplateView
 
-from importer.core.views import StaffPrivateFileView
+from importer.core.views import MetricsView, StaffPrivateFileView
 
 handler500 = "importer.utils.views.server_error"
 admin.site.site_header = "importer admin"
@@ -42,6 +42,7 @@ urlpatterns = [
         StaffPrivateFileView.as_view(),
         name="staff_private_file",
     ),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     # Simply show the master template.
     path("", TemplateView.as_view(template_name="index.html")),
 ]
@@ -1,20 +1,288 @@
+import inspect
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
 from functools import wraps
+from typing import Optional
 
 from django.core.cache import caches
+from django.db import connections
 
+from importer.utils.metrics import MetricsBuffer
+
+logger = logging.getLogger(__name__)
+
+# how long a process may use its local copy before checking the version in the shared cache
+LOCAL_TIMEOUT = 60
+LOCAL_MAX_SIZE = 32
+
+# how long a refresh may hold the lock, and how often others check for its result
+LOCK_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.1
+
+# lookups per cache key and result (hit, stale or miss), written to the shared metrics at most this often
+CACHE_METRIC = "importer_cache_requests_total"
+CACHE_METRICS_INTERVAL = 10
+
+LocalEntry = namedtuple("LocalEntry", ["version", "value", "expires", "fresh_until"])
+
+
+class LocalCache:
+    """
+    small thread-safe in-process LRU cache with a TTL per entry
+
+    this sits in front of the shared Django cache so large values are only unpickled once per process
+    """
+
+    def __init__(self, max_size: int = LOCAL_MAX_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(
+        self,
+        key: str,
+        version: str,
+        value,
+        timeout: float,
+        fresh_until: float = float("inf"),
+    ):
+        with self._lock:
+            self._data[key] = LocalEntry(
+                version, value, time.monotonic() + timeout, fresh_until
+            )
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def touch(self, key: str, timeout: float):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data[key] = entry._replace(expires=time.monotonic() + timeout)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalCache()
+cache_metrics = MetricsBuffer()
+
+
+def make_key(key: str, signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """
+    build the cache key from the key prefix and the arguments of the call
+
+    the arguments are bound to the signature of the function, so passing an argument by position,
+      by name or leaving out its default all give the same key.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    parts = [key]
+    for name, value in bound.arguments.items():
+        kind = signature.parameters[name].kind
+        if kind == inspect.Parameter.VAR_POSITIONAL:
+            parts.extend(str(arg) for arg in value)
+        elif kind == inspect.Parameter.VAR_KEYWORD:
+            parts.extend(f"{k}={v}" for k, v in sorted(value.items()))
+        else:
+            parts.append(f"{name}={value}")
+    return ":".join(parts)
+
+
+def read_entry(entry) -> Optional[tuple]:
+    """
+    the (version, result, fresh_until) of a value in the shared cache, None for a missing value
+
+    anything else under the key (eg: written by an older release in another format) counts as missing.
+    """
+    if isinstance(entry, tuple) and len(entry) == 3:
+        return entry
+    return None
+
+
+def get_version_key(key: str) -> str:
+    return f"{key}:version"
+
+
+def get_lock_key(key: str) -> str:
+    return f"{key}:lock"
+
+
+def cache(
+    key: str,
+    alias: str = "default",
+    local_timeout: float = LOCAL_TIMEOUT,
+    stale_timeout: float = None,
+    **set_options,
+):
+    """
+    cache the result of the function in the Django cache, with an in-process copy in front of it
+
+    the key is build from the given prefix and the arguments of the call.
+
+    the Django cache holds the value with a version stamp, the local copy is used without any
+      round-trip until its local timeout, after that it is kept as long as the version is unchanged.
+
+    only one caller refreshes a missing value while holding a lock in the Django cache, the others
+      wait for its result. with a stale_timeout the expired value is kept that much longer and served
+      while a single caller refreshes it in a background thread.
+
+    every lookup is counted per key prefix and result in the CACHE_METRIC metric.
+    """
 
-def cache(key: str, alias: str = "default", **set_options):
     def decorator(func: callable):
+        signature = inspect.signature(func)
+
+        def get_timeout(_cache):
+            timeout = set_options.get("timeout", _cache.default_timeout)
+            return float("inf") if timeout is None else timeout
+
+        def get_local_timeout(fresh_until):
+            return max(0, min(local_timeout, fresh_until - time.time()))
+
+        def store(_cache, cache_key, result):
+            timeout = get_timeout(_cache)
+            fresh_until = time.time() + timeout
+            version = uuid.uuid4().hex
+
+            options = dict(set_options)
+            if stale_timeout and timeout != float("inf"):
+                options["timeout"] = timeout + stale_timeout
+
+            _cache.set_many(
+                {
+                    cache_key: (version, result, fresh_until),
+                    get_version_key(cache_key): version,
+                },
+                **options,
+            )
+            local_cache.set(
+                cache_key,
+                version,
+                result,
+                get_local_timeout(fresh_until),
+                fresh_until,
+            )
+
+        def acquire(_cache, cache_key):
+            token = uuid.uuid4().hex
+            if _cache.add(get_lock_key(cache_key), token, timeout=LOCK_TIMEOUT):
+                return token
+            return None
+
+        def release(_cache, cache_key, token):
+            lock_key = get_lock_key(cache_key)
+            if _cache.get(lock_key) == token:
+                _cache.delete(lock_key)
+
+        def refresh(_cache, cache_key, token, args, kwargs):
+            try:
+                result = func(*args, **kwargs)
+                store(_cache, cache_key, result)
+                return result
+            finally:
+                release(_cache, cache_key, token)
+
+        def refresh_background(_cache, cache_key, token, args, kwargs):
+            try:
+                refresh(_cache, cache_key, token, args, kwargs)
+            except Exception:
+                logger.exception(f"cannot refresh cached value for '{cache_key}'")
+            finally:
+                # we're in our own thread with our own database connections
+                connections.close_all()
+
+        def wait_for(_cache, cache_key):
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = read_entry(_cache.get(cache_key))
+                if entry is not None:
+                    return entry
+                if _cache.get(get_lock_key(cache_key)) is None:
+                    break
+            return None
+
+        def count(result: str):
+            cache_metrics.increment(CACHE_METRIC, cache=key, result=result)
+            cache_metrics.flush(min_interval=CACHE_METRICS_INTERVAL)
+
         @wraps(func)
         def wrapped(*args, **kwargs):
+            cache_key = make_key(key, signature, args, kwargs)
+
+            local = local_cache.get(cache_key)
+            if local is not None and local.expires > time.monotonic():
+                count("hit")
+                return local.value
+
             _cache = caches[alias]
-            result = _cache.get(key)
-            if result is not None:
-                return result
+            version = _cache.get(get_version_key(cache_key))
+            if (
+                local is not None
+                and version is not None
+                and local.version == version
+                and local.fresh_until > time.time()
+            ):
+                local_cache.touch(cache_key, get_local_timeout(local.fresh_until))
+                count("hit")
+                return local.value
+
+            entry = read_entry(_cache.get(cache_key))
+            if entry is not None:
+                version, result, fresh_until = entry
+                if fresh_until > time.time():
+                    local_cache.set(
+                        cache_key,
+                        version,
+                        result,
+                        get_local_timeout(fresh_until),
+                        fresh_until,
+                    )
+                    count("hit")
+                    return result
 
-            result = func(*args, **kwargs)
-            _cache.set(key, result, **set_options)
-            return result
+                if stale_timeout:
+                    # serve the stale value while one caller refreshes it
+                    token = acquire(_cache, cache_key)
+                    if token:
+                        thread = threading.Thread(
+                            target=refresh_background,
+                            args=(_cache, cache_key, token, args, kwargs),
+                            daemon=True,
+                        )
+                        thread.start()
+                    count("stale")
+                    return result
+
+            count("miss")
+            token = acquire(_cache, cache_key)
+            if not token:
+                # someone else is refreshing, use their result
+                entry = wait_for(_cache, cache_key)
+                if entry is not None:
+                    return entry[1]
+                token = acquire(_cache, cache_key)
+
+            if token:
+                return refresh(_cache, cache_key, token, args, kwargs)
+            else:
+                # the cache is unavailable or the lock is stuck, don't block
+                result = func(*args, **kwargs)
+                store(_cache, cache_key, result)
+                return result
 
         return wrapped
 
@@ -0,0 +1,144 @@
+import copy
+import time
+from typing import List, Optional, Union
+from urllib.parse import urljoin
+
+from django.conf import settings
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from zds_client import ClientError
+from zds_client.client import Object
+from zds_client.schema import get_headers
+from zgw_consumers.client import ZGWClient
+
+# zds_client operation ids are "<resource>_<action>", longest action first
+OPERATION_ACTIONS = (
+    "_partial_update",
+    "_create",
+    "_update",
+    "_delete",
+    "_list",
+    "_read",
+)
+
+
+def get_operation_resource(operation: str) -> str:
+    """
+    resource of a zds_client operation id, eg: 'zaaktype' for 'zaaktype_partial_update'
+    """
+    for action in OPERATION_ACTIONS:
+        if operation.endswith(action):
+            return operation[: -len(action)]
+    return operation
+
+
+def build_http_session(pool_size: int = None) -> requests.Session:
+    """
+    build a requests.Session with a connection pool that keeps connections alive between requests
+    """
+    if pool_size is None:
+        pool_size = settings.HTTP_POOL_SIZE
+
+    http_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http_session.mount("http://", adapter)
+    http_session.mount("https://", adapter)
+    return http_session
+
+
+class SessionClient(ZGWClient):
+    """
+    ZGW client that can do its requests through a shared requests.Session
+
+    the zds_client base class uses requests.request() so every call sets up a new connection,
+      without a http_session this behaves exactly the same.
+
+    with a http_counter every request is recorded with its method, resource, status code and latency,
+      see importer.core.reporting.HttpCounter.
+    """
+
+    http_session: Optional[requests.Session] = None
+    http_counter = None
+
+    def request(
+        self,
+        path: str,
+        operation: str,
+        method="GET",
+        expected_status=200,
+        request_kwargs: Optional[dict] = None,
+        **kwargs,
+    ) -> Union[List[Object], Object]:
+        # same as zds_client.Client.request() of gemma-zds-client 1.0.0, but sent with our session
+        url = urljoin(self.base_url, path)
+
+        if request_kwargs:
+            kwargs.update(request_kwargs)
+
+        headers = CaseInsensitiveDict(kwargs.pop("headers", {}))
+        headers.setdefault("Accept", "application/json")
+        headers.setdefault("Content-Type", "application/json")
+        schema_headers = get_headers(self.schema, operation)
+        for header, value in schema_headers.items():
+            headers.setdefault(header, value)
+        if self.auth:
+            headers.update(self.auth.credentials())
+
+        kwargs["headers"] = headers
+
+        pre_id = self.pre_request(method, url, **kwargs)
+
+        response = self.send(operation, method, url, **kwargs)
+
+        try:
+            response_json = response.json()
+        except Exception:
+            response_json = None
+
+        self.post_response(pre_id, response_json)
+
+        self._log.add(
+            self.service,
+            url,
+            method,
+            dict(headers),
+            copy.deepcopy(kwargs.get("data", kwargs.get("json", None))),
+            response.status_code,
+            dict(response.headers),
+            response_json,
+            params=kwargs.get("params"),
+        )
+
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as exc:
+            if response.status_code >= 500:
+                raise
+            raise ClientError(response_json) from exc
+
+        assert response.status_code == expected_status, response_json
+        return response_json
+
+    def send(self, operation: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = (self.http_session or requests).request(method, url, **kwargs)
+        except requests.RequestException:
+            self.record_request(method, operation, None, start)
+            raise
+        self.record_request(method, operation, response.status_code, start)
+        return response
+
+    def record_request(
+        self, method: str, operation: str, status_code: Optional[int], start: float
+    ):
+        if self.http_counter is None:
+            return
+        self.http_counter.record(
+            method,
+            get_operation_resource(operation),
+            status_code,
+            time.perf_counter() - start,
+        )
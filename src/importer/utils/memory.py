@@ -0,0 +1,52 @@
+import os
+import resource
+import sys
+from typing import Optional
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def get_rss() -> Optional[int]:
+    """
+    current resident set size of the process in bytes, None if the system doesn't tell (linux only)
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss() -> int:
+    """
+    highest resident set size of the process in bytes, since it started or since reset_peak_rss()
+    """
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    start a new peak, so a worker process that ran a large job before measures the peak of the current job
+
+    this only works on linux, elsewhere the peak stays the highest since the start of the process
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def format_mb(size: int) -> float:
+    return round(size / 1024 / 1024, 1)
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from django.core.cache import caches
+
+# the metrics live in the shared Redis cache, so every instance adds to the same counters
+METRICS_CACHE = "default"
+METRICS_KEY_PREFIX = "importer:metrics:"
+# the cache only increments integers, so sums are stored in thousandths
+SUM_SCALE = 1000
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def format_sample(name: str, labels: dict = None) -> str:
+    """
+    sample in the Prometheus text format, eg: 'importer_jobs{state="queued"}'
+    """
+    if not labels:
+        return name
+    label_str = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, value in sorted(labels.items())
+    )
+    return f"{name}{{{label_str}}}"
+
+
+def get_histogram_samples(
+    name: str, buckets: Sequence[float], labels: dict = None
+) -> List[str]:
+    labels = labels or dict()
+    samples = [
+        format_sample(f"{name}_bucket", {**labels, "le": format_value(le)})
+        for le in list(buckets) + [float("inf")]
+    ]
+    samples.append(format_sample(f"{name}_sum", labels))
+    samples.append(format_sample(f"{name}_count", labels))
+    return samples
+
+
+def increment_sample(sample: str, value: int = 1):
+    _cache = caches[METRICS_CACHE]
+    key = METRICS_KEY_PREFIX + sample
+    try:
+        _cache.incr(key, value)
+    except ValueError:
+        # the first increment, unless someone else was just ahead of us
+        if not _cache.add(key, value, timeout=None):
+            _cache.incr(key, value)
+
+
+def increment(name: str, value: int = 1, **labels):
+    increment_sample(format_sample(name, labels), value)
+
+
+def read_samples(samples: Iterable[str]) -> Dict[str, float]:
+    """
+    current value of the samples that were ever incremented
+    """
+    keys = {METRICS_KEY_PREFIX + sample: sample for sample in samples}
+    values = caches[METRICS_CACHE].get_many(list(keys))
+    result = dict()
+    for key, value in values.items():
+        sample = keys[key]
+        if sample.split("{")[0].endswith("_sum"):
+            value = value / SUM_SCALE
+        result[sample] = value
+    return result
+
+
+def render_family(
+    name: str, metric_type: str, help_text: str, samples: Iterable[Tuple[str, float]]
+) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for sample, value in samples:
+        lines.append(f"{sample} {format_value(value)}")
+    return lines
+
+
+class MetricsBuffer:
+    """
+    thread-safe in-process counters, written to the shared cache with flush()
+
+    this keeps the increments of hot paths like the API requests out of the cache until the next flush.
+    """
+
+    def __init__(self):
+        self._data = Counter()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1, **labels):
+        sample = format_sample(name, labels)
+        with self._lock:
+            self._data[sample] += value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float], **labels):
+        """
+        add a value to a histogram with the given bucket upper bounds
+        """
+        samples = get_histogram_samples(name, buckets, labels)
+        bounds = list(buckets) + [float("inf")]
+        with self._lock:
+            for sample, le in zip(samples, bounds):
+                if value <= le:
+                    self._data[sample] += 1
+            self._data[samples[-2]] += round(value * SUM_SCALE)
+            self._data[samples[-1]] += 1
+
+    def flush(self, min_interval: float = 0):
+        """
+        write the buffered increments, unless the last write is less than min_interval seconds ago
+        """
+        with self._lock:
+            now = time.monotonic()
+            if min_interval and now - self._flushed_at < min_interval:
+                return
+            self._flushed_at = now
+            data = self._data
+            self._data = Counter()
+
+        for sample, value in data.items():
+            if value:
+                increment_sample(sample, value)
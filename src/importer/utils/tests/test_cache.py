@@ -0,0 +1,202 @@
+import inspect
+import time
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from importer.utils.cache import (
+    CACHE_METRIC,
+    cache,
+    cache_metrics,
+    get_lock_key,
+    get_version_key,
+    local_cache,
+    make_key,
+)
+from importer.utils.metrics import format_sample, read_samples
+
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "test-cache",
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        local_cache.clear()
+        self.calls = 0
+
+    def get_value(self, *args, **kwargs):
+        self.calls += 1
+        return {"calls": self.calls}
+
+    def test_cache_shared(self):
+        cached = cache("test:shared", timeout=60)(self.get_value)
+
+        self.assertEqual(cached(), {"calls": 1})
+        self.assertEqual(cached(), {"calls": 1})
+        self.assertEqual(self.calls, 1)
+
+        # a new process has an empty local cache but reads the shared cache
+        local_cache.clear()
+        self.assertEqual(cached(), {"calls": 1})
+        self.assertEqual(self.calls, 1)
+
+    def test_cache_local_tier(self):
+        cached = cache("test:local", timeout=60)(self.get_value)
+        cached()
+
+        # within the local timeout the shared cache is not read
+        with patch.object(caches["default"], "get") as mock_get:
+            self.assertEqual(cached(), {"calls": 1})
+            mock_get.assert_not_called()
+
+    def test_cache_version_invalidates_local(self):
+        cached = cache("test:version", timeout=60, local_timeout=0)(self.get_value)
+        self.assertEqual(cached(), {"calls": 1})
+
+        # same version: local copy is kept
+        self.assertEqual(cached(), {"calls": 1})
+
+        # another process refreshed the shared cache
+        caches["default"].set_many(
+            {
+                "test:version": ("other-version", {"calls": 99}, time.time() + 60),
+                get_version_key("test:version"): "other-version",
+            }
+        )
+        self.assertEqual(cached(), {"calls": 99})
+        self.assertEqual(self.calls, 1)
+
+    def test_local_cache_lru(self):
+        local_cache.max_size = 2
+        self.addCleanup(setattr, local_cache, "max_size", 32)
+
+        local_cache.set("a", "v", 1, 60)
+        local_cache.set("b", "v", 2, 60)
+        local_cache.get("a")
+        local_cache.set("c", "v", 3, 60)
+
+        self.assertIsNotNone(local_cache.get("a"))
+        self.assertIsNone(local_cache.get("b"))
+        self.assertIsNotNone(local_cache.get("c"))
+
+    def test_make_key(self):
+        def func(year=None):
+            pass
+
+        signature = inspect.signature(func)
+        self.assertEqual(make_key("foo", signature, (), {}), "foo:year=None")
+        self.assertEqual(make_key("foo", signature, (2020,), {}), "foo:year=2020")
+        self.assertEqual(
+            make_key("foo", signature, (), {"year": 2020}), "foo:year=2020"
+        )
+
+        def func_var(*args, **kwargs):
+            pass
+
+        signature = inspect.signature(func_var)
+        self.assertEqual(make_key("foo", signature, (), {}), "foo")
+        self.assertEqual(
+            make_key("foo", signature, (1,), {"b": 2, "a": 1}), "foo:1:a=1:b=2"
+        )
+
+    def test_cache_arguments_normalized(self):
+        calls = []
+
+        @cache("test:normalized", timeout=60)
+        def get_year(year=None):
+            calls.append(year)
+            return year
+
+        self.assertEqual(get_year(), None)
+        self.assertEqual(get_year(None), None)
+        self.assertEqual(get_year(2020), 2020)
+        self.assertEqual(get_year(year=2020), 2020)
+        self.assertEqual(calls, [None, 2020])
+
+    def test_cache_old_format(self):
+        _cache = caches["default"]
+        cached = cache("test:format", timeout=60)(self.get_value)
+
+        # values written by an older release are a miss
+        for old_entry in [{"calls": 0}, ("version", {"calls": 0})]:
+            _cache.set("test:format", old_entry)
+            local_cache.clear()
+            self.calls = 0
+            self.assertEqual(cached(), {"calls": 1})
+
+    def test_cache_arguments(self):
+        cached = cache("test:args", timeout=60)(self.get_value)
+
+        self.assertEqual(cached(2020), {"calls": 1})
+        self.assertEqual(cached(2021), {"calls": 2})
+        self.assertEqual(cached(2020), {"calls": 1})
+        self.assertEqual(cached(), {"calls": 3})
+
+    def test_cache_waits_for_lock(self):
+        _cache = caches["default"]
+        cached = cache("test:lock", timeout=60)(self.get_value)
+
+        # another worker holds the lock and stores its result
+        _cache.add(get_lock_key("test:lock"), "other")
+
+        def sleep(seconds):
+            _cache.set("test:lock", ("other-version", {"calls": 99}, time.time() + 60))
+
+        with patch("importer.utils.cache.time.sleep", side_effect=sleep):
+            self.assertEqual(cached(), {"calls": 99})
+
+        self.assertEqual(self.calls, 0)
+
+    def test_cache_stale_while_revalidate(self):
+        _cache = caches["default"]
+        cached = cache("test:stale", timeout=60, stale_timeout=60)(self.get_value)
+
+        # an expired value in the shared cache
+        _cache.set("test:stale", ("old-version", {"calls": 0}, time.time() - 1))
+
+        with patch("importer.utils.cache.threading.Thread") as mock_thread:
+            self.assertEqual(cached(), {"calls": 0})
+
+            # one background refresh is started while holding the lock
+            mock_thread.assert_called_once()
+            mock_thread.return_value.start.assert_called_once()
+            self.assertIsNotNone(_cache.get(get_lock_key("test:stale")))
+
+            # others keep getting the stale value without starting a refresh
+            local_cache.clear()
+            self.assertEqual(cached(), {"calls": 0})
+            mock_thread.assert_called_once()
+
+        # run the refresh (but keep the database connection of the test)
+        target = mock_thread.call_args[1]["target"]
+        with patch("importer.utils.cache.connections"):
+            target(*mock_thread.call_args[1]["args"])
+
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(_cache.get(get_lock_key("test:stale")))
+        self.assertEqual(cached(), {"calls": 1})
+
+    def test_cache_metrics(self):
+        # start without the lookups of earlier tests
+        cache_metrics.flush()
+        caches["default"].clear()
+        cached = cache("test:metrics")(self.get_value)
+
+        cached()
+        cached()
+        cached()
+        cache_metrics.flush()
+
+        samples = [
+            format_sample(CACHE_METRIC, {"cache": "test:metrics", "result": result})
+            for result in ("hit", "miss")
+        ]
+        self.assertEqual(read_samples(samples), dict(zip(samples, [2, 1])))
@@ -0,0 +1,78 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+import requests
+import requests_mock
+from zds_client import Client, ClientError
+
+from importer.utils.client import SessionClient, build_http_session
+
+
+class SessionClientTests(SimpleTestCase):
+    def get_client(self):
+        client = SessionClient.from_url("http://test/api/dummy/1")
+        # skip the schema
+        client._schema = {"paths": {}}
+        return client
+
+    @requests_mock.Mocker()
+    def test_request_without_session(self, m):
+        m.get("http://test/api/foo", json={"foo": 1})
+        client = self.get_client()
+
+        self.assertEqual(client.request("http://test/api/foo", "foo_read"), {"foo": 1})
+
+    @requests_mock.Mocker()
+    def test_request_with_session(self, m):
+        m.get("http://test/api/foo", json={"foo": 1})
+        client = self.get_client()
+        client.http_session = build_http_session(pool_size=2)
+
+        with patch.object(
+            client.http_session, "request", wraps=client.http_session.request
+        ) as request:
+            result = client.request("http://test/api/foo", "foo_read")
+
+        self.assertEqual(result, {"foo": 1})
+        request.assert_called_once()
+        adapter = client.http_session.adapters["http://"]
+        self.assertEqual(adapter._pool_maxsize, 2)
+
+    @requests_mock.Mocker()
+    def test_request_http_counter(self, m):
+        m.get("http://test/api/foo", json={"foo": 1})
+        m.patch("http://test/api/bar", status_code=400, json={})
+        m.get("http://test/api/baz", exc=requests.ConnectTimeout)
+        client = self.get_client()
+        client.http_counter = Mock()
+
+        client.request("http://test/api/foo", "zaaktype_read")
+        with self.assertRaises(ClientError):
+            client.request("http://test/api/bar", "roltype_partial_update", "PATCH")
+        with self.assertRaises(requests.ConnectTimeout):
+            client.request("http://test/api/baz", "statustype_list")
+
+        calls = [c[0][:3] for c in client.http_counter.record.call_args_list]
+        self.assertEqual(
+            calls,
+            [
+                ("GET", "zaaktype", 200),
+                ("PATCH", "roltype", 400),
+                ("GET", "statustype", None),
+            ],
+        )
+
+    @requests_mock.Mocker()
+    def test_request_other_clients(self, m):
+        m.get("http://test/api/foo", json={"foo": 1})
+        client = Client.from_url("http://test/api/dummy/1")
+        client._schema = {"paths": {}}
+        http_session = build_http_session()
+
+        # a plain zds_client client doesn't use the session of a SessionClient
+        with patch.object(http_session, "request") as request:
+            self.assertEqual(
+                client.request("http://test/api/foo", "foo_read"), {"foo": 1}
+            )
+        request.assert_not_called()
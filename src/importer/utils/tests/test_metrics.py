@@ -0,0 +1,71 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from importer.utils.metrics import (
+    MetricsBuffer,
+    format_sample,
+    get_histogram_samples,
+    increment,
+    read_samples,
+)
+
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "test-metrics",
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+
+    def test_format_sample(self):
+        self.assertEqual(format_sample("foo"), "foo")
+        self.assertEqual(
+            format_sample("foo", {"b": 'x"y', "a": 1}), 'foo{a="1",b="x\\"y"}'
+        )
+
+    def test_increment(self):
+        increment("foo_total", a="x")
+        increment("foo_total", 2, a="x")
+
+        self.assertEqual(
+            read_samples(['foo_total{a="x"}', 'foo_total{a="y"}']),
+            {'foo_total{a="x"}': 3},
+        )
+
+    def test_buffer_flush(self):
+        metrics = MetricsBuffer()
+        metrics.increment("foo_total", a="x")
+        metrics.observe("bar_seconds", 0.2, (0.1, 0.5), a="x")
+        metrics.observe("bar_seconds", 2, (0.1, 0.5), a="x")
+
+        samples = get_histogram_samples("bar_seconds", (0.1, 0.5), {"a": "x"})
+        self.assertEqual(read_samples(samples), {})
+
+        metrics.flush()
+        self.assertEqual(
+            read_samples(samples),
+            {
+                'bar_seconds_bucket{a="x",le="0.5"}': 1,
+                'bar_seconds_bucket{a="x",le="+Inf"}': 2,
+                'bar_seconds_sum{a="x"}': 2.2,
+                'bar_seconds_count{a="x"}': 2,
+            },
+        )
+        self.assertEqual(read_samples(['foo_total{a="x"}']), {'foo_total{a="x"}': 1})
+
+        # nothing left to write
+        metrics.flush()
+        self.assertEqual(read_samples(['foo_total{a="x"}']), {'foo_total{a="x"}': 1})
+
+    def test_buffer_flush_interval(self):
+        metrics = MetricsBuffer()
+        metrics.flush()
+        metrics.increment("foo_total")
+        metrics.flush(min_interval=60)
+        self.assertEqual(read_samples(["foo_total"]), {})